@@ -1,23 +1,31 @@
 import os
 import sys
 from pathlib import Path
-import io
+import gc
 import json
+import queue
+import threading
+import time
 import cv2
 import numpy as np
+import psutil
 import torch
 import tensorflow as tf
-from PIL import Image
 from flask import Flask, request, Response
 from flask_cors import CORS
 from models.common import DetectMultiBackend
-from utils.general import check_img_size, non_max_suppression, scale_boxes
+from utils.decode import imdecode, letterbox_rgb, letterbox_shapes, to_tensor
+from utils.general import LOGGER, check_img_size, non_max_suppression, scale_boxes
+from utils.plots import save_one_box
+from utils.serving import MicroBatcher, ModelRegistry, RemoteBatcher, ResultCache, SharedRing, WorkerPool
 from utils.torch_utils import select_device
 from tensorflow.keras.models import load_model
 
 import pathlib
-temp = pathlib.PosixPath
-pathlib.PosixPath = pathlib.WindowsPath
+import platform
+if platform.system() == 'Windows':  # Linux 에서 학습한 best.pt 를 Windows 에서 로드
+    temp = pathlib.PosixPath
+    pathlib.PosixPath = pathlib.WindowsPath
 
 app = Flask(__name__)
 CORS(app)
@@ -25,8 +33,48 @@ CORS(app)
 yolov5_path = Path("C:/Users/Y/Desktop/yolo/1001/yolov5")
 sys.path.append(str(yolov5_path))
 
+WEIGHTS = "best.pt"
+KERAS_MODEL = "./keras_model.h5"
+LABELS = "./labels.txt"
+IMGSZ = (640, 640)  # 모델 입력 크기, stride 배수로 맞춰서 사용
+
+
+def parse_model_versions(spec=None):
+    # 분류 모델 버전 -> (Keras 모델, 라벨 파일), "default" 는 KERAS_MODEL / LABELS
+    # spec: "v3=../../DL/v3/keras_model.h5,v4=../../DL/v4/new_keras_model.h5" (PILL_MODEL_VERSIONS 환경 변수)
+    # 라벨 파일은 모델 옆의 *labels.txt (keras_model.h5 -> labels.txt, new_keras_model.h5 -> new_labels.txt)
+    versions = {"default": (KERAS_MODEL, LABELS)}
+    for item in filter(None, (spec or "").split(",")):
+        name, path = (x.strip() for x in item.split("=", 1))
+        versions[name] = (path, str(Path(path).with_name(Path(path).name.replace("keras_model.h5", "labels.txt"))))
+    return versions
+
+
+def read_labels(labels_path):
+    with open(labels_path, "r", encoding="utf-8") as f:
+        return f.readlines()
+
+
+class Classifier:
+    # Keras 분류 모델 한 버전과 그 라벨, ModelRegistry 가 버전별로 로드
+    # 라벨도 모델과 같이 로드/교체해서 리로드 중에도 예측과 클래스 이름이 항상 같은 버전에서 나옴
+    def __init__(self, model_path, labels_path):
+        self.labels = read_labels(labels_path)
+        self.model = load_model(model_path, compile=False)
+        self.shape = tuple(self.model.input_shape[1:])  # (h, w, c)
+
+        # model.predict 는 호출마다 setup 비용이 커서, 고정 입력 시그니처의 tf.function 으로 한 번만 trace
+        self.fn = tf.function(
+            lambda x: self.model(x, training=False),
+            input_signature=[tf.TensorSpec([None, *self.shape], tf.float32)],
+        )
+
+
 class PillDetectionApp:
-    def __init__(self, base_dir="/home/ubuntu/flask"):
+    def __init__(self, base_dir="/home/ubuntu/flask", max_batch_size=8, batch_window_ms=10, max_queue=64,
+                 memory_high_water_mb=0, torch_threads=0, tf_threads=0, workers=0,
+                 cache_size=1024, cache_ttl=300, cache_perceptual=False,
+                 model_versions=None, default_version=None, max_versions=2, compile_mode=None, serving_shapes=None):
         self.app = Flask(__name__)
         CORS(self.app)
         self.app.config['JSON_AS_ASCII'] = False
@@ -35,11 +83,77 @@ class PillDetectionApp:
         # Setup routes
         self.app.route('/detect', methods=['POST'])(self.detect)
         self.app.route('/predict', methods=['POST'])(self.predict)
+        self.app.route('/scan', methods=['POST'])(self.scan)
+        self.app.route('/metrics', methods=['GET'])(self.metrics)
+        self.app.route('/healthz', methods=['GET'])(self.healthz)
+
+        self.conf_thres, self.iou_thres = 0.4, 0.5  # NMS
+        self.max_det = 50  # 이미지당 최대 검출 수, 알약 트레이 사진에도 충분
+        self.min_confidence = 0.7  # 응답에 포함할 최소 검출 신뢰도
+
+        # 시작 시 YOLO 모델 컴파일: channels_last / jit (TorchScript freeze) / compile (torch.compile), 없으면 eager
+        # jit / compile 은 고정 입력 크기로 컴파일하므로 letterbox 도 최소 사각형 대신 imgsz 정사각형으로 맞춤
+        self.compile_mode = compile_mode if compile_mode is not None else os.getenv('PILL_COMPILE', '')
+        self.auto = self.compile_mode not in ('jit', 'compile')
+
+        # 모델 로드 시 Detect 의 anchor grid 를 미리 만들어 둘 입력 크기 [(h, w), ...]
+        # 없으면 letterbox 가 만들 수 있는 모든 크기
+        # PILL_SERVING_SHAPES="640x480,480x640" 처럼 지정 가능
+        spec = os.getenv('PILL_SERVING_SHAPES')
+        self.serving_shapes = serving_shapes or (
+            [tuple(int(x) for x in s.split('x')) for s in spec.split(',')] if spec else None
+        )
+
+        # 분류 모델 버전은 요청의 model_version 폼 필드로 선택 (A/B 테스트), 없으면 default_version
+        # 클래스 이름은 분류 결과와 함께 돌아오므로 (classify_batch) 모델이 없는 프로세스(pre-fork 모드)도 응답 가능
+        self.model_versions = model_versions or parse_model_versions(os.getenv('PILL_MODEL_VERSIONS'))
+        self.default_version = default_version or os.getenv('PILL_DEFAULT_VERSION') or next(iter(self.model_versions))
+        assert self.default_version in self.model_versions, \
+            f"default model version '{self.default_version}' not in {list(self.model_versions)}"
+
+        # 같은 사진 재시도/재업로드는 다시 추론하지 않음, 모델 파일이 바뀌면 자동으로 비움 (cache_size=0 이면 끔)
+        # 새 모델이 로드되기 전까지 이전 모델이 낸 결과는 저장하지 않음 (결과와 같이 오는 모델 파일 fingerprint 로 확인)
+        # cache_perceptual=True 는 재인코딩된 사본도 맞히지만 64bit dHash 라 비슷하게 찍힌 다른 알약 사진끼리 충돌해서
+        # 다른 약의 결과를 돌려줄 수 있음, 약 식별에는 위험하므로 기본은 업로드 바이트 해시만 사용
+        watch = (WEIGHTS, *(f for files in self.model_versions.values() for f in files))
+        self.cache = None
+        if cache_size:
+            self.cache = ResultCache(cache_size, cache_ttl, perceptual=cache_perceptual, watch=watch)
+
+        self.warm = False
+        self.pool = None
+        if workers:
+            self.setup_workers(workers, base_dir, max_batch_size, batch_window_ms, max_queue,
+                               memory_high_water_mb, torch_threads, tf_threads, max_versions)
+            return
 
         # Load models
-        self.setup_models(base_dir)
+        self.memory_high_water_mb = memory_high_water_mb  # 0 이면 메모리 정리 안 함
+        self.trim_interval = 30  # 초, high-water mark 위에 머물러도 정리는 이 간격 또는 사용량이 더 늘었을 때만
+        self.last_trim = (0.0, 0.0)  # (시각, 정리 직후 사용량 MB)
+        self.max_batch_size = max_batch_size
+        self.setup_models(base_dir, torch_threads, tf_threads, max_versions)
+        self.input_buffers = {}  # letterbox 크기별 배치 입력 텐서, 매 배치 재사용
+
+        # 동시 요청을 모아 한 번의 forward pass 로 처리
+        # 큐가 가득 차면 503 으로 바로 거절 (backpressure)
+        self.detect_batcher = MicroBatcher(self.detect_batch, max_batch_size, batch_window_ms, max_queue, name="detect")
+        self.classify_batcher = MicroBatcher(
+            self.classify_batch, max_batch_size, batch_window_ms, max_queue, name="classify"
+        )
+
+        # 서버는 바로 뜨고, /healthz 는 warmup 이 끝날 때까지 503
+        self.warmup_thread = threading.Thread(target=self.warmup, name="warmup", daemon=True)
+        self.warmup_thread.start()
+
+    def setup_models(self, base_dir, torch_threads=0, tf_threads=0, max_versions=2):
+        # 모델 추론 스레드 수 고정 (0 이면 라이브러리 기본값), TF 는 런타임 초기화 전에 설정해야 함
+        if torch_threads:
+            torch.set_num_threads(torch_threads)
+        if tf_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
 
-    def setup_models(self, base_dir):
         # Clear any existing TensorFlow sessions
         tf.keras.backend.clear_session()
 
@@ -47,25 +161,96 @@ class PillDetectionApp:
         BASE_DIR = Path(base_dir)
         sys.path.append(str(BASE_DIR))
 
-        weights = "best.pt"
+        # 모델 파일이 바뀌면 새 모델을 백그라운드에서 로드한 뒤 교체, 처리 중인 배치는 이전 모델로 끝냄
         self.device = select_device("")
-        self.yolo_model = DetectMultiBackend(weights, device=self.device)
-        self.stride = self.yolo_model.stride
-        self.names = self.yolo_model.names
-        self.imgsz = check_img_size((640, 640), s=self.stride)
-
-        # Keras Model Setup
-        self.keras_model = load_model("./keras_model.h5", compile=False)
-        with open("./labels.txt", "r", encoding="utf-8") as f:
-            self.class_names = f.readlines()
-
-    def cleanup_resources(self):
-        # Clear CUDA cache if using GPU
+        self.detectors = ModelRegistry({"default": WEIGHTS}, self.load_detector, 1)
+        yolo_model = self.detectors.get()
+        self.stride = yolo_model.stride
+        self.names = yolo_model.names
+        self.imgsz = check_img_size(IMGSZ, s=self.stride)
+
+        # Keras Model Setup, 버전별로 처음 요청될 때 로드하고 최근에 쓴 max_versions 개만 메모리에 유지
+        self.classifiers = ModelRegistry(self.model_versions, Classifier, max_versions, self.default_version)
+        # 크롭 크기, 입력 크기가 다른 버전은 classify_batch 에서 맞춤
+        self.classify_shape = self.classifiers.get().shape
+
+    def load_detector(self, weights):
+        # Conv+BN 은 DetectMultiBackend 에서 fuse
+        # 컴파일 결과는 가중치 해시 + torch 버전별로 디스크에 캐시해서 재시작 시 재사용
+        # ONNX 모델은 입력 크기 x 배치 크기별 출력 버퍼를 재사용 (stride 32 기준 개수가 상한), 출력은 바로 NMS 에서 씀
+        shapes = self.serving_shapes or letterbox_shapes(IMGSZ, self.auto)
+        model = DetectMultiBackend(weights, device=self.device, ort_buffer_shapes=len(shapes) * self.max_batch_size)
+        imgsz = check_img_size(IMGSZ, s=model.stride)
+        if model.pt:  # 요청마다 다른 letterbox 크기가 들어와도 Detect 가 grid 를 새로 만들지 않도록 미리 캐시
+            model.model.model[-1].cache_grids(self.serving_shapes or letterbox_shapes(imgsz, self.auto, model.stride))
+        if self.compile_mode:
+            model.compile_for_serving(imgsz, self.compile_mode)
+        return model
+
+    def setup_workers(self, workers, base_dir, max_batch_size, batch_window_ms, max_queue,
+                      memory_high_water_mb, torch_threads, tf_threads, max_versions):
+        # pre-fork 모드: 워커 프로세스마다 YOLO / Keras 모델을 따로 들고 배치 추론,
+        # 이 프로세스는 업로드 디코딩/전처리와 응답만 담당하고 입력 배열은 공유 메모리 슬롯으로 전달
+        # 워커가 죽으면 처리 중이던 요청만 실패시키고 자동으로 다시 띄움
+        threads = max(1, (os.cpu_count() or 1) // workers)  # 워커끼리 코어를 나눠 씀
+        kwargs = dict(base_dir=base_dir, max_batch_size=max_batch_size, batch_window_ms=batch_window_ms, max_queue=0,
+                      memory_high_water_mb=memory_high_water_mb, torch_threads=torch_threads or threads,
+                      tf_threads=tf_threads or threads, cache_size=0, model_versions=self.model_versions,
+                      default_version=self.default_version, max_versions=max_versions,
+                      compile_mode=self.compile_mode, serving_shapes=self.serving_shapes)
+        slots = max_queue or 8 * workers  # 동시에 처리 중인 요청 수 상한, 넘으면 503
+        # /scan 의 crop 들은 슬롯에 들어가는 만큼 쌓아서 보내므로 요청 하나가 슬롯 몇 개만 씀
+        # 슬롯 하나에 letterbox 된 입력 한 장이 들어감, stride 는 워커가 로드해야 알 수 있어서 최대 stride(P6) 기준
+        h, w = check_img_size(IMGSZ, s=64)
+        self.pool = WorkerPool(model_worker, workers, slots, slot_bytes=h * w * 3, args=(kwargs,))
+
+        # 응답 포맷과 전처리에 필요한 모델 정보는 첫 워커가 warmup 후 알려줌
+        # 모델 로드가 실패하거나 PILL_WORKER_TIMEOUT 초 안에 준비되지 않으면 예외로 시작을 중단
+        print(f"Waiting for {workers} model workers")
+        self.__dict__.update(self.pool.wait_ready(timeout=float(os.getenv('PILL_WORKER_TIMEOUT', '600'))))
+        self.detect_batcher = RemoteBatcher(self.pool, 'detect')
+        self.classify_batcher = RemoteBatcher(self.pool, 'classify')
+
+    def model_info(self):
+        return {
+            "stride": self.stride,
+            "names": self.names,
+            "imgsz": self.imgsz,
+            "classify_shape": self.classify_shape
+        }
+
+    def is_warm(self):
+        return self.pool.n_ready() > 0 if self.pool else self.warm
+
+    def warmup(self):
+        # 첫 요청에서 graph trace / allocator 초기화가 일어나지 않도록 모델을 한 번씩 미리 실행
+        print("Warmup start")
+        self.detectors.get().warmup(imgsz=(1, 3, *self.imgsz))  # GPU 에서만 실행됨
+        self.detect_batcher.submit((np.zeros((*self.imgsz, 3), dtype=np.uint8), (*self.imgsz, 3)))
+        self.classify_batcher.submit((np.zeros(self.classify_shape, dtype=np.uint8), self.classifiers.default))
+        self.warm = True
+        print("Warmup end")
+
+    def trim_memory(self):
+        # 매 요청마다 세션을 지우지 않고, 메모리가 high-water mark 를 넘을 때만 정리
+        if not self.memory_high_water_mb:
+            return
+        rss = psutil.Process().memory_info().rss / 2 ** 20  # MB
+        cuda = torch.cuda.memory_reserved() / 2 ** 20 if torch.cuda.is_available() else 0.0
+        if rss + cuda <= self.memory_high_water_mb:
+            return
+        # gc.collect() 는 OS 에 메모리를 거의 돌려주지 않아 RSS 가 high-water mark 위에 머무는 경우가 많음,
+        # 그때 매 배치 full GC 를 돌지 않도록 trim_interval 초마다 또는 마지막 정리 후 10% 더 늘었을 때만 정리
+        t, used = self.last_trim
+        if time.monotonic() - t < self.trim_interval and rss + cuda < used * 1.1:
+            return
+        LOGGER.info(f"Memory {rss:.0f}MB RAM + {cuda:.0f}MB CUDA > {self.memory_high_water_mb}MB, trimming")
+        gc.collect()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
-        
-        # Clear TensorFlow session
-        tf.keras.backend.clear_session()
+        rss = psutil.Process().memory_info().rss / 2 ** 20
+        cuda = torch.cuda.memory_reserved() / 2 ** 20 if torch.cuda.is_available() else 0.0
+        self.last_trim = (time.monotonic(), rss + cuda)
 
     def detect_and_crop_pill(self, img, output_size=(224, 224)):
         try:
@@ -96,7 +281,184 @@ class PillDetectionApp:
         except Exception as e:
             print(f"Crop exception: {e}")
             return None
-    
+
+    def detect_batch(self, items):
+        # items: [(HWC RGB uint8 image, original shape), ...], letterboxed to minimal stride-multiple rectangles
+        # -> [(detections, 모델 파일 fingerprint), ...]
+        # 같은 letterbox 크기끼리 묶어서 크기별로 한 번씩 forward pass
+        groups = {}
+        for i, (im, _) in enumerate(items):
+            groups.setdefault(im.shape[:2], []).append(i)
+
+        yolo_model, files = self.detectors.get(files=True)  # 배치 도중 교체돼도 이 배치는 같은 모델로 처리
+        results = [None] * len(items)
+        for shape, index in groups.items():
+            if shape not in self.input_buffers:
+                self.input_buffers[shape] = torch.empty((self.max_batch_size, 3, *shape))
+            ims = to_tensor([items[i][0] for i in index], out=self.input_buffers[shape]).to(self.device)
+
+            with torch.no_grad():
+                pred = yolo_model(ims)
+                if not yolo_model.end2end:  # --nms 로 export 된 모델은 그래프 안에서 NMS 수행
+                    pred = non_max_suppression(
+                        pred, conf_thres=self.conf_thres, iou_thres=self.iou_thres, max_det=self.max_det, fast=True,
+                        topk=10 * self.max_det
+                    )
+
+            for i, det in zip(index, pred):
+                if len(det):
+                    det[:, :4] = scale_boxes(ims.shape[2:], det[:, :4], items[i][1]).round()
+                results[i] = det.cpu(), files
+        self.trim_memory()
+        return results
+
+    def classify_batch(self, items):
+        # items: [(HWC uint8 BGR crop, model version), ...]
+        # -> [(class probabilities, 클래스 이름, 모델 파일 fingerprint), ...]
+        # 같은 버전끼리 묶어서 버전별로 한 번씩 forward pass
+        groups = {}
+        for i, (_, version) in enumerate(items):
+            groups.setdefault(version, []).append(i)
+
+        results = [None] * len(items)
+        for version, index in groups.items():
+            classifier, files = self.classifiers.get(version, files=True)
+            h, w = classifier.shape[:2]
+            crops = [items[i][0] for i in index]
+            crops = [x if x.shape[:2] == (h, w) else cv2.resize(x, (w, h), interpolation=cv2.INTER_AREA) for x in crops]
+            with tf.device('/CPU:0'):
+                prediction = classifier.fn(tf.convert_to_tensor(np.stack(crops).astype('float32') / 255.0)).numpy()
+            for i, p in zip(index, prediction):
+                results[i] = p, classifier.labels, files
+        self.trim_memory()
+        return results
+
+    # 아래 캐시/전처리/후처리는 Flask 라우트와 ASGI 엔트리포인트(app_asgi.py)가 공유
+    def model_version(self, version):
+        # 요청의 model_version 폼 필드 -> 등록된 버전 이름 (없으면 기본 버전), 모르는 버전이면 None
+        version = version or self.default_version
+        return version if version in self.model_versions else None
+
+    def unknown_version(self, version):
+        return {'error': f"Unknown model_version '{version}'", 'available': list(self.model_versions)}
+
+    def cache_get(self, endpoint, buf, version=None):
+        # 업로드 바이트 해시 + endpoint + 임계값 + 분류 모델 버전 (+ 모델 파일 버전) 을 키로 조회
+        if self.cache is None:
+            return None, None
+        key = self.cache.key(buf, endpoint, self.conf_thres, self.iou_thres, self.max_det, self.min_confidence, version)
+        return key, self.cache.get(key)
+
+    def cache_put(self, key, result, *files):
+        # files: 결과를 만든 모델들의 {파일: (size, mtime)}, 리로드 전 이전 모델의 결과는 새 키로 저장되지 않음
+        if key is not None:
+            self.cache.put(key, result, {f: x for fs in files for f, x in fs.items()})
+
+    def prepare_detect(self, buf):
+        # 큰 JPEG 은 모델 입력 크기 이상을 유지하는 선에서 축소 디코딩 (f: 원본 좌표 배율)
+        img, f = imdecode(buf, min_shape=self.imgsz)
+        img_resized = letterbox_rgb(img, self.imgsz, auto=self.auto, stride=self.stride)
+        return (img_resized, img.shape), f
+
+    def format_detections(self, det, f):
+        det[:, :4] *= f
+        detections = []
+        for *xyxy, conf, cls in reversed(det):
+            if conf >= self.min_confidence:
+                x1, y1, x2, y2 = map(int, xyxy)
+                label = self.names[int(cls)]
+                confidence = float(conf)
+                detections.append({
+                    "label": label,
+                    "confidence": confidence,
+                    "bbox": [x1, y1, x2, y2]
+                })
+        return {"result": len(detections) > 0, "detections": detections}
+
+    def prepare_predict(self, buf):
+        # 크롭 품질을 위해 원본 해상도로 디코딩 (BGR)
+        img, _ = imdecode(buf)
+        print(f"Decoded image shape: {img.shape}")
+
+        # 알약 검출 및 크롭
+        cropped_img = self.detect_and_crop_pill(img)
+        if cropped_img is None:
+            print("Failed to crop pill from image")
+            return None
+        print(f"Cropped image shape: {cropped_img.shape}")
+
+        # 정규화(/255)는 classify_batch 에서 배치 단위로 수행 (uint8 로 넘겨서 워커 전달 크기를 줄임)
+        return cropped_img
+
+    def format_prediction(self, prediction, version):
+        prediction, class_names, _ = prediction  # classify_batch 결과, 클래스 이름은 예측한 모델 버전의 라벨
+        print(f"Number of class names: {len(class_names)}")
+        prediction = prediction[None]
+        print(f"Prediction shape: {prediction.shape}")
+        print(f"Raw prediction values: {prediction}")
+
+        # 예측 결과 처리
+        if len(prediction) == 0 or len(prediction[0]) == 0:
+            raise ValueError("Empty prediction result")
+
+        index = np.argmax(prediction)
+        print(f"Predicted index: {index}")
+
+        # 인덱스 유효성 검사
+        if index >= len(class_names):
+            raise IndexError(f"Predicted index {index} is out of range for {len(class_names)} classes")
+
+        class_name = class_names[index][2:].strip()
+        confidence_score = float(prediction[0][index])
+
+        print(f"Predicted class: {class_name} (model {version})")
+        print(f"Confidence score: {confidence_score}")
+
+        return [{
+            'pill_number': 1,
+            'class': class_name,
+            'confidence': confidence_score
+        }]
+
+    def prepare_scan(self, buf):
+        # 크롭 품질을 위해 원본 해상도로 한 번만 디코딩 (BGR)
+        img, _ = imdecode(buf)
+        img_resized = letterbox_rgb(img, self.imgsz, auto=self.auto, stride=self.stride)
+        return img, (img_resized, img.shape)
+
+    def crop_detections(self, img, det):
+        # 검출 박스를 디코딩된 배열에서 바로 크롭 (파일 저장 없음), /predict 와 같은 224x224 BGR 입력
+        det = det[det[:, 4] >= self.min_confidence]
+        size = self.classify_shape[1::-1]  # (w, h)
+        crops = []
+        for *xyxy, conf, cls in reversed(det):
+            crop = save_one_box(xyxy, img, BGR=True, save=False)
+            crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+            crops.append(crop)
+        return det, crops
+
+    def format_scan(self, det, predictions, version):
+        results = []
+        for i, ((*xyxy, conf, cls), (prediction, class_names, _)) in enumerate(zip(reversed(det), predictions)):
+            index = int(np.argmax(prediction))
+            results.append({
+                'pill_number': i + 1,
+                'label': self.names[int(cls)],
+                'detection_confidence': float(conf),
+                'bbox': [int(x) for x in xyxy],
+                'class': class_names[index][2:].strip(),
+                'confidence': float(prediction[index])
+            })
+        return {'result': len(results) > 0, 'pills': results}
+
+    def overloaded(self):
+        return Response(
+            json.dumps({'error': 'Server is busy, retry later'}),
+            status=503,
+            headers={'Retry-After': '1'},
+            content_type='application/json; charset=utf-8'
+        )
+
     def detect(self):
         print("Detect start")
         try:
@@ -107,52 +469,24 @@ class PillDetectionApp:
                     content_type='application/json; charset=utf-8'
                 )
 
-            file = request.files['image']
-            image = Image.open(io.BytesIO(file.read()))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            img = np.array(image)
-            original_shape = img.shape
-            img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-            img_resized = cv2.resize(img, (self.imgsz[0], self.imgsz[1]))
-            img_resized = img_resized.transpose((2, 0, 1))[::-1]
-            img_resized = np.ascontiguousarray(img_resized)
-            img_resized = torch.from_numpy(img_resized).to(self.device)
-            img_resized = img_resized.float() / 255.0
-            img_resized = img_resized.unsqueeze(0)
-
-            with torch.no_grad():
-                pred = self.yolo_model(img_resized)
-                pred = non_max_suppression(pred, conf_thres=0.4, iou_thres=0.5, max_det=1000)
-
-            detections = []
-            for i, det in enumerate(pred):
-                if len(det):
-                    det[:, :4] = scale_boxes((self.imgsz[0], self.imgsz[1]), det[:, :4], original_shape).round()
-
-                    for *xyxy, conf, cls in reversed(det):
-                        if conf >= 0.7:
-                            x1, y1, x2, y2 = map(int, xyxy)
-                            label = self.names[int(cls)]
-                            confidence = float(conf)
-                            detections.append({
-                                "label": label,
-                                "confidence": confidence,
-                                "bbox": [x1, y1, x2, y2]
-                            })
-
-            result = len(detections) > 0
+            buf = request.files['image'].read()
+            key, result = self.cache_get('detect', buf)
+            if result is None:
+                item, f = self.prepare_detect(buf)
+                try:
+                    det, files = self.detect_batcher.submit(item)
+                except queue.Full:
+                    return self.overloaded()
+                result = self.format_detections(det, f)
+                self.cache_put(key, result, files)
             print("Detect End")
-            
-            self.cleanup_resources()
+
             return Response(
-                json.dumps({"result": result, "detections": detections}),
+                json.dumps(result),
                 content_type='application/json; charset=utf-8'
             )
 
         except Exception as e:
-            self.cleanup_resources()
             print(f"Error processing image: {str(e)}")
             return Response(
                 json.dumps({'error': f'Image processing error: {str(e)}'}),
@@ -170,75 +504,40 @@ class PillDetectionApp:
                     content_type='application/json; charset=utf-8'
                 )
 
-            # 파일 로딩 및 이미지 전처리 로깅
-            file = request.files['image']
-            print(f"Received image file: {file.filename}")
-            
-            image = Image.open(io.BytesIO(file.read()))
-            print(f"Image mode: {image.mode}, Size: {image.size}")
-
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-                print("Converted image to RGB mode")
-
-            img = np.array(image)
-            print(f"NumPy array shape: {img.shape}")
-            
-            img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-
-            # 알약 검출 및 크롭
-            cropped_img = self.detect_and_crop_pill(img)
-            if cropped_img is None:
-                print("Failed to crop pill from image")
-                self.cleanup_resources()
+            version = self.model_version(request.form.get('model_version'))
+            if version is None:
                 return Response(
-                    json.dumps({'error': 'Failed to crop pill from image'}),
+                    json.dumps(self.unknown_version(request.form.get('model_version')), ensure_ascii=False),
                     status=400,
                     content_type='application/json; charset=utf-8'
                 )
-            print(f"Cropped image shape: {cropped_img.shape}")
-
-            # 이미지 전처리
-            img = cropped_img.astype('float32') / 255.0
-            img = np.expand_dims(img, axis=0)
-            print(f"Preprocessed image shape: {img.shape}")
 
-            # 클래스 이름 로딩 확인
-            print(f"Number of class names: {len(self.class_names)}")
-            
-            # 예측 수행
-            with tf.device('/CPU:0'):
-                prediction = self.keras_model.predict(img, verbose=0)
-            print(f"Prediction shape: {prediction.shape}")
-            print(f"Raw prediction values: {prediction}")
-
-            # 예측 결과 처리
-            if len(prediction) == 0 or len(prediction[0]) == 0:
-                raise ValueError("Empty prediction result")
-
-            index = np.argmax(prediction)
-            print(f"Predicted index: {index}")
-
-            # 인덱스 유효성 검사
-            if index >= len(self.class_names):
-                raise IndexError(f"Predicted index {index} is out of range for {len(self.class_names)} classes")
-
-            class_name = self.class_names[index][2:].strip()
-            confidence_score = float(prediction[0][index])
-            
-            print(f"Predicted class: {class_name}")
-            print(f"Confidence score: {confidence_score}")
+            # 파일 로딩 및 이미지 전처리 로깅
+            file = request.files['image']
+            print(f"Received image file: {file.filename}")
 
-            results = [{
-                'pill_number': 1,
-                'class': class_name,
-                'confidence': confidence_score
-            }]
+            buf = file.read()
+            key, results = self.cache_get('predict', buf, version)
+            if results is None:
+                img = self.prepare_predict(buf)
+                if img is None:
+                    return Response(
+                        json.dumps({'error': 'Failed to crop pill from image'}),
+                        status=400,
+                        content_type='application/json; charset=utf-8'
+                    )
+
+                # 예측 수행 (동시 요청과 함께 배치로 분류)
+                try:
+                    prediction = self.classify_batcher.submit((img, version))
+                except queue.Full:
+                    return self.overloaded()
+                results = self.format_prediction(prediction, version)
+                self.cache_put(key, results, prediction[2])
 
             print("Predict end")
             print(f"Final results: {results}")
 
-            self.cleanup_resources()
             return Response(
                 json.dumps(
                     results,
@@ -249,12 +548,11 @@ class PillDetectionApp:
             )
 
         except Exception as e:
-            self.cleanup_resources()
             print(f"Error processing image: {str(e)}")
             print(f"Error type: {type(e)}")
             import traceback
             print(f"Full traceback: {traceback.format_exc()}")
-            
+
             return Response(
                 json.dumps(
                     {'error': f'Image processing error: {str(e)}',
@@ -265,9 +563,130 @@ class PillDetectionApp:
                 content_type='application/json; charset=utf-8'
             ), 500
 
+    def metrics(self):
+        return Response(
+            json.dumps({
+                "detect": self.detect_batcher.stats.summary(),
+                "classify": self.classify_batcher.stats.summary(),
+                "cache": self.cache.summary() if self.cache else None,
+                "models": None if self.pool else {
+                    "detect": self.detectors.summary(),
+                    "classify": self.classifiers.summary()
+                }
+            }),
+            content_type='application/json; charset=utf-8'
+        )
+
+    def healthz(self):
+        return Response(
+            json.dumps({"warm": self.is_warm(), "workers": self.pool.n_ready() if self.pool else None}),
+            status=200 if self.is_warm() else 503,
+            content_type='application/json; charset=utf-8'
+        )
+
+    def scan(self):
+        # 한 번의 업로드/디코딩으로 YOLO 검출 -> 검출된 알약별 크롭 -> Keras 분류를 모두 수행
+        print("Scan start")
+        try:
+            if 'image' not in request.files:
+                return Response(
+                    json.dumps({'error': 'No image provided'}),
+                    status=400,
+                    content_type='application/json; charset=utf-8'
+                )
+
+            version = self.model_version(request.form.get('model_version'))
+            if version is None:
+                return Response(
+                    json.dumps(self.unknown_version(request.form.get('model_version')), ensure_ascii=False),
+                    status=400,
+                    content_type='application/json; charset=utf-8'
+                )
+
+            buf = request.files['image'].read()
+            key, result = self.cache_get('scan', buf, version)
+            if result is None:
+                img, item = self.prepare_scan(buf)
+                try:
+                    det, files = self.detect_batcher.submit(item)
+                except queue.Full:
+                    return self.overloaded()
+
+                det, crops = self.crop_detections(img, det)
+                try:
+                    predictions = self.classify_batcher.submit_many([(crop, version) for crop in crops])
+                except queue.Full:
+                    return self.overloaded()
+                result = self.format_scan(det, predictions, version)
+                self.cache_put(key, result, files, *(p[2] for p in predictions))
+
+            print(f"Scan end, {len(result['pills'])} pills")
+            return Response(
+                json.dumps(result, ensure_ascii=False, indent=2),
+                content_type='application/json; charset=utf-8'
+            )
+
+        except Exception as e:
+            print(f"Error processing image: {str(e)}")
+            return Response(
+                json.dumps({'error': f'Image processing error: {str(e)}'}, ensure_ascii=False),
+                status=500,
+                content_type='application/json; charset=utf-8'
+            )
+
     def run(self, host='0.0.0.0', port=5000):
         self.app.run(host=host, port=port, debug=False, threaded=True)
 
+
+def model_worker(index, ring_name, slots, slot_bytes, tasks, results, kwargs):
+    # pre-fork 모드의 모델 워커 프로세스 (WorkerPool 이 spawn)
+    # 공유 메모리 슬롯의 입력을 복사 없이 읽어서 워커 안의 MicroBatcher 로 배치 추론
+    try:
+        pill = PillDetectionApp(**kwargs)
+        ring = SharedRing(slots, slot_bytes, name=ring_name)
+        while not pill.warm:
+            if not pill.warmup_thread.is_alive() and not pill.warm:
+                raise RuntimeError("Warmup failed")
+            time.sleep(0.1)
+    except Exception as e:  # 가중치 누락 등 로드 실패는 WorkerPool 에 알리고 종료, 재시작은 WorkerPool 이 제한
+        results.put((None, index, False, RuntimeError(f"{type(e).__name__}: {e}")))
+        raise
+    results.put((None, index, True, pill.model_info()))
+
+    batchers = {'detect': pill.detect_batcher, 'classify': pill.classify_batcher}
+
+    def reply(task_id, futures, stacked):
+        try:
+            out = [f.result() for f in futures]  # 결과는 (검출 또는 확률, ..., 모델 파일 fingerprint) 튜플
+            out = [tuple(x.numpy() if isinstance(x, torch.Tensor) else x for x in r) for r in out]
+            results.put((task_id, index, True, out if stacked else out[0]))
+        except Exception as e:
+            results.put((task_id, index, False, RuntimeError(str(e))))  # 원래 예외는 pickle 이 안 될 수 있음
+
+    def when_all(task_id, futures, stacked):
+        # stacked 태스크는 행마다 따로 배치에 넣고, 마지막 행이 끝나면 한 번에 응답
+        pending, lock = [len(futures)], threading.Lock()
+
+        def done(_):
+            with lock:
+                pending[0] -= 1
+                last = pending[0] == 0
+            if last:
+                reply(task_id, futures, stacked)
+
+        for f in futures:
+            f.add_done_callback(done)
+
+    while True:
+        task_id, kind, slot, shape, dtype, meta, stacked = tasks.get()
+        im = ring.get(slot, shape, dtype)  # 결과를 돌려줄 때까지 슬롯은 재사용되지 않음
+        rows = list(im) if stacked else [im]
+        when_all(task_id, batchers[kind].enqueue_many([r if meta is None else (r, meta) for r in rows]), stacked)
+
+
 if __name__ == '__main__':
-    pill_app = PillDetectionApp()
-    pill_app.run()
\ No newline at end of file
+    # PILL_WORKERS=N 이면 모델 워커 프로세스 N 개로 실행, PILL_CACHE_SIZE=0 이면 결과 캐시 끔 (부하 테스트 등)
+    pill_app = PillDetectionApp(workers=int(os.getenv('PILL_WORKERS', 0)),
+                                cache_size=int(os.getenv('PILL_CACHE_SIZE', '1024')),
+                                cache_perceptual=os.getenv('PILL_CACHE_PERCEPTUAL') == '1')
+    pill_app.run()
@@ -1,13 +1,15 @@
 from flask import Flask, request, jsonify
-from werkzeug.utils import secure_filename
-import os
-import subprocess
-import re  # 정규식을 사용하기 위해 추가
+import cv2
+import numpy as np
+
+from detect2 import Detector
+from utils.general import LOGGER
 
 app = Flask(__name__)
 
-UPLOAD_FOLDER = './uploads'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# 모델은 서버 시작 시 한 번만 로드 (요청마다 detect2.py 를 subprocess 로 실행하지 않음)
+detector = Detector(weights='/content/best.pt', imgsz=(640, 640), conf_thres=0.4, iou_thres=0.5)
+detector.warmup()
 
 @app.route('/detect', methods=['POST'])
 def detect():
@@ -18,32 +20,20 @@ def detect():
     if image.filename == '':
         return jsonify({'success': False, 'message': 'No selected file'}), 400
 
-    # 이미지 파일을 저장할 경로
-    filename = secure_filename(image.filename)
-    image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    image.save(image_path)
-
-    # detect2.py 실행
     try:
-        result = subprocess.run(
-            ['python', 'detect2.py', '--weights', '/content/best.pt', '--imgsz', '640', 
-             '--conf-thres', '0.4', '--iou-thres', '0.5', '--source', image_path, 
-             '--save-csv', '--save-crop', '--project', '/content/runs/detect', 
-             '--name', 'pill_detection', '--exist-ok'], 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE, 
-            text=True
-        )
-        
-        # 출력에서 신뢰도 값 추출
-        output = result.stdout
-        print("Detect Output:", output)  # 여기에 추가
-        print(output)  # 디버깅을 위해 출력 내용 확인
-        confidence_match = re.search(r'Detected pills with confidence (\d+\.\d+)', output)
-
-        if confidence_match:
-            confidence = float(confidence_match.group(1))
-            
+        # 업로드 버퍼를 바로 디코딩 (임시 파일 없음)
+        img = cv2.imdecode(np.frombuffer(image.read(), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return jsonify({'success': False, 'message': 'Invalid image'}), 400
+
+        detections = detector(img)
+        LOGGER.debug(f"Detections: {detections}")
+        pills = [d for d in detections if d['label'] == 'pills']
+
+        if pills:
+            # NMS 결과는 신뢰도 내림차순이라 가장 신뢰도가 높은 알약 기준 (기존 로그 파싱과 다른, 의도한 변경)
+            confidence = round(pills[0]['confidence'], 2)
+
             # 신뢰도에 따른 응답
             if confidence >= 0.9:
                 return jsonify({'success': True, 'confidence': confidence})
@@ -56,6 +46,4 @@ def detect():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 if __name__ == '__main__':
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)  # 저장 폴더가 없으면 생성
     app.run(debug=True)
@@ -0,0 +1,167 @@
+"""
+ASGI 엔트리포인트 - app.py 의 PillDetectionApp 모델 설정/전처리/배처를 그대로 공유
+
+- 업로드 디코딩/크롭 등 CPU 전처리는 decode 스레드 풀에서 실행 (이벤트 루프를 막지 않음)
+- 모델 추론은 PillDetectionApp 의 배처 스레드(모델당 1개)에서만 실행되고,
+  torch / TF intra-op 스레드 수를 고정해서 동시 접속 수와 무관하게 처리량이 일정하게 유지됨
+- PILL_WORKERS=N 이면 모델을 N 개의 워커 프로세스에 나눠 올리고 입력은 공유 메모리로 전달 (GIL 경합 없음)
+- PILL_MODEL_VERSIONS="v3=...,v4=..." 로 분류 모델 버전을 등록하고 model_version 폼 필드로 선택
+  (기본: PILL_DEFAULT_VERSION)
+- PILL_CACHE_SIZE=0 이면 결과 캐시를 끔 (부하 테스트 등), PILL_CACHE_PERCEPTUAL=1 이면 dHash 키 (app.py 주의 참고)
+
+Usage:
+    $ PILL_DECODE_WORKERS=8 PILL_TORCH_THREADS=4 PILL_TF_THREADS=4 \\
+        uvicorn app_asgi:create_app --factory --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.general import check_requirements
+
+check_requirements(("starlette", "python-multipart", "uvicorn"))
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app import PillDetectionApp
+
+
+def create_app(base_dir=None, decode_workers=None, torch_threads=None, tf_threads=None, workers=None,
+               cache_size=None, cache_perceptual=None):
+    # uvicorn --factory 로 실행할 때는 환경 변수로 설정
+    base_dir = base_dir or os.getenv("PILL_BASE_DIR", "/home/ubuntu/flask")
+    decode_workers = decode_workers or int(os.getenv("PILL_DECODE_WORKERS", os.cpu_count() or 4))
+    torch_threads = torch_threads or int(os.getenv("PILL_TORCH_THREADS", 0))
+    tf_threads = tf_threads or int(os.getenv("PILL_TF_THREADS", 0))
+    workers = workers or int(os.getenv("PILL_WORKERS", 0))
+    cache_size = int(os.getenv("PILL_CACHE_SIZE", "1024")) if cache_size is None else cache_size
+    cache_perceptual = os.getenv("PILL_CACHE_PERCEPTUAL") == "1" if cache_perceptual is None else cache_perceptual
+
+    pill = PillDetectionApp(base_dir=base_dir, torch_threads=torch_threads, tf_threads=tf_threads, workers=workers,
+                            cache_size=cache_size, cache_perceptual=cache_perceptual)
+    pool = ThreadPoolExecutor(decode_workers, thread_name_prefix="decode")
+
+    async def run(fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+    async def infer(batcher, item):
+        # 배처 스레드의 Future 를 await, 대기 중에 스레드를 점유하지 않음
+        return await asyncio.wrap_future(batcher.enqueue(item))
+
+    async def infer_many(batcher, items):
+        return await asyncio.gather(*[asyncio.wrap_future(f) for f in batcher.enqueue_many(items)])
+
+    async def read_image(request):
+        # (업로드 바이트, model_version 폼 필드)
+        form = await request.form()
+        file = form.get('image')
+        return None if file is None or isinstance(file, str) else await file.read(), form.get('model_version')
+
+    def error(message, status):
+        return JSONResponse({'error': message}, status_code=status)
+
+    def overloaded():
+        return JSONResponse({'error': 'Server is busy, retry later'}, status_code=503, headers={'Retry-After': '1'})
+
+    async def detect(request):
+        buf, _ = await read_image(request)
+        if buf is None:
+            return error("No image file provided", 400)
+        try:
+            key, result = await run(pill.cache_get, 'detect', buf)
+            if result is None:
+                item, f = await run(pill.prepare_detect, buf)
+                det, files = await infer(pill.detect_batcher, item)
+                result = pill.format_detections(det, f)
+                pill.cache_put(key, result, files)
+            return JSONResponse(result)
+        except queue.Full:
+            return overloaded()
+        except Exception as e:
+            print(f"Error processing image: {str(e)}")
+            return error(f'Image processing error: {str(e)}', 500)
+
+    async def predict(request):
+        buf, requested = await read_image(request)
+        if buf is None:
+            return error('No image provided', 400)
+        version = pill.model_version(requested)
+        if version is None:
+            return JSONResponse(pill.unknown_version(requested), status_code=400)
+        try:
+            key, result = await run(pill.cache_get, 'predict', buf, version)
+            if result is None:
+                img = await run(pill.prepare_predict, buf)
+                if img is None:
+                    return error('Failed to crop pill from image', 400)
+                prediction = await infer(pill.classify_batcher, (img, version))
+                result = pill.format_prediction(prediction, version)
+                pill.cache_put(key, result, prediction[2])
+            return JSONResponse(result)
+        except queue.Full:
+            return overloaded()
+        except Exception as e:
+            print(f"Error processing image: {str(e)}")
+            return error(f'Image processing error: {str(e)}', 500)
+
+    async def scan(request):
+        buf, requested = await read_image(request)
+        if buf is None:
+            return error('No image provided', 400)
+        version = pill.model_version(requested)
+        if version is None:
+            return JSONResponse(pill.unknown_version(requested), status_code=400)
+        try:
+            key, result = await run(pill.cache_get, 'scan', buf, version)
+            if result is None:
+                img, item = await run(pill.prepare_scan, buf)
+                det, files = await infer(pill.detect_batcher, item)
+                det, crops = await run(pill.crop_detections, img, det)
+                predictions = await infer_many(pill.classify_batcher, [(crop, version) for crop in crops])
+                result = pill.format_scan(det, predictions, version)
+                pill.cache_put(key, result, files, *(p[2] for p in predictions))
+            return JSONResponse(result)
+        except queue.Full:
+            return overloaded()
+        except Exception as e:
+            print(f"Error processing image: {str(e)}")
+            return error(f'Image processing error: {str(e)}', 500)
+
+    async def metrics(request):
+        return JSONResponse({
+            "detect": pill.detect_batcher.stats.summary(),
+            "classify": pill.classify_batcher.stats.summary(),
+            "cache": pill.cache.summary() if pill.cache else None,
+            "models": None if pill.pool else {
+                "detect": pill.detectors.summary(),
+                "classify": pill.classifiers.summary()
+            }
+        })
+
+    async def healthz(request):
+        warm = pill.is_warm()
+        return JSONResponse({"warm": warm, "workers": pill.pool.n_ready() if pill.pool else None},
+                            status_code=200 if warm else 503)
+
+    return Starlette(
+        routes=[
+            Route('/detect', detect, methods=['POST']),
+            Route('/predict', predict, methods=['POST']),
+            Route('/scan', scan, methods=['POST']),
+            Route('/metrics', metrics, methods=['GET']),
+            Route('/healthz', healthz, methods=['GET']),
+        ],
+        middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    )
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(create_app(), host='0.0.0.0', port=5000)
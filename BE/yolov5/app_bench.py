@@ -0,0 +1,77 @@
+"""
+알약 서비스 부하 테스트 - 동시 클라이언트 수를 고정하고 처리량과 p50/p99 지연 시간을 비교
+
+서버의 결과 캐시가 같은 업로드를 다시 추론하지 않으므로, 요청마다 JPEG 끝(EOI 뒤)에 요청 번호를 붙여 바이트를 바꿈
+(디코딩 결과는 같음). 캐시 적중 경로를 재려면 --cached, 서버가 PILL_CACHE_PERCEPTUAL=1 이면 PILL_CACHE_SIZE=0 으로 실행
+
+Usage:
+    $ python app.py                                                            # Werkzeug threaded 서버 (:5000)
+    $ uvicorn app_asgi:create_app --factory --port 5001                        # ASGI 서버 (:5001)
+    $ python app_bench.py --image pill.jpg --concurrency 200 --requests 2000 \\
+        --url http://localhost:5000/detect http://localhost:5001/detect
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+
+def run(url, image, concurrency=50, n=500, timeout=60, cached=False):
+    local = threading.local()  # 클라이언트 스레드마다 keep-alive 세션 하나
+
+    def one(i):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        data = image if cached else image + f'{time.time_ns()}-{i}'.encode()  # 매번 다른 바이트, 캐시 적중 방지
+        t = time.perf_counter()
+        try:
+            r = local.session.post(url, files={'image': ('image.jpg', data, 'image/jpeg')}, timeout=timeout)
+            status = r.status_code
+        except requests.RequestException:
+            status = 0
+        return status, time.perf_counter() - t
+
+    t = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(n)))
+    dt = time.perf_counter() - t
+
+    status = np.array([s for s, _ in results])
+    latency = np.array([x for s, x in results if s == 200]) * 1e3  # ms
+    ok = len(latency)
+    return {
+        'url': url,
+        'ok': ok,
+        'rejected': int((status == 503).sum()),
+        'errors': int(n - ok - (status == 503).sum()),
+        'throughput': ok / dt,
+        'p50_ms': float(np.percentile(latency, 50)) if ok else 0.0,
+        'p99_ms': float(np.percentile(latency, 99)) if ok else 0.0,
+    }
+
+
+def main(opt):
+    with open(opt.image, 'rb') as f:
+        image = f.read()
+    print(f"{len(image) / 1e6:.2f} MB image, {opt.concurrency} concurrent clients, {opt.requests} requests per URL"
+          f"{', identical bytes (cache hits)' if opt.cached else ''}")
+    print(f"{'url':<40}{'ok':>7}{'503':>7}{'errors':>7}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}")
+    for url in opt.url:
+        run(url, image, opt.concurrency, min(opt.concurrency, opt.requests), cached=opt.cached)  # warmup
+        r = run(url, image, opt.concurrency, opt.requests, cached=opt.cached)
+        print(f"{url:<40}{r['ok']:>7}{r['rejected']:>7}{r['errors']:>7}"
+              f"{r['throughput']:>9.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', nargs='+', default=['http://localhost:5000/detect'], help='endpoint URL(s) to compare')
+    parser.add_argument('--image', required=True, help='image file to upload')
+    parser.add_argument('--concurrency', '-c', type=int, default=50, help='concurrent clients')
+    parser.add_argument('--requests', '-n', type=int, default=500, help='requests per URL')
+    parser.add_argument('--cached', action='store_true', help='send identical bytes, measuring result cache hits')
+    main(parser.parse_args())
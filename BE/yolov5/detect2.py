@@ -35,10 +35,12 @@ import platform
 import sys
 from pathlib import Path
 
+import numpy as np
 import torch
 import pathlib
-temp = pathlib.PosixPath
-pathlib.PosixPath = pathlib.WindowsPath
+if platform.system() == "Windows":  # load best.pt trained on Linux, importing this module elsewhere must not break Path
+    temp = pathlib.PosixPath
+    pathlib.PosixPath = pathlib.WindowsPath
 
 FILE = Path(__file__).resolve()
 ROOT = FILE.parents[0]  # YOLOv5 root directory
@@ -49,6 +51,7 @@ ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 from ultralytics.utils.plotting import Annotator, colors, save_one_box
 
 from models.common import DetectMultiBackend
+from utils.augmentations import letterbox
 from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImages, LoadScreenshots, LoadStreams
 from utils.general import (
     LOGGER,
@@ -69,6 +72,94 @@ from utils.general import (
 from utils.torch_utils import select_device, smart_inference_mode
 
 
+class Detector:
+    """
+    YOLOv5 detector that loads the model once and runs detection on in-memory images, e.g. behind a web API.
+
+    Example:
+        ```python
+        detector = Detector("best.pt", conf_thres=0.4, iou_thres=0.5)
+        detector.warmup()
+        results = detector(cv2.imread("pill.jpg"))  # [{'label': 'pills', 'class': 0, 'confidence': 0.93, 'bbox': ...}]
+        ```
+    """
+
+    def __init__(
+        self,
+        weights=ROOT / "yolov5s.pt",  # model path or triton URL
+        data=ROOT / "data/coco128.yaml",  # dataset.yaml path
+        imgsz=(640, 640),  # inference size (height, width)
+        conf_thres=0.25,  # confidence threshold
+        iou_thres=0.45,  # NMS IOU threshold
+        max_det=1000,  # maximum detections per image
+        device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
+        classes=None,  # filter by class: --class 0, or --class 0 2 3
+        agnostic_nms=False,  # class-agnostic NMS
+        half=False,  # use FP16 half-precision inference
+        dnn=False,  # use OpenCV DNN for ONNX inference
+    ):
+        """Loads the model once, storing the NMS settings applied to every call."""
+        self.device = select_device(device)
+        self.model = DetectMultiBackend(weights, device=self.device, dnn=dnn, data=data, fp16=half)
+        self.stride, self.names, self.pt = self.model.stride, self.model.names, self.model.pt
+        self.imgsz = check_img_size(imgsz, s=self.stride)  # check image size
+        self.conf_thres, self.iou_thres, self.max_det = conf_thres, iou_thres, max_det
+        self.classes, self.agnostic_nms = classes, agnostic_nms
+
+    def warmup(self, bs=1):
+        """Runs one dummy inference of batch size `bs` so the first real call does not pay for initialization."""
+        self.model.warmup(imgsz=(1 if self.pt or self.model.triton else bs, 3, *self.imgsz))
+
+    def preprocess(self, im):
+        """Converts a letterboxed CHW or BCHW uint8 RGB numpy image to a normalized BCHW model input tensor."""
+        im = torch.from_numpy(im).to(self.model.device)
+        im = im.half() if self.model.fp16 else im.float()  # uint8 to fp16/32
+        im /= 255  # 0 - 255 to 0.0 - 1.0
+        if len(im.shape) == 3:
+            im = im[None]  # expand for batch dim
+        return im
+
+    def forward(self, im, augment=False, visualize=False):
+        """Runs the model on BCHW tensor `im`, one image at a time for OpenVINO batches."""
+        if self.model.xml and im.shape[0] > 1:
+            pred = None
+            for image in torch.chunk(im, im.shape[0], 0):
+                if pred is None:
+                    pred = self.model(image, augment=augment, visualize=visualize).unsqueeze(0)
+                else:
+                    y = self.model(image, augment=augment, visualize=visualize).unsqueeze(0)
+                    pred = torch.cat((pred, y), dim=0)
+            return [pred, None]
+        return self.model(im, augment=augment, visualize=visualize)
+
+    def nms(self, pred):
+        """Applies non-max suppression with the detector settings, returning one (n, 6) tensor per image."""
+        if self.model.end2end:  # NMS already in the exported graph
+            return pred
+        return non_max_suppression(
+            pred, self.conf_thres, self.iou_thres, self.classes, self.agnostic_nms, max_det=self.max_det
+        )
+
+    @smart_inference_mode()
+    def __call__(self, im0, augment=False):
+        """
+        Detects objects in BGR HWC numpy image `im0`.
+
+        Returns:
+            (list[dict]): One dict per detection, highest confidence first, with 'label', 'class', 'confidence' and
+                'bbox' [x1, y1, x2, y2] in `im0` pixels.
+        """
+        im = letterbox(im0, self.imgsz, stride=self.stride, auto=self.pt)[0]  # padded resize
+        im = np.ascontiguousarray(im.transpose((2, 0, 1))[::-1])  # HWC to CHW, BGR to RGB
+        im = self.preprocess(im)
+        det = self.nms(self.forward(im, augment=augment))[0]
+        det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
+        return [
+            {"label": self.names[int(c)], "class": int(c), "confidence": conf, "bbox": [int(x) for x in xyxy]}
+            for *xyxy, conf, c in det.tolist()
+        ]
+
+
 @smart_inference_mode()
 def run(
     weights=ROOT / "yolov5s.pt",  # model path or triton URL
@@ -165,10 +256,9 @@ def run(
     (save_dir / "labels" if save_txt else save_dir).mkdir(parents=True, exist_ok=True)  # make dir
 
     # Load model
-    device = select_device(device)
-    model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
-    stride, names, pt = model.stride, model.names, model.pt
-    imgsz = check_img_size(imgsz, s=stride)  # check image size
+    detector = Detector(weights, data, imgsz, conf_thres, iou_thres, max_det, device, classes, agnostic_nms, half, dnn)
+    device, stride, names, pt = detector.device, detector.stride, detector.names, detector.pt
+    imgsz = detector.imgsz
 
     # Dataloader
     bs = 1  # batch_size
@@ -183,34 +273,19 @@ def run(
     vid_path, vid_writer = [None] * bs, [None] * bs
 
     # Run inference
-    model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
+    detector.warmup(bs)
     seen, windows, dt = 0, [], (Profile(device=device), Profile(device=device), Profile(device=device))
     for path, im, im0s, vid_cap, s in dataset:
         with dt[0]:
-            im = torch.from_numpy(im).to(model.device)
-            im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
-            im /= 255  # 0 - 255 to 0.0 - 1.0
-            if len(im.shape) == 3:
-                im = im[None]  # expand for batch dim
-            if model.xml and im.shape[0] > 1:
-                ims = torch.chunk(im, im.shape[0], 0)
+            im = detector.preprocess(im)
 
         # Inference
         with dt[1]:
             visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
-            if model.xml and im.shape[0] > 1:
-                pred = None
-                for image in ims:
-                    if pred is None:
-                        pred = model(image, augment=augment, visualize=visualize).unsqueeze(0)
-                    else:
-                        pred = torch.cat((pred, model(image, augment=augment, visualize=visualize).unsqueeze(0)), dim=0)
-                pred = [pred, None]
-            else:
-                pred = model(im, augment=augment, visualize=visualize)
+            pred = detector.forward(im, augment=augment, visualize=visualize)
         # NMS
         with dt[2]:
-            pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
+            pred = detector.nms(pred)
 
         # Second-stage classifier (optional)
         # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
@@ -281,8 +281,98 @@ def export_torchscript(model, im, file, optimize, prefix=colorstr("TorchScript:"
     return f, None
 
 
+def add_onnx_nms(model_onnx, conf_thres=0.25, iou_thres=0.45, max_det=100, topk=1000, agnostic=False):
+    """
+    Append TopK and NonMaxSuppression postprocessing to an exported YOLOv5 detection ONNX graph.
+
+    Args:
+        model_onnx (onnx.ModelProto): Exported model with a single output0 of shape (batch, anchors, 5 + nc).
+        conf_thres (float): Confidence threshold (obj * cls), boxes at or below it are discarded.
+        iou_thres (float): IoU threshold for NonMaxSuppression.
+        max_det (int): Maximum number of detections kept per image.
+        topk (int): Number of highest confidence candidates per image passed to NonMaxSuppression.
+        agnostic (bool): If True, run class-agnostic NMS.
+
+    Returns:
+        (onnx.ModelProto): The model with output0 replaced by detections of shape (n, 7), each row
+            (image_index, x1, y1, x2, y2, conf, cls) in input pixels, sorted by confidence within each image.
+
+    Notes:
+        Requires opset >= 12 (GatherND batch_dims). Each box keeps only its best class, matching
+        `non_max_suppression(..., multi_label=False)`.
+    """
+    import numpy as np
+    from onnx import TensorProto, helper, numpy_helper
+
+    graph = model_onnx.graph
+    opset = next(x.version for x in model_onnx.opset_import if x.domain in ("", "ai.onnx"))
+    assert opset >= 12, f"ONNX NMS export requires opset>=12, but model has opset {opset}"
+    pred = graph.output[0].name
+    nc = graph.output[0].type.tensor_type.shape.dim[2].dim_value - 5  # number of classes
+
+    def const(name, value, dtype=np.int64):
+        graph.initializer.append(numpy_helper.from_array(np.array(value, dtype=dtype), f"nms/{name}"))
+        return f"nms/{name}"
+
+    def node(op, inputs, outputs, **kwargs):
+        outputs = [f"nms/{x}" for x in outputs]
+        graph.node.append(helper.make_node(op, inputs, outputs, name=f"{outputs[0]}_{op}", **kwargs))
+        return outputs if len(outputs) > 1 else outputs[0]
+
+    def narrow(x, start, end, axis, name):
+        ends = const(f"{name}_start", [start]), const(f"{name}_end", [end]), const(f"{name}_axis", [axis])
+        return node("Slice", [x, *ends], [name])
+
+    xywh2xyxy = [[1, 0, 1, 0], [0, 1, 0, 1], [-0.5, 0, 0.5, 0], [0, -0.5, 0, 0.5]]
+    x = node("Cast", [pred], ["pred"], to=TensorProto.FLOAT)  # FP16 models
+    box = node("MatMul", [narrow(x, 0, 4, 2, "xywh"), const("xywh2xyxy", xywh2xyxy, np.float32)], ["xyxy"])
+    scores = node("Mul", [narrow(x, 4, 5, 2, "obj"), narrow(x, 5, 5 + nc, 2, "cls_conf")], ["scores"])  # obj * cls
+    j = node("ArgMax", [scores], ["j"], axis=2, keepdims=1)  # best class (b, anchors, 1)
+    conf = node("GatherElements", [scores, j], ["conf"], axis=2)
+    dets = node("Concat", [box, conf, node("Cast", [j], ["cls"], to=TensorProto.FLOAT)], ["dets"], axis=2)
+
+    # TopK candidates per image
+    flat = node("Reshape", [conf, const("flat_shape", [0, -1])], ["conf_flat"])  # (b, anchors)
+    anchors = narrow(node("Shape", [flat], ["flat_dims"]), 1, 2, 0, "anchors")
+    k = node("Min", [anchors, const("topk", [topk])], ["k"])
+    _, i = node("TopK", [flat, k], ["topk_conf", "topk_index"], axis=1, largest=1, sorted=1)
+    i = node("Reshape", [i, const("index_shape", [0, -1, 1])], ["topk_index3"])
+    cand = node("GatherND", [dets, i], ["cand"], batch_dims=1)  # (b, k, 6)
+
+    # NonMaxSuppression
+    box = narrow(cand, 0, 4, 2, "cand_box")
+    if not agnostic:
+        offset = node("Mul", [narrow(cand, 5, 6, 2, "cand_cls"), const("max_wh", 7680, np.float32)], ["offset"])
+        box = node("Add", [box, offset], ["nms_box"])  # boxes offset by class
+    score = node("Transpose", [narrow(cand, 4, 5, 2, "cand_conf")], ["nms_score"], perm=[0, 2, 1])  # (b, 1, k)
+    thres = const("iou_thres", [iou_thres], np.float32), const("conf_thres", [conf_thres], np.float32)
+    sel = node("NonMaxSuppression", [box, score, const("max_det", [max_det]), *thres], ["selected"])  # (n, 3)
+    b = narrow(sel, 0, 1, 1, "sel_image")
+    index = node("Concat", [b, narrow(sel, 2, 3, 1, "sel_box")], ["sel_index"], axis=1)  # (image, box) pairs
+    image = node("Cast", [b], ["image"], to=TensorProto.FLOAT)
+    y = node("Concat", [image, node("GatherND", [cand, index], ["sel_dets"])], ["y"], axis=1)
+
+    graph.node.append(helper.make_node("Identity", [y], ["detections"], name="nms/output"))
+    graph.output.pop()
+    graph.output.append(helper.make_tensor_value_info("detections", TensorProto.FLOAT, ["detections", 7]))
+    return model_onnx
+
+
 @try_export
-def export_onnx(model, im, file, opset, dynamic, simplify, prefix=colorstr("ONNX:")):
+def export_onnx(
+    model,
+    im,
+    file,
+    opset,
+    dynamic,
+    simplify,
+    nms=False,
+    conf_thres=0.25,
+    iou_thres=0.45,
+    max_det=100,
+    agnostic_nms=False,
+    prefix=colorstr("ONNX:"),
+):
     """
     Export a YOLOv5 model to ONNX format with dynamic axes support and optional model simplification.
 
@@ -293,6 +383,13 @@ def export_onnx(model, im, file, opset, dynamic, simplify, prefix=colorstr("ONNX
         opset (int): The ONNX opset version to use for export.
         dynamic (bool): If True, enables dynamic axes for batch, height, and width dimensions.
         simplify (bool): If True, applies ONNX model simplification for optimization.
+        nms (bool): If True, appends TopK + NonMaxSuppression to the graph (see `add_onnx_nms`), detection models only.
+        conf_thres (float): NMS confidence threshold baked into the graph when `nms` is True.
+        iou_thres (float): NMS IoU threshold baked into the graph when `nms` is True.
+        max_det (int): Maximum detections per image kept by the graph when `nms` is True, `--topk-all` on the CLI.
+            There is no per-class limit as the graph runs NMS once over class-offset boxes, so `--topk-per-class`
+            only applies to TF.js.
+        agnostic_nms (bool): If True, the graph runs class-agnostic NMS.
         prefix (str): A prefix string for logging messages, defaults to 'ONNX:'.
 
     Returns:
@@ -359,8 +456,19 @@ def export_onnx(model, im, file, opset, dynamic, simplify, prefix=colorstr("ONNX
     model_onnx = onnx.load(f)  # load onnx model
     onnx.checker.check_model(model_onnx)  # check onnx model
 
+    # NMS
+    if nms:
+        assert isinstance(model, DetectionModel) and not isinstance(model, SegmentationModel), (
+            "ONNX --nms export is only supported for detection models"
+        )
+        LOGGER.info(f"{prefix} adding NMS (conf {conf_thres}, iou {iou_thres}, max_det {max_det}) to graph...")
+        model_onnx = add_onnx_nms(model_onnx, conf_thres, iou_thres, max_det, agnostic=agnostic_nms)
+        onnx.checker.check_model(model_onnx)
+
     # Metadata
     d = {"stride": int(max(model.stride)), "names": model.names}
+    if nms:
+        d["nms"] = True  # outputs (n, 7) detections, DetectMultiBackend skips Python NMS
     for k, v in d.items():
         meta = model_onnx.metadata_props.add()
         meta.key, meta.value = k, str(v)
@@ -381,6 +489,120 @@ def export_onnx(model, im, file, opset, dynamic, simplify, prefix=colorstr("ONNX
     return f, model_onnx
 
 
+@try_export
+def export_onnx_int8(file, data, imgsz, samples=300, prefix=colorstr("ONNX INT8:")):
+    """
+    Statically quantize an exported YOLOv5 ONNX model to INT8 for ONNX Runtime CPU inference.
+
+    Args:
+        file (Path): Path of the source model; its FP32 `.onnx` export must already exist.
+        data (str): Dataset YAML; a random subset of its `train` images is used for calibration and the FP32 and INT8
+            models are compared on its `val` split.
+        imgsz (list[int]): Model input size (height, width).
+        samples (int): Number of calibration images. Default is 300.
+        prefix (str): Prefix for log messages. Default is 'ONNX INT8:'.
+
+    Returns:
+        (str, None): Path to the quantized `*_int8.onnx` model and None.
+
+    Notes:
+        Weights are quantized per channel to INT8 and activations to UINT8 (QDQ format, MinMax calibration). The Detect
+        head box decoding and any graph NMS downstream of the output convolutions are kept in FP32.
+
+    Example:
+        ```python
+        from pathlib import Path
+        export_onnx(model, im, Path('yolov5s.pt'), 12, False, False)
+        export_onnx_int8(Path('yolov5s.pt'), 'data/pill.yaml', [640, 640])  # -> yolov5s_int8.onnx
+        ```
+    """
+    check_requirements(("onnx>=1.12.0", "onnxruntime"))
+    import random
+
+    import numpy as np
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    import val as validate  # scoped to avoid circular import
+    from utils.augmentations import letterbox
+    from utils.dataloaders import LoadImagesAndLabels
+
+    LOGGER.info(f"\n{prefix} starting export with onnxruntime quantization...")
+    f_onnx, f = file.with_suffix(".onnx"), str(file.with_name(f"{file.stem}_int8.onnx"))
+    f_pre = file.with_name(f"{file.stem}_int8_pre.onnx")
+    quant_pre_process(str(f_onnx), str(f_pre), skip_symbolic_shape=True)  # fold constants, infer shapes
+    model_onnx = onnx.load(f_pre)
+
+    # Keep everything downstream of the Detect output convolutions (box decode, NMS) in FP32
+    consumers = {}
+    for node in model_onnx.graph.node:
+        for x in node.input:
+            consumers.setdefault(x, []).append(node)
+    heads = [n for n in model_onnx.graph.node if n.op_type == "Conv"]
+    heads = [n for n in heads if any(c.op_type == "Reshape" for c in consumers.get(n.output[0], []))]  # Detect.m
+    exclude, stack = set(), [x for n in heads for x in n.output]
+    while stack:
+        for node in consumers.get(stack.pop(), []):
+            if node.name not in exclude:
+                exclude.add(node.name)
+                stack.extend(node.output)
+
+    # Calibration images
+    dims = model_onnx.graph.input[0].type.tensor_type.shape.dim
+    bs = dims[0].dim_value or 1  # static batch size or 1 for dynamic
+    dataset = LoadImagesAndLabels(check_dataset(check_yaml(data))["train"], max(imgsz), prefix=f"{prefix} ")
+    index = random.Random(0).sample(range(len(dataset)), min(samples, len(dataset)))
+
+    class Calibration(CalibrationDataReader):
+        def __init__(self):
+            """Iterates over the calibration subset in model input batches."""
+            self.batches = iter(range(0, len(index), bs))
+
+        def get_next(self):
+            """Returns the next {input name: float32 BCHW batch} dict, or None when the subset is exhausted."""
+            i = next(self.batches, None)
+            if i is None:
+                return None
+            ims = [dataset.load_image(index[(i + k) % len(index)])[0] for k in range(bs)]
+            ims = [letterbox(x, imgsz, auto=False)[0] for x in ims]
+            im = np.stack(ims)[..., ::-1].transpose(0, 3, 1, 2)  # BGR to RGB, BHWC to BCHW
+            return {model_onnx.graph.input[0].name: np.ascontiguousarray(im, dtype=np.float32) / 255}
+
+    LOGGER.info(f"{prefix} calibrating on {len(index)} images, keeping {len(exclude)} head nodes in FP32...")
+    quantize_static(
+        model_onnx,
+        f,
+        Calibration(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=list(exclude),
+    )
+    f_pre.unlink()
+
+    # Metadata
+    model_int8 = onnx.load(f)
+    del model_int8.metadata_props[:]
+    for meta in onnx.load(f_onnx).metadata_props:
+        model_int8.metadata_props.add().CopyFrom(meta)
+    meta = model_int8.metadata_props.add()
+    meta.key, meta.value = "int8", str(True)
+    onnx.save(model_int8, f)
+
+    # mAP delta
+    try:
+        r = [validate.run(data, w, bs, max(imgsz), half=False, plots=False)[0] for w in (f_onnx, f)]
+        LOGGER.info(
+            f"{prefix} mAP50-95 {r[0][3]:.4f} FP32 -> {r[1][3]:.4f} INT8 ({r[1][3] - r[0][3]:+.4f}), "
+            f"mAP50 {r[0][2]:.4f} -> {r[1][2]:.4f} ({r[1][2] - r[0][2]:+.4f})"
+        )
+    except Exception as e:
+        LOGGER.info(f"{prefix} validation skipped: {e}")
+    return f, None
+
+
 @try_export
 def export_openvino(file, metadata, half, int8, data, prefix=colorstr("OpenVINO:")):
     """
@@ -1274,7 +1496,7 @@ def run(
     inplace=False,  # set YOLOv5 Detect() inplace=True
     keras=False,  # use Keras
     optimize=False,  # TorchScript: optimize for mobile
-    int8=False,  # CoreML/TF INT8 quantization
+    int8=False,  # CoreML/TF/OpenVINO/ONNX INT8 quantization
     per_tensor=False,  # TF per tensor quantization
     dynamic=False,  # ONNX/TF/TensorRT: dynamic axes
     simplify=False,  # ONNX: simplify model
@@ -1282,12 +1504,12 @@ def run(
     opset=12,  # ONNX: opset version
     verbose=False,  # TensorRT: verbose log
     workspace=4,  # TensorRT: workspace size (GB)
-    nms=False,  # TF: add NMS to model
-    agnostic_nms=False,  # TF: add agnostic NMS to model
+    nms=False,  # ONNX/OpenVINO/TF: add NMS to model
+    agnostic_nms=False,  # ONNX/OpenVINO/TF: add agnostic NMS to model
     topk_per_class=100,  # TF.js NMS: topk per class to keep
-    topk_all=100,  # TF.js NMS: topk for all classes to keep
-    iou_thres=0.45,  # TF.js NMS: IoU threshold
-    conf_thres=0.25,  # TF.js NMS: confidence threshold
+    topk_all=100,  # ONNX/TF.js NMS: topk for all classes to keep
+    iou_thres=0.45,  # ONNX/TF.js NMS: IoU threshold
+    conf_thres=0.25,  # ONNX/TF.js NMS: confidence threshold
 ):
     """
     Exports a YOLOv5 model to specified formats including ONNX, TensorRT, CoreML, and TensorFlow.
@@ -1303,17 +1525,17 @@ def run(
         inplace (bool): Set the YOLOv5 Detect() module inplace=True. Default is False.
         keras (bool): Flag to use Keras for TensorFlow SavedModel export. Default is False.
         optimize (bool): Optimize TorchScript model for mobile deployment. Default is False.
-        int8 (bool): Apply INT8 quantization for CoreML or TensorFlow models. Default is False.
+        int8 (bool): Apply INT8 quantization for CoreML, TensorFlow, OpenVINO or ONNX Runtime models. Default is False.
         per_tensor (bool): Apply per tensor quantization for TensorFlow models. Default is False.
         dynamic (bool): Enable dynamic axes for ONNX, TensorFlow, or TensorRT exports. Default is False.
         simplify (bool): Simplify the ONNX model during export. Default is False.
         opset (int): ONNX opset version. Default is 12.
         verbose (bool): Enable verbose logging for TensorRT export. Default is False.
         workspace (int): TensorRT workspace size in GB. Default is 4.
-        nms (bool): Add non-maximum suppression (NMS) to the TensorFlow model. Default is False.
-        agnostic_nms (bool): Add class-agnostic NMS to the TensorFlow model. Default is False.
+        nms (bool): Add non-maximum suppression (NMS) to the ONNX/OpenVINO or TensorFlow model. Default is False.
+        agnostic_nms (bool): Add class-agnostic NMS to the ONNX/OpenVINO or TensorFlow model. Default is False.
         topk_per_class (int): Top-K boxes per class to keep for TensorFlow.js NMS. Default is 100.
-        topk_all (int): Top-K boxes for all classes to keep for TensorFlow.js NMS. Default is 100.
+        topk_all (int): Top-K boxes for all classes to keep for ONNX and TensorFlow.js NMS. Default is 100.
         iou_thres (float): IoU threshold for NMS. Default is 0.45.
         conf_thres (float): Confidence threshold for NMS. Default is 0.25.
         mlmodel (bool): Flag to use *.mlmodel for CoreML export. Default is False.
@@ -1398,15 +1620,20 @@ def run(
 
     # Exports
     f = [""] * len(fmts)  # exported filenames
+    f_onnx_int8 = ""  # --int8 is shared with other formats, so the FP32 ONNX model stays in f[2]
     warnings.filterwarnings(action="ignore", category=torch.jit.TracerWarning)  # suppress TracerWarning
     if jit:  # TorchScript
         f[0], _ = export_torchscript(model, im, file, optimize)
     if engine:  # TensorRT required before ONNX
         f[1], _ = export_engine(model, im, file, half, dynamic, simplify, workspace, verbose)
     if onnx or xml:  # OpenVINO requires ONNX
-        f[2], _ = export_onnx(model, im, file, opset, dynamic, simplify)
+        f[2], _ = export_onnx(  # --nms keeps at most topk_all detections per image
+            model, im, file, opset, dynamic, simplify, nms, conf_thres, iou_thres, topk_all, agnostic_nms
+        )
     if xml:  # OpenVINO
-        f[3], _ = export_openvino(file, metadata, half, int8, data)
+        f[3], _ = export_openvino(file, {**metadata, "nms": True} if nms else metadata, half, int8, data)
+    if onnx and int8:  # ONNX Runtime INT8, after OpenVINO which converts the FP32 ONNX
+        f_onnx_int8, _ = export_onnx_int8(file, data, imgsz)
     if coreml:  # CoreML
         f[4], ct_model = export_coreml(model, im, file, int8, half, nms, mlmodel)
         if nms:
@@ -1442,7 +1669,7 @@ def run(
         f[10], _ = export_paddle(model, im, file, metadata)
 
     # Finish
-    f = [str(x) for x in f if x]  # filter out '' and None
+    f = [str(x) for x in (*f[:3], f_onnx_int8, *f[3:]) if x]  # filter out '' and None
     if any(f):
         cls, det, seg = (isinstance(model, x) for x in (ClassificationModel, DetectionModel, SegmentationModel))  # type
         det &= not seg  # segmentation models inherit from SegmentationModel(DetectionModel)
@@ -1494,7 +1721,7 @@ def parse_opt(known=False):
     parser.add_argument("--inplace", action="store_true", help="set YOLOv5 Detect() inplace=True")
     parser.add_argument("--keras", action="store_true", help="TF: use Keras")
     parser.add_argument("--optimize", action="store_true", help="TorchScript: optimize for mobile")
-    parser.add_argument("--int8", action="store_true", help="CoreML/TF/OpenVINO INT8 quantization")
+    parser.add_argument("--int8", action="store_true", help="CoreML/TF/OpenVINO/ONNX INT8 quantization")
     parser.add_argument("--per-tensor", action="store_true", help="TF per-tensor quantization")
     parser.add_argument("--dynamic", action="store_true", help="ONNX/TF/TensorRT: dynamic axes")
     parser.add_argument("--simplify", action="store_true", help="ONNX: simplify model")
@@ -1502,12 +1729,12 @@ def parse_opt(known=False):
     parser.add_argument("--opset", type=int, default=17, help="ONNX: opset version")
     parser.add_argument("--verbose", action="store_true", help="TensorRT: verbose log")
     parser.add_argument("--workspace", type=int, default=4, help="TensorRT: workspace size (GB)")
-    parser.add_argument("--nms", action="store_true", help="TF: add NMS to model")
-    parser.add_argument("--agnostic-nms", action="store_true", help="TF: add agnostic NMS to model")
+    parser.add_argument("--nms", action="store_true", help="ONNX/OpenVINO/TF/CoreML: add NMS to model")
+    parser.add_argument("--agnostic-nms", action="store_true", help="ONNX/OpenVINO/TF: add agnostic NMS to model")
     parser.add_argument("--topk-per-class", type=int, default=100, help="TF.js NMS: topk per class to keep")
-    parser.add_argument("--topk-all", type=int, default=100, help="TF.js NMS: topk for all classes to keep")
-    parser.add_argument("--iou-thres", type=float, default=0.45, help="TF.js NMS: IoU threshold")
-    parser.add_argument("--conf-thres", type=float, default=0.25, help="TF.js NMS: confidence threshold")
+    parser.add_argument("--topk-all", type=int, default=100, help="TF.js NMS: topk for all classes, ONNX: max_det")
+    parser.add_argument("--iou-thres", type=float, default=0.45, help="ONNX/TF.js NMS: IoU threshold")
+    parser.add_argument("--conf-thres", type=float, default=0.25, help="ONNX/TF.js NMS: confidence threshold")
     parser.add_argument(
         "--include",
         nargs="+",
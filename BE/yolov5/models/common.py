@@ -3,8 +3,10 @@
 
 import ast
 import contextlib
+import hashlib
 import json
 import math
+import os
 import platform
 import warnings
 import zipfile
@@ -47,6 +49,7 @@ from utils.general import (
     colorstr,
     increment_path,
     is_jupyter,
+    is_writeable,
     make_divisible,
     non_max_suppression,
     scale_boxes,
@@ -459,8 +462,24 @@ class Concat(nn.Module):
 class DetectMultiBackend(nn.Module):
     """YOLOv5 MultiBackend class for inference on various backends including PyTorch, ONNX, TensorRT, and more."""
 
-    def __init__(self, weights="yolov5s.pt", device=torch.device("cpu"), dnn=False, data=None, fp16=False, fuse=True):
-        """Initializes DetectMultiBackend with support for various inference backends, including PyTorch and ONNX."""
+    def __init__(
+        self,
+        weights="yolov5s.pt",
+        device=torch.device("cpu"),
+        dnn=False,
+        data=None,
+        fp16=False,
+        fuse=True,
+        ort_buffer_shapes=0,
+    ):
+        """
+        Initializes DetectMultiBackend with support for various inference backends, including PyTorch and ONNX.
+
+        `ort_buffer_shapes` > 0 makes ONNX Runtime write outputs into buffers kept for that many input shapes (batch
+        size included), e.g. len(letterbox_shapes(imgsz, auto=True)) * max batch size for a server. Outputs are then
+        returned without a copy and are overwritten by the next call with the same input shape, so callers must consume
+        them first, as non_max_suppression() does. 0 (default) returns fresh outputs on every call.
+        """
         #   PyTorch:              weights = *.pt
         #   TorchScript:                    *.torchscript
         #   ONNX Runtime:                   *.onnx
@@ -481,6 +500,8 @@ class DetectMultiBackend(nn.Module):
         fp16 &= pt or jit or onnx or engine or triton  # FP16
         nhwc = coreml or saved_model or pb or tflite or edgetpu  # BHWC formats (vs torch BCWH)
         stride = 32  # default stride
+        end2end = False  # model outputs NMS'd (n, 7) detections, exported with --nms
+        channels_last = False  # inputs converted to NHWC memory format, set by compile_for_serving()
         cuda = torch.cuda.is_available() and device.type != "cpu"  # use CUDA
         if not (pt or triton):
             w = attempt_download(w)  # download if not local
@@ -509,14 +530,19 @@ class DetectMultiBackend(nn.Module):
         elif onnx:  # ONNX Runtime
             LOGGER.info(f"Loading {w} for ONNX Runtime inference...")
             check_requirements(("onnx", "onnxruntime-gpu" if cuda else "onnxruntime"))
-            import onnxruntime
-
             providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if cuda else ["CPUExecutionProvider"]
-            session = onnxruntime.InferenceSession(w, providers=providers)
+            session = self._ort_session(w, providers)
+            int8 = session.get_modelmeta().custom_metadata_map.get("int8") == "True"  # export.py --include onnx --int8
+            if int8 and "CUDAExecutionProvider" in session.get_providers():  # QDQ graph, fused to QLinearConv on CPU
+                LOGGER.info("Using INT8 ONNX model on CPU")
+                session = self._ort_session(w, ["CPUExecutionProvider"])
             output_names = [x.name for x in session.get_outputs()]
+            ort_device = torch.device(device if "CUDAExecutionProvider" in session.get_providers() else "cpu")
+            binding, ort_buffers = session.io_binding(), OrderedDict()  # IOBinding and LRU input shape: outputs
             meta = session.get_modelmeta().custom_metadata_map  # metadata
             if "stride" in meta:
                 stride, names = int(meta["stride"]), eval(meta["names"])
+            end2end = meta.get("nms") == "True"
         elif xml:  # OpenVINO
             LOGGER.info(f"Loading {w} for OpenVINO inference...")
             check_requirements("openvino>=2023.0")  # requires openvino-dev: https://pypi.org/project/openvino-dev/
@@ -532,7 +558,9 @@ class DetectMultiBackend(nn.Module):
             if batch_dim.is_static:
                 batch_size = batch_dim.get_length()
             ov_compiled_model = core.compile_model(ov_model, device_name="AUTO")  # AUTO selects best available device
-            stride, names = self._load_metadata(Path(w).with_suffix(".yaml"))  # load metadata
+            meta = Path(w).with_suffix(".yaml")
+            stride, names = self._load_metadata(meta)  # load metadata
+            end2end = meta.exists() and yaml_load(meta).get("nms", False)
         elif engine:  # TensorRT
             LOGGER.info(f"Loading {w} for TensorRT inference...")
             import tensorrt as trt  # https://developer.nvidia.com/nvidia-tensorrt-download
@@ -683,6 +711,8 @@ class DetectMultiBackend(nn.Module):
             im = im.half()  # to FP16
         if self.nhwc:
             im = im.permute(0, 2, 3, 1)  # torch BCHW to numpy BHWC shape(1,320,192,3)
+        if self.channels_last:
+            im = im.contiguous(memory_format=torch.channels_last)
 
         if self.pt:  # PyTorch
             y = self.model(im, augment=augment, visualize=visualize) if augment or visualize else self.model(im)
@@ -693,8 +723,7 @@ class DetectMultiBackend(nn.Module):
             self.net.setInput(im)
             y = self.net.forward()
         elif self.onnx:  # ONNX Runtime
-            im = im.cpu().numpy()  # torch to numpy
-            y = self.session.run(self.output_names, {self.session.get_inputs()[0].name: im})
+            y = self._ort_run(im)
         elif self.xml:  # OpenVINO
             im = im.cpu().numpy()  # FP32
             y = list(self.ov_compiled_model(im).values())
@@ -753,11 +782,87 @@ class DetectMultiBackend(nn.Module):
             y = [x if isinstance(x, np.ndarray) else x.numpy() for x in y]
             y[0][..., :4] *= [w, h, w, h]  # xywh normalized to pixels
 
+        if self.end2end:  # y(n,7) = (image, x1, y1, x2, y2, conf, cls), split to per-image (n,6) like NMS output
+            y = self.from_numpy(y[0])
+            return [y[y[:, 0] == i, 1:] for i in range(b)]
         if isinstance(y, (list, tuple)):
             return self.from_numpy(y[0]) if len(y) == 1 else [self.from_numpy(x) for x in y]
         else:
             return self.from_numpy(y)
 
+    def _ort_run(self, im):
+        """Runs ONNX Runtime through IOBinding, reading `im` in place and, with `ort_buffer_shapes`, writing
+        static-shaped outputs into buffers reused per input shape.
+        """
+        dtypes = {torch.float32: np.float32, torch.float16: np.float16, torch.int64: np.int64}
+        d, index = self.ort_device.type, self.ort_device.index or 0
+        im = im.to(self.ort_device).contiguous()
+        self.binding.bind_input(self.session.get_inputs()[0].name, d, index, dtypes[im.dtype], im.shape, im.data_ptr())
+        buffers = self.ort_buffers.get(im.shape)
+        if buffers:
+            self.ort_buffers.move_to_end(im.shape)
+        for i, name in enumerate(self.output_names):
+            if buffers:
+                x = buffers[i]
+                self.binding.bind_output(name, d, index, dtypes[x.dtype], x.shape, x.data_ptr())
+            else:
+                self.binding.bind_output(name, d, index)  # allocated by ORT
+        self.session.run_with_iobinding(self.binding)
+        if buffers:
+            return buffers  # overwritten by the next call with this shape
+        y = [torch.from_numpy(x).to(self.ort_device) for x in self.binding.copy_outputs_to_cpu()]
+        if self.ort_buffer_shapes and not self.end2end:  # (n, 7) NMS output size varies per call
+            if len(self.ort_buffers) >= self.ort_buffer_shapes:
+                self.ort_buffers.popitem(last=False)  # drop the least recently used input shape
+            self.ort_buffers[im.shape] = y
+        return y
+
+    def compile_for_serving(self, imgsz=(640, 640), mode="jit"):
+        """
+        Compiles a fused PyTorch model for inference at a fixed input size, caching the artefact next to the weights.
+
+        mode    'channels_last' only converts the model to NHWC memory format
+                'jit' also traces, freezes and optimizes the model with TorchScript for `imgsz` inputs of any batch size
+                'compile' also wraps the model in torch.compile(), caching inductor kernels per weights and torch
+        """
+        if not self.pt:
+            LOGGER.warning(f"WARNING ⚠️ compile_for_serving() supports *.pt models only, using {self.w} as is")
+            return self
+        self.model.to(memory_format=torch.channels_last)
+        self.channels_last = True
+        if mode == "channels_last":
+            return self
+
+        # Cache key: weights file contents, torch version, mode, input size, device type and precision
+        w = Path(self.w)
+        digest = hashlib.md5(w.read_bytes()).hexdigest()
+        key = str((digest, torch.__version__, mode, tuple(imgsz), self.device.type, self.fp16))
+        key = hashlib.md5(key.encode()).hexdigest()[:8]
+        if mode == "compile":
+            check_version(torch.__version__, "2.0.0", hard=True)
+            os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(w.with_name(f"{w.stem}.{key}.inductor")))
+            self.model = torch.compile(self.model, dynamic=False)
+            return self
+        if mode != "jit":
+            raise ValueError(f"Unknown compile mode '{mode}', expected 'channels_last', 'jit' or 'compile'")
+
+        f = w.with_name(f"{w.stem}.{key}.serving.torchscript")
+        if f.exists():
+            LOGGER.info(f"Loading compiled TorchScript model from {f}")
+            model = torch.jit.load(str(f), map_location=self.device)
+        else:
+            LOGGER.info(f"Compiling {w} with TorchScript for {imgsz[0]}x{imgsz[1]} inputs...")
+            self.model.model[-1].export = True  # Detect() returns (pred,) only
+            im = torch.zeros(1, 3, *imgsz, dtype=torch.half if self.fp16 else torch.float, device=self.device)
+            with torch.no_grad():
+                im = im.contiguous(memory_format=torch.channels_last)
+                model = torch.jit.trace(self.model.eval(), im, strict=False)
+                model = torch.jit.optimize_for_inference(torch.jit.freeze(model))
+            if is_writeable(w.parent):
+                model.save(str(f))
+        self.model, self.pt, self.jit = model, False, True
+        return self
+
     def from_numpy(self, x):
         """Converts a NumPy array to a torch tensor, maintaining device compatibility."""
         return torch.from_numpy(x).to(self.device) if isinstance(x, np.ndarray) else x
@@ -790,6 +895,54 @@ class DetectMultiBackend(nn.Module):
         triton = not any(types) and all([any(s in url.scheme for s in ["http", "grpc"]), url.netloc])
         return types + [triton]
 
+    @staticmethod
+    def _ort_session(w, providers):
+        """
+        Creates an ONNX Runtime session configured from environment variables, caching the optimized graph on disk.
+
+        ORT_INTRA_OP_THREADS    intra-op threads, default torch.get_num_threads()
+        ORT_INTER_OP_THREADS    inter-op threads, default 1
+        ORT_EXECUTION_MODE      'sequential' (default) or 'parallel'
+        ORT_GRAPH_OPTIMIZATION  'disable', 'basic', 'extended' or 'all' (default)
+        ORT_CACHE               '0' to disable the optimized model cache saved next to the model
+        """
+        import onnxruntime
+
+        levels = {
+            "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }
+        level = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = int(os.getenv("ORT_INTRA_OP_THREADS", torch.get_num_threads()))
+        options.inter_op_num_threads = int(os.getenv("ORT_INTER_OP_THREADS", 1))
+        options.execution_mode = (
+            onnxruntime.ExecutionMode.ORT_PARALLEL
+            if os.getenv("ORT_EXECUTION_MODE", "sequential") == "parallel"
+            else onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        )
+        options.graph_optimization_level = levels[level]
+
+        # Optimized model cache, keyed by model file, onnxruntime version, providers and optimization level. 'all' adds
+        # layout optimizations specific to the CPU instruction set, so the cache stops at 'extended' and those are
+        # applied again on load, keeping the file valid if the model directory is shared or copied to other hardware
+        w = Path(w)
+        if os.getenv("ORT_CACHE", "1") != "0" and level != "disable" and is_writeable(w.parent):
+            cached = "extended" if level == "all" else level
+            st = w.stat()
+            key = str((st.st_size, st.st_mtime_ns, onnxruntime.__version__, providers, cached))
+            cache = w.with_name(f"{w.stem}.{hashlib.md5(key.encode()).hexdigest()[:8]}.ort.onnx")
+            if not cache.exists():
+                options.graph_optimization_level, options.optimized_model_filepath = levels[cached], str(cache)
+                onnxruntime.InferenceSession(str(w), options, providers=providers)  # saves the cache
+                options.optimized_model_filepath = ""
+            LOGGER.info(f"Loading optimized ONNX Runtime graph from {cache}")
+            options.graph_optimization_level = levels["all" if level == "all" else "disable"]  # rest already applied
+            return onnxruntime.InferenceSession(str(cache), options, providers=providers)
+        return onnxruntime.InferenceSession(str(w), options, providers=providers)
+
     @staticmethod
     def _load_metadata(f=Path("path/to/meta.yaml")):
         """Loads metadata from a YAML file, returning strides and names if the file exists, otherwise `None`."""
@@ -896,15 +1049,16 @@ class AutoShape(nn.Module):
 
             # Post-process
             with dt[2]:
-                y = non_max_suppression(
-                    y if self.dmb else y[0],
-                    self.conf,
-                    self.iou,
-                    self.classes,
-                    self.agnostic,
-                    self.multi_label,
-                    max_det=self.max_det,
-                )  # NMS
+                if not (self.dmb and self.model.end2end):  # exported with --nms
+                    y = non_max_suppression(
+                        y if self.dmb else y[0],
+                        self.conf,
+                        self.iou,
+                        self.classes,
+                        self.agnostic,
+                        self.multi_label,
+                        max_det=self.max_det,
+                    )  # NMS
                 for i in range(n):
                     scale_boxes(shape1, y[i][:, :4], shape0[i])
 
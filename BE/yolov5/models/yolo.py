@@ -12,6 +12,7 @@ import math
 import os
 import platform
 import sys
+from collections import OrderedDict
 from copy import deepcopy
 from pathlib import Path
 
@@ -75,6 +76,7 @@ class Detect(nn.Module):
     stride = None  # strides computed during build
     dynamic = False  # force grid reconstruction
     export = False  # export mode
+    grid_cache_size = 128  # max cached (grid, anchor_grid) pairs, one per (nx, ny, level, dtype, device)
 
     def __init__(self, nc=80, anchors=(), ch=(), inplace=True):
         """Initializes YOLOv5 detection layer with specified classes, anchors, channels, and inplace operations."""
@@ -85,6 +87,7 @@ class Detect(nn.Module):
         self.na = len(anchors[0]) // 2  # number of anchors
         self.grid = [torch.empty(0) for _ in range(self.nl)]  # init grid
         self.anchor_grid = [torch.empty(0) for _ in range(self.nl)]  # init anchor grid
+        self.grid_cache = OrderedDict()  # (nx, ny, i, dtype, device) -> (grid, anchor_grid), LRU
         self.register_buffer("anchors", torch.tensor(anchors).float().view(self.nl, -1, 2))  # shape(nl,na,2)
         self.m = nn.ModuleList(nn.Conv2d(x, self.no * self.na, 1) for x in ch)  # output conv
         self.inplace = inplace  # use inplace ops (e.g. slice assignment)
@@ -99,7 +102,8 @@ class Detect(nn.Module):
 
             if not self.training:  # inference
                 if self.dynamic or self.grid[i].shape[2:4] != x[i].shape[2:4]:
-                    self.grid[i], self.anchor_grid[i] = self._make_grid(nx, ny, i)
+                    make_grid = self._make_grid if self.dynamic or self.export else self._cached_grid
+                    self.grid[i], self.anchor_grid[i] = make_grid(nx, ny, i)
 
                 if isinstance(self, Segment):  # (boxes + masks)
                     xy, wh, conf, mask = x[i].split((2, 2, self.nc + 1, self.no - self.nc - 5), 4)
@@ -126,6 +130,33 @@ class Detect(nn.Module):
         anchor_grid = (self.anchors[i] * self.stride[i]).view((1, self.na, 1, 1, 2)).expand(shape)
         return grid, anchor_grid
 
+    def __getstate__(self):
+        """Drops the grid cache when pickling, e.g. into checkpoints or EMA copies, as grids are rebuilt on use."""
+        state = nn.Module.__getstate__(self) if hasattr(nn.Module, "__getstate__") else self.__dict__
+        return {**state, "grid_cache": OrderedDict()}
+
+    def _cached_grid(self, nx=20, ny=20, i=0):
+        """Returns the (grid, anchor_grid) pair for level `i` at `nx` x `ny` from the LRU grid cache, built once."""
+        if not hasattr(self, "grid_cache"):  # models saved before the grid cache
+            self.grid_cache = OrderedDict()
+        key = nx, ny, i, self.anchors.dtype, self.anchors.device
+        if key in self.grid_cache:
+            self.grid_cache.move_to_end(key)
+        else:
+            self.grid_cache[key] = self._make_grid(nx, ny, i)
+            if len(self.grid_cache) > self.grid_cache_size:
+                self.grid_cache.popitem(last=False)
+        return self.grid_cache[key]
+
+    def cache_grids(self, shapes):
+        """Prebuilds grids for every level of each (h, w) input shape so forward() does not allocate them at serving
+        time, growing the cache to fit.
+        """
+        keys = {(int(w // s), int(h // s), i) for h, w in shapes for i, s in enumerate(self.stride.tolist())}
+        self.grid_cache_size = max(self.grid_cache_size, len(keys))
+        for nx, ny, i in sorted(keys):
+            self._cached_grid(nx, ny, i)
+
 
 class Segment(Detect):
     """YOLOv5 Segment head for segmentation models, extending Detect with mask and prototype layers."""
@@ -212,6 +243,7 @@ class BaseModel(nn.Module):
             m.grid = list(map(fn, m.grid))
             if isinstance(m.anchor_grid, list):
                 m.anchor_grid = list(map(fn, m.anchor_grid))
+            m.grid_cache = OrderedDict()  # rebuilt for the new device / dtype on use
         return self
 
 
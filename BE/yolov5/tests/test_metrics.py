@@ -0,0 +1,105 @@
+# Ultralytics YOLOv5 🚀, AGPL-3.0 license
+"""Tests that the vectorized ap_per_class() and ConfusionMatrix paths match the original per-class loops."""
+
+import numpy as np
+import pytest
+import torch
+
+from utils.metrics import ConfusionMatrix, ap_per_class
+
+
+def assert_ap_per_class_equal(tp, conf, pred_cls, target_cls):
+    """Asserts ap_per_class() returns the same (tp, fp, p, r, f1, ap, classes) with and without vectorization."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        loop = ap_per_class(tp, conf, pred_cls, target_cls, names={}, vectorized=False)
+        vectorized = ap_per_class(tp, conf, pred_cls, target_cls, names={}, vectorized=True)
+    for a, b in zip(loop, vectorized):
+        assert a.shape == b.shape
+        np.testing.assert_allclose(a, b, rtol=0, atol=1e-12)
+
+
+def cap_tp(tp, pred_cls, target_cls):
+    """Clears the TPs beyond the number of targets of each class, as val.py matches every target at most once."""
+    for c in np.unique(pred_cls):
+        i = pred_cls == c
+        tp[i] &= tp[i].cumsum(0) <= (target_cls == c).sum()
+    return tp
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_ap_per_class_random(seed):
+    """Random predictions over up to 30 classes, with coarse confidences so some are tied."""
+    rng = np.random.default_rng(seed)
+    n, nc = rng.integers(1, 500), rng.integers(1, 30)
+    tp = rng.random((n, 10)) < np.linspace(0.8, 0.2, 10)  # fewer TPs at higher IoU thresholds
+    conf = rng.random(n).round(rng.integers(1, 4))
+    pred_cls = rng.integers(0, nc, n).astype(float)
+    target_cls = rng.integers(0, nc, rng.integers(1, 300)).astype(float)
+    assert_ap_per_class_equal(cap_tp(tp, pred_cls, target_cls), conf, pred_cls, target_cls)
+
+
+@pytest.mark.parametrize(
+    "tp, conf, pred_cls, target_cls",
+    [
+        (np.zeros((0, 10), bool), np.zeros(0), np.zeros(0), np.array([0.0, 1.0, 1.0])),  # no predictions
+        (np.ones((1, 10), bool), np.array([0.9]), np.array([0.0]), np.array([0.0])),  # single TP
+        (
+            np.zeros((1, 10), bool),
+            np.array([0.9]),
+            np.array([2.0]),
+            np.array([0.0, 1.0]),
+        ),  # single FP, no class 2 target
+        (np.arange(4)[:, None] < [2] * 10, np.full(4, 0.5), np.zeros(4), np.zeros(2)),  # all tied
+        (np.eye(4, 10, dtype=bool), np.full(4, 0.5), np.array([0.0, 1.0, 0.0, 1.0]), np.array([0.0, 1.0])),  # ties
+        (np.eye(3, 10, dtype=bool), np.array([0.9, 0.8, 0.7]), np.array([5.0, 5.0, 6.0]), np.array([5.0, 7.0])),  # gaps
+    ],
+)
+def test_ap_per_class_edge_cases(tp, conf, pred_cls, target_cls):
+    """Empty predictions, single predictions, ties and classes without targets or without predictions."""
+    assert_ap_per_class_equal(tp, conf, pred_cls, target_cls)
+
+
+def confusion_matrices(detections, labels, nc=5):
+    """Returns the (loop, vectorized) ConfusionMatrix.matrix after processing one batch."""
+    matrices = []
+    for vectorized in False, True:
+        cm = ConfusionMatrix(nc, vectorized=vectorized)
+        cm.process_batch(detections, labels)
+        matrices.append(cm.matrix)
+    return matrices
+
+
+def random_boxes(rng, n, nc=5):
+    """Returns (n, 4) xyxy boxes in a 100 x 100 image and (n,) classes, clustered so that many boxes overlap."""
+    xy = rng.integers(0, 4, (n, 2)) * 25 + rng.random((n, 2)) * 5
+    wh = 20 + rng.random((n, 2)) * 10
+    return torch.tensor(np.concatenate((xy, xy + wh), 1), dtype=torch.float32), torch.tensor(rng.integers(0, nc, n))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_confusion_matrix_random(seed):
+    """Random overlapping detections and labels, including labels matched by several detections."""
+    rng = np.random.default_rng(seed)
+    boxes, cls = random_boxes(rng, rng.integers(1, 40))
+    detections = torch.cat((boxes, torch.rand(len(boxes), 1), cls[:, None].float()), 1)
+    boxes, cls = random_boxes(rng, rng.integers(1, 20))
+    labels = torch.cat((cls[:, None].float(), boxes), 1)
+    loop, vectorized = confusion_matrices(detections, labels)
+    np.testing.assert_array_equal(loop, vectorized)
+
+
+@pytest.mark.parametrize(
+    "detections, labels",
+    [
+        (None, torch.tensor([0.0, 3.0, 3.0])),  # no detections, labels are classes only
+        (torch.zeros((0, 6)), torch.tensor([[1.0, 0, 0, 10, 10]])),  # empty detections
+        (torch.tensor([[0.0, 0, 10, 10, 0.9, 1]]), torch.tensor([[1.0, 0, 0, 10, 10]])),  # single correct match
+        (torch.tensor([[0.0, 0, 10, 10, 0.9, 2]]), torch.tensor([[1.0, 50, 50, 60, 60]])),  # single unmatched
+        (torch.tensor([[0.0, 0, 10, 10, 0.9, 2]]), torch.zeros((0, 5))),  # no labels
+        (torch.tensor([[0.0, 0, 10, 10, 0.9, 1], [0, 0, 10, 10, 0.8, 2]]), torch.tensor([[1.0, 0, 0, 10, 10]])),  # tie
+    ],
+)
+def test_confusion_matrix_edge_cases(detections, labels):
+    """No or empty detections, single matched or unmatched detections, no labels and equal-IoU duplicates."""
+    loop, vectorized = confusion_matrices(detections, labels)
+    np.testing.assert_array_equal(loop, vectorized)
@@ -0,0 +1,76 @@
+# Ultralytics YOLOv5 🚀, AGPL-3.0 license
+"""Tests that the vectorized and fast non_max_suppression() paths match the original per-image loop."""
+
+import pytest
+import torch
+
+from utils.general import non_max_suppression
+from utils.nms_benchmark import synthetic_prediction
+
+
+def assert_nms_equal(prediction, **kwargs):
+    """Asserts the vectorized and fast NMS return the same detections per image as the loop for `kwargs`."""
+    loop = non_max_suppression(prediction.clone(), **kwargs)
+    for mode in {"vectorized": True}, {"fast": True, "topk": prediction.shape[1]}:  # top-k dropping no candidates
+        out = non_max_suppression(prediction.clone(), **mode, **kwargs)
+        assert len(out) == len(loop)
+        for a, b in zip(loop, out):
+            assert a.shape == b.shape
+            torch.testing.assert_close(a, b, rtol=0, atol=0)
+
+
+@pytest.mark.parametrize("bs", [1, 2, 8])
+@pytest.mark.parametrize("nc", [1, 5])
+@pytest.mark.parametrize("seed", range(3))
+def test_nms_random(bs, nc, seed):
+    """Clusters of overlapping confident boxes, for single images and batches, single- and multi-class models."""
+    p = synthetic_prediction(bs, nc=nc, anchors=6000, objects=15, seed=seed)
+    assert_nms_equal(p, conf_thres=0.25, iou_thres=0.45)
+
+
+@pytest.mark.parametrize("bs", [1, 4])
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"agnostic": True},
+        {"classes": [0, 3]},
+        {"multi_label": True},
+        {"max_det": 3},  # truncation
+        {"agnostic": True, "max_det": 1},
+        {"conf_thres": 0.999},  # (nearly) no candidates
+    ],
+)
+def test_nms_options(bs, kwargs):
+    """Class-agnostic NMS, class filtering, multi-label, max_det truncation and near-empty outputs."""
+    p = synthetic_prediction(bs, nc=5, anchors=6000, objects=15, seed=bs)
+    assert_nms_equal(p, **{"conf_thres": 0.25, "iou_thres": 0.45, **kwargs})
+
+
+@pytest.mark.parametrize("bs", [1, 3])
+def test_nms_empty(bs):
+    """Predictions without any candidate above the confidence threshold return (0, 6) tensors for every image."""
+    p = synthetic_prediction(bs, nc=3, anchors=600)
+    p[..., 4] = 0
+    assert_nms_equal(p, conf_thres=0.25, iou_thres=0.45)
+    assert all(x.shape == (0, 6) for x in non_max_suppression(p, vectorized=True))
+
+
+def test_nms_some_images_empty():
+    """A batch where only some images have candidates keeps the per-image order and empty outputs."""
+    p = synthetic_prediction(4, nc=3, anchors=6000, objects=10)
+    p[1::2, :, 4] = 0
+    assert_nms_equal(p, conf_thres=0.25, iou_thres=0.45)
+
+
+def test_nms_iou_at_threshold():
+    """Boxes whose float32 IoU is just above iou_thres and float64 IoU just below, in a batch of two images."""
+    p = torch.zeros(2, 3, 6)
+    p[:, :2, :4] = torch.tensor(
+        [
+            [291.0516357421875, 215.6287078857422, 83.47140502929688, 87.66915893554688],
+            [315.3731994628906, 226.4010467529297, 79.14373779296875, 98.43838500976562],
+        ]
+    )
+    p[:, :2, 4:] = torch.tensor([[0.9, 1.0], [0.8, 1.0]])
+    assert len(non_max_suppression(p.clone(), iou_thres=0.45)[0]) == 1  # suppressed by the per-image loop
+    assert_nms_equal(p, conf_thres=0.25, iou_thres=0.45)
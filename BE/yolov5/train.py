@@ -49,6 +49,7 @@ from models.experimental import attempt_load
 from models.yolo import Model
 from utils.autoanchor import check_anchors
 from utils.autobatch import check_train_batch_size
+from utils.batch_augmentations import BatchAugment
 from utils.callbacks import Callbacks
 from utils.dataloaders import create_dataloader
 from utils.downloads import attempt_download, is_url
@@ -282,13 +283,16 @@ def train(hyp, opt, device, callbacks):
         LOGGER.info("Using SyncBatchNorm()")
 
     # Trainloader
+    batch_augment = None
+    if opt.batch_augment:  # mosaic, perspective, mixup, HSV and flips on whole batches on the training device
+        batch_augment = BatchAugment({**hyp, "mosaic": 0.0} if opt.rect else hyp)  # no mosaic in rect training
     train_loader, dataset = create_dataloader(
         train_path,
         imgsz,
         batch_size // WORLD_SIZE,
         gs,
         single_cls,
-        hyp=hyp,
+        hyp=BatchAugment.dataset_hyp(hyp) if batch_augment else hyp,
         augment=True,
         cache=None if opt.cache == "val" else opt.cache,
         rect=opt.rect,
@@ -377,7 +381,7 @@ def train(hyp, opt, device, callbacks):
         # dataset.mosaic_border = [b - imgsz, -b]  # height, width borders
 
         mloss = torch.zeros(3, device=device)  # mean losses
-        if RANK != -1:
+        if RANK != -1 and hasattr(train_loader.sampler, "set_epoch"):  # --rect BucketBatchSampler sets its own epoch
             train_loader.sampler.set_epoch(epoch)
         pbar = enumerate(train_loader)
         LOGGER.info(("\n" + "%11s" * 7) % ("Epoch", "GPU_mem", "box_loss", "obj_loss", "cls_loss", "Instances", "Size"))
@@ -388,6 +392,8 @@ def train(hyp, opt, device, callbacks):
             callbacks.run("on_train_batch_start")
             ni = i + nb * epoch  # number integrated batches (since train start)
             imgs = imgs.to(device, non_blocking=True).float() / 255  # uint8 to float32, 0-255 to 0.0-1.0
+            if batch_augment:
+                imgs, targets = batch_augment(imgs, targets)
 
             # Warmup
             if ni <= nw:
@@ -583,7 +589,7 @@ def parse_opt(known=False):
     )
     parser.add_argument("--resume_evolve", type=str, default=None, help="resume evolve from last generation")
     parser.add_argument("--bucket", type=str, default="", help="gsutil bucket")
-    parser.add_argument("--cache", type=str, nargs="?", const="ram", help="image --cache ram/disk")
+    parser.add_argument("--cache", type=str, nargs="?", const="ram", help="image --cache ram/disk/mmap")
     parser.add_argument("--image-weights", action="store_true", help="use weighted image selection for training")
     parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
     parser.add_argument("--multi-scale", action="store_true", help="vary img-size +/- 50%%")
@@ -595,6 +601,7 @@ def parse_opt(known=False):
     parser.add_argument("--name", default="exp", help="save to project/name")
     parser.add_argument("--exist-ok", action="store_true", help="existing project/name ok, do not increment")
     parser.add_argument("--quad", action="store_true", help="quad dataloader")
+    parser.add_argument("--batch-augment", action="store_true", help="augment whole batches on device, not per image")
     parser.add_argument("--cos-lr", action="store_true", help="cosine LR scheduler")
     parser.add_argument("--label-smoothing", type=float, default=0.0, help="Label smoothing epsilon")
     parser.add_argument("--patience", type=int, default=100, help="EarlyStopping patience (epochs without improvement)")
@@ -940,7 +947,7 @@ def run(**kwargs):
         evolve_population (str, optional): Directory for loading population during evolution. Defaults to ROOT / 'data/ hyps'.
         resume_evolve (str, optional): Resume hyperparameter evolution from the last generation. Defaults to None.
         bucket (str, optional): gsutil bucket for saving checkpoints. Defaults to an empty string.
-        cache (str, optional): Cache image data in 'ram' or 'disk'. Defaults to None.
+        cache (str, optional): Cache image data in 'ram', 'disk' or 'mmap'. Defaults to None.
         image_weights (bool, optional): Use weighted image selection for training. Defaults to False.
         device (str, optional): CUDA device identifier, e.g., '0', '0,1,2,3', or 'cpu'. Defaults to an empty string.
         multi_scale (bool, optional): Use multi-scale training, varying image size by ±50%. Defaults to False.
@@ -952,6 +959,8 @@ def run(**kwargs):
         name (str, optional): Name for saving the training run. Defaults to 'exp'.
         exist_ok (bool, optional): Allow existing project/name without incrementing. Defaults to False.
         quad (bool, optional): Use quad dataloader. Defaults to False.
+        batch_augment (bool, optional): Apply mosaic, perspective, mixup, HSV and flip augmentations to whole batches on
+            the training device instead of per image in dataloader workers. Defaults to False.
         cos_lr (bool, optional): Use cosine learning rate scheduler. Defaults to False.
         label_smoothing (float, optional): Label smoothing epsilon value. Defaults to 0.0.
         patience (int, optional): Patience for early stopping, measured in epochs without improvement. Defaults to 100.
@@ -0,0 +1,93 @@
+# Ultralytics YOLOv5 🚀, AGPL-3.0 license
+"""
+Benchmark training dataloader throughput: full vs reduced JPEG decoding in load_image, and per-image augmentation in
+workers vs BatchAugment on the device.
+
+Usage:
+    $ python -m utils.augment_benchmark --data data/pill.yaml --batch-size 16 --workers 8 --device 0
+"""
+
+import argparse
+
+import yaml
+
+from utils.batch_augmentations import BatchAugment
+from utils.dataloaders import create_dataloader
+from utils.general import check_dataset, check_yaml
+from utils.torch_utils import select_device, time_sync
+
+
+def images_per_second(loader, n, augment, device):
+    """Returns images/s over `n` batches after one warmup batch, including the host-to-device copy and `augment`."""
+    seen, t = 0, None
+    for i, (imgs, targets, _, _) in enumerate(loader):
+        imgs = imgs.to(device, non_blocking=True).float() / 255
+        if augment:
+            imgs, targets = augment(imgs, targets)
+        if device.type == "cuda":
+            imgs.sum().item()  # synchronize
+        if i == 0:
+            t = time_sync()  # exclude worker startup
+        else:
+            seen += imgs.shape[0]
+        if i == n:
+            break
+    return seen / (time_sync() - t)
+
+
+def decode_images_per_second(dataset, n):
+    """Returns load_image() images/s over the first `n` images with full and with reduced JPEG decoding."""
+    results, default = {}, dataset.reduced_decode
+    for reduced in (False, True):
+        dataset.reduced_decode = reduced
+        t = time_sync()
+        for i in range(n):
+            dataset.load_image(i)
+        results[reduced] = n / (time_sync() - t)
+    dataset.reduced_decode = default
+    return results
+
+
+def benchmark(
+    data="data/coco128.yaml", hyp="data/hyps/hyp.scratch-low.yaml", imgsz=640, batch_size=16, workers=8, n=20, device=""
+):
+    """Prints images/s of load_image() decoding and of the per-image and BatchAugment paths on the training split."""
+    device = select_device(device)
+    path = check_dataset(data)["train"]
+    with open(check_yaml(hyp), errors="ignore") as f:
+        hyp = yaml.safe_load(f)
+
+    print(f"{'path':>16}{'images/s':>10}")
+    for name, augment in ("per-image", None), ("batch-augment", BatchAugment(hyp)):
+        loader, dataset = create_dataloader(
+            path,
+            imgsz,
+            batch_size,
+            32,
+            hyp=BatchAugment.dataset_hyp(hyp) if augment else hyp,
+            augment=True,
+            workers=workers,
+            shuffle=True,
+        )
+        if augment is None:
+            decode = decode_images_per_second(dataset, min(len(dataset), n * batch_size))
+            print(f"{'full decode':>16}{decode[False]:>10.1f}\n{'reduced decode':>16}{decode[True]:>10.1f}")
+        print(f"{name:>16}{images_per_second(loader, n, augment, device):>10.1f}")
+
+
+def parse_opt():
+    """Parses command line arguments for the augmentation benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default="data/coco128.yaml", help="dataset.yaml path")
+    parser.add_argument("--hyp", type=str, default="data/hyps/hyp.scratch-low.yaml", help="hyperparameters path")
+    parser.add_argument("--imgsz", type=int, default=640, help="train image size (pixels)")
+    parser.add_argument("--batch-size", type=int, default=16, help="batch size")
+    parser.add_argument("--workers", type=int, default=8, help="max dataloader workers")
+    parser.add_argument("--n", type=int, default=20, help="timed batches per path")
+    parser.add_argument("--device", default="", help="cuda device, i.e. 0 or cpu")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    benchmark(**vars(opt))
@@ -0,0 +1,193 @@
+# Ultralytics YOLOv5 🚀, AGPL-3.0 license
+"""
+Batched, vectorized training augmentations applied to a whole collated batch on the training device.
+
+Usage - train with the dataloader only letterboxing and this stage doing mosaic, perspective, mixup, HSV and flips:
+    $ python train.py --data coco128.yaml --weights yolov5s.pt --batch-augment
+"""
+
+import math
+
+import torch
+import torch.nn.functional as F
+
+from utils.general import xywhn2xyxy, xyxy2xywhn
+
+PAD = 114 / 255  # letterbox and warp border value
+PER_SAMPLE_KEYS = (
+    "mosaic",
+    "mixup",
+    "degrees",
+    "translate",
+    "scale",
+    "shear",
+    "perspective",
+    "hsv_h",
+    "hsv_s",
+    "hsv_v",
+    "flipud",
+    "fliplr",
+)  # hyperparameters applied by BatchAugment instead of LoadImagesAndLabels
+
+
+def rgb_to_hsv(x, eps=1e-8):
+    """Converts BCHW 0-1 RGB images to HSV with all channels in 0-1."""
+    r, g, b = x.unbind(1)
+    v = x.amax(1)
+    d = v - x.amin(1)
+    dc = d + eps
+    h = torch.where(v == g, (b - r) / dc + 2, (r - g) / dc + 4)
+    h = torch.where(v == r, ((g - b) / dc) % 6, h)
+    return torch.stack((h / 6, d / (v + eps), v), 1)  # gray pixels get h=0 as d=0
+
+
+def hsv_to_rgb(x):
+    """Converts BCHW HSV images with all channels in 0-1 back to 0-1 RGB."""
+    h, s, v = x[:, :1], x[:, 1:2], x[:, 2:]
+    k = (torch.tensor((5.0, 3.0, 1.0), device=x.device).view(1, 3, 1, 1) + h * 6) % 6  # r, g, b sector offsets
+    return v - v * s * torch.minimum(k, 4 - k).clamp(0, 1)
+
+
+class BatchAugment:
+    """
+    Applies the LoadImagesAndLabels training augmentations to a collated batch as tensor ops: mosaic tiling, the
+    `random_perspective` warp through one `grid_sample`, mixup, HSV jitter and flips, with labels transformed as
+    batched tensors.
+
+    The dataloader is built with `dataset_hyp(hyp)`, so workers only decode and letterbox. Mosaics tile four
+    letterboxed images of the batch around the canvas center instead of a random center, and HSV jitter runs in float
+    rather than through uint8 lookup tables; otherwise sampling and label filtering follow the per-sample path.
+    """
+
+    def __init__(self, hyp):
+        """Initializes with the training hyperparameters `hyp` (mosaic, mixup, degrees, ..., flipud, fliplr)."""
+        self.hyp = hyp
+
+    @staticmethod
+    def dataset_hyp(hyp):
+        """Returns `hyp` with the augmentations this stage applies disabled, for the dataloader's per-sample path."""
+        return {**hyp, **dict.fromkeys(PER_SAMPLE_KEYS, 0.0)}
+
+    def __call__(self, imgs, targets):
+        """
+        Augments BCHW 0-1 float `imgs` and their (n, 6) image, class, xywhn `targets` on `imgs.device`.
+
+        Returns the augmented images, same size as the input, and targets.
+        """
+        hyp, b = self.hyp, imgs.shape[0]
+        targets = targets.to(imgs.device)
+        mosaic = torch.rand(b, device=imgs.device) < hyp["mosaic"]
+        canvas, boxes = self.mosaic(imgs, targets, mosaic)
+        imgs, boxes = self.random_perspective(canvas, boxes, mosaic, imgs.shape[2:])
+        imgs, boxes = self.mixup(imgs, boxes, mosaic & (torch.rand(b, device=imgs.device) < hyp["mixup"]))
+        h, w = imgs.shape[2:]
+        targets = torch.cat((boxes[:, :2], xyxy2xywhn(boxes[:, 2:6], w=w, h=h, clip=True, eps=1e-3)), 1)
+        imgs = self.augment_hsv(imgs)
+        return self.flip(imgs, targets)
+
+    @staticmethod
+    def mosaic(imgs, targets, mosaic):
+        """
+        Tiles `imgs` with 3 random batch images into 2x2 canvases where `mosaic` is set, padding the rest, and returns
+        the canvases with (n, 6) image, class, xyxy pixel boxes.
+        """
+        b, _, h, w = imgs.shape
+        canvas = imgs.new_full((b, 3, 2 * h, 2 * w), PAD)
+        canvas[:, :, :h, :w] = imgs
+        ar = torch.arange(b, device=imgs.device)
+        boxes = [torch.cat((targets[:, :2], xywhn2xyxy(targets[:, 2:], w, h)), 1)]
+        if mosaic.any():
+            i = mosaic.nonzero()[:, 0]
+            for y, x in (0, w), (h, 0), (h, w):
+                src = torch.randperm(b, device=imgs.device)
+                canvas[i, :, y : y + h, x : x + w] = imgs[src[i]]
+                inv = torch.empty_like(src)
+                inv[src] = ar  # image src[i] tiles into canvas i
+                t = targets.clone()
+                t[:, 0] = inv[t[:, 0].long()]
+                t = t[mosaic[t[:, 0].long()]]
+                boxes.append(torch.cat((t[:, :2], xywhn2xyxy(t[:, 2:], w, h, padw=x, padh=y)), 1))
+        return canvas, torch.cat(boxes, 0)
+
+    def random_perspective(self, canvas, boxes, mosaic, shape):
+        """
+        Warps every canvas with its own `random_perspective` matrix in one `grid_sample` call, cropping mosaics to
+        `shape` around their center, and returns the warped images and surviving xyxy pixel boxes.
+        """
+        hyp, (b, _, hc, wc), (h, w) = self.hyp, canvas.shape, shape
+        device = canvas.device
+
+        def uniform(a, c=None):
+            return torch.empty(b, device=device).uniform_(-a if c is None else a, a if c is None else c)
+
+        def eye():
+            return torch.eye(3, device=device).repeat(b, 1, 1)
+
+        C, P, R, S, T = eye(), eye(), eye(), eye(), eye()
+        C[:, 0, 2] = -w * (1 + mosaic.float()) / 2  # x translation (pixels), mosaic canvas center or image center
+        C[:, 1, 2] = -h * (1 + mosaic.float()) / 2  # y translation (pixels)
+        P[:, 2, 0], P[:, 2, 1] = uniform(hyp["perspective"]), uniform(hyp["perspective"])
+        a, s = uniform(hyp["degrees"]) * math.pi / 180, uniform(1 - hyp["scale"], 1 + hyp["scale"])
+        R[:, 0, 0], R[:, 0, 1], R[:, 1, 0], R[:, 1, 1] = s * a.cos(), s * a.sin(), -s * a.sin(), s * a.cos()
+        S[:, 0, 1] = (uniform(hyp["shear"]) * math.pi / 180).tan()  # x shear
+        S[:, 1, 0] = (uniform(hyp["shear"]) * math.pi / 180).tan()  # y shear
+        T[:, 0, 2] = uniform(0.5 - hyp["translate"], 0.5 + hyp["translate"]) * w  # x translation (pixels)
+        T[:, 1, 2] = uniform(0.5 - hyp["translate"], 0.5 + hyp["translate"]) * h  # y translation (pixels)
+        M = T @ S @ R @ P @ C  # order of operations (right to left) is IMPORTANT
+
+        # Sample each output pixel from its source pixel, borders filled with PAD
+        y, x = torch.meshgrid(torch.arange(h, device=device), torch.arange(w, device=device), indexing="ij")
+        xy = torch.stack((x, y, torch.ones_like(x)), -1).view(1, -1, 3).float() @ torch.linalg.inv(M).transpose(1, 2)
+        grid = xy[..., :2] / xy[..., 2:] / torch.tensor((wc - 1, hc - 1), device=device) * 2 - 1
+        imgs = F.grid_sample(canvas - PAD, grid.view(b, h, w, 2), align_corners=True) + PAD
+
+        # Transform label corners, clip and filter as random_perspective
+        n, i = len(boxes), boxes[:, 0].long()
+        xy = torch.ones((n, 4, 3), device=device)
+        xy[..., :2] = boxes[:, [2, 3, 4, 5, 2, 5, 4, 3]].view(n, 4, 2)  # x1y1, x2y2, x1y2, x2y1
+        xy = xy @ M[i].transpose(1, 2)
+        xy = xy[..., :2] / xy[..., 2:]
+        new = torch.cat((xy.amin(1), xy.amax(1)), 1)
+        new[:, [0, 2]] = new[:, [0, 2]].clamp(0, w)
+        new[:, [1, 3]] = new[:, [1, 3]].clamp(0, h)
+        keep = self.box_candidates(boxes[:, 2:6] * s[i, None], new)
+        return imgs, torch.cat((boxes[keep, :2], new[keep]), 1)
+
+    @staticmethod
+    def box_candidates(box1, box2, wh_thr=2, ar_thr=100, area_thr=0.1, eps=1e-16):
+        """Tensor version of `utils.augmentations.box_candidates` for (n, 4) xyxy boxes before/after augmentation."""
+        w1, h1 = box1[:, 2] - box1[:, 0], box1[:, 3] - box1[:, 1]
+        w2, h2 = box2[:, 2] - box2[:, 0], box2[:, 3] - box2[:, 1]
+        ar = torch.maximum(w2 / (h2 + eps), h2 / (w2 + eps))  # aspect ratio
+        return (w2 > wh_thr) & (h2 > wh_thr) & (w2 * h2 / (w1 * h1 + eps) > area_thr) & (ar < ar_thr)
+
+    @staticmethod
+    def mixup(imgs, boxes, mix):
+        """Blends each image where `mix` is set with the previous batch image, appending that image's boxes."""
+        if not mix.any():
+            return imgs, boxes
+        b = imgs.shape[0]
+        r = torch.distributions.Beta(32.0, 32.0).sample((b, 1, 1, 1)).to(imgs.device)  # mixup ratio, alpha=beta=32.0
+        imgs = torch.where(mix[:, None, None, None], imgs * r + imgs.roll(1, 0) * (1 - r), imgs)
+        other = boxes.clone()
+        other[:, 0] = (other[:, 0] + 1) % b  # image i - 1 mixes into image i
+        return imgs, torch.cat((boxes, other[mix[other[:, 0].long()]]), 0)
+
+    def augment_hsv(self, imgs):
+        """Applies per-image random hue, saturation and value gains as `utils.augmentations.augment_hsv`."""
+        gains = torch.tensor((self.hyp["hsv_h"], self.hyp["hsv_s"], self.hyp["hsv_v"]), device=imgs.device)
+        if not gains.any():
+            return imgs
+        r = (torch.rand((imgs.shape[0], 3, 1, 1), device=imgs.device) * 2 - 1) * gains[:, None, None] + 1
+        hsv = rgb_to_hsv(imgs) * r
+        return hsv_to_rgb(torch.stack((hsv[:, 0] % 1, hsv[:, 1].clamp(0, 1), hsv[:, 2].clamp(0, 1)), 1))
+
+    def flip(self, imgs, targets):
+        """Flips images up-down and left-right with probabilities flipud and fliplr, mirroring normalized targets."""
+        i = targets[:, 0].long()
+        for p, dim, col in (self.hyp["flipud"], 2, 3), (self.hyp["fliplr"], 3, 2):
+            f = torch.rand(imgs.shape[0], device=imgs.device) < p
+            if f.any():
+                imgs = torch.where(f[:, None, None, None], imgs.flip(dim), imgs)
+                targets[:, col] = torch.where(f[i], 1 - targets[:, col], targets[:, col])
+        return imgs, targets
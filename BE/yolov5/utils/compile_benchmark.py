@@ -0,0 +1,72 @@
+# Ultralytics YOLOv5 🚀, AGPL-3.0 license
+"""
+Benchmark DetectMultiBackend.compile_for_serving() against the eager fused model, checking that outputs match.
+
+Usage:
+    $ python -m utils.compile_benchmark --weights best.pt --mode channels_last jit --batch-size 1 8
+    $ python -m utils.compile_benchmark --weights best.pt --mode compile --device 0
+"""
+
+import argparse
+
+import torch
+
+from models.common import DetectMultiBackend
+from utils.torch_utils import select_device, time_sync
+
+
+def time_model(model, im, n=20):
+    """Returns the first (warmup) call time and mean ms per image over `n` timed calls, plus the last output."""
+    t = time_sync()
+    y = model(im)
+    first = (time_sync() - t) * 1e3
+    t = time_sync()
+    for _ in range(n):
+        y = model(im)
+    return first, (time_sync() - t) / n / im.shape[0] * 1e3, y
+
+
+def benchmark(weights="best.pt", mode=("channels_last", "jit"), batch_size=(1, 8), imgsz=640, n=20, device=""):
+    """Prints load time, first call time and ms per image for the eager model and each compile mode."""
+    device = select_device(device)
+    modes = ["eager", *mode]
+    models, load = {}, {}
+    for m in modes:
+        t = time_sync()
+        models[m] = DetectMultiBackend(weights, device=device)
+        if m != "eager":
+            models[m].compile_for_serving((imgsz, imgsz), m)
+        load[m] = time_sync() - t
+
+    print(f"{'mode':>14}{'batch':>7}{'load s':>9}{'first ms':>10}{'ms/img':>9}{'speedup':>9}{'max diff':>10}")
+    with torch.no_grad():
+        for bs in batch_size:
+            im = torch.rand(bs, 3, imgsz, imgsz, device=device)
+            im = im.half() if models["eager"].fp16 else im
+            ref = None
+            for m in modes:
+                first, ms, y = time_model(models[m], im, n)
+                y = y[0] if isinstance(y, (list, tuple)) else y
+                if ref is None:
+                    ref, base = y, ms
+                print(
+                    f"{m:>14}{bs:>7}{load[m]:>9.2f}{first:>10.1f}{ms:>9.2f}{base / ms:>8.2f}x"
+                    f"{(y - ref).abs().max().item():>10.4f}"
+                )
+
+
+def parse_opt():
+    """Parses command line arguments for the compile benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", default="best.pt", help="PyTorch *.pt weights")
+    parser.add_argument("--mode", nargs="+", default=["channels_last", "jit"], help="channels_last, jit, compile")
+    parser.add_argument("--batch-size", nargs="+", type=int, default=[1, 8], help="batch sizes")
+    parser.add_argument("--imgsz", type=int, default=640, help="inference size (pixels)")
+    parser.add_argument("--n", type=int, default=20, help="timed runs per batch size")
+    parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    benchmark(**vars(opt))
@@ -36,6 +36,7 @@ from utils.augmentations import (
     mixup,
     random_perspective,
 )
+from utils.decode import imdecode, jpeg_size
 from utils.general import (
     DATASETS_DIR,
     LOGGER,
@@ -65,6 +66,7 @@ LOCAL_RANK = int(os.getenv("LOCAL_RANK", -1))  # https://pytorch.org/docs/stable
 RANK = int(os.getenv("RANK", -1))
 WORLD_SIZE = int(os.getenv("WORLD_SIZE", 1))
 PIN_MEMORY = str(os.getenv("PIN_MEMORY", True)).lower() == "true"  # global pin_memory for dataloaders
+RECT_BUCKET_BATCHES = 4  # batches per aspect-ratio bucket for shuffled --rect training
 
 # Get orientation exif tag
 for orientation in ExifTags.TAGS.keys():
@@ -80,6 +82,72 @@ def get_hash(paths):
     return h.hexdigest()  # return hash
 
 
+def get_fingerprints(im_files, label_files):
+    """Returns (n, 4) int64 (image size, image mtime_ns, label size, label mtime_ns) per file pair, -1 if missing."""
+
+    def stat(f):
+        try:
+            st = os.stat(f)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return -1, -1
+
+    with ThreadPool(NUM_THREADS) as pool:  # os.stat releases the GIL, helps on network filesystems
+        x = pool.map(stat, im_files + label_files, chunksize=1024)
+    n = len(im_files)
+    return np.array(x, dtype=np.int64).reshape(2, n, 2).transpose(1, 0, 2).reshape(n, 4)
+
+
+def save_label_cache(path, x):
+    """
+    Saves per-file label cache `x` (see `load_label_cache`) to `path` as an uncompressed, pickle-free *.npz.
+
+    Variable-length labels and segments are concatenated with per-file counts, and strings are joined into one
+    utf-8 buffer, so loading is a few contiguous array reads instead of unpickling one object per image.
+    """
+    segments = [s for x in x["segments"] for s in x]
+    np.savez(
+        path,
+        version=np.array(x["version"]),
+        files=np.frombuffer("\0".join(x["files"]).encode(), dtype=np.uint8),
+        msgs=np.frombuffer("\0".join(x["msgs"]).encode(), dtype=np.uint8),
+        fingerprints=x["fingerprints"],
+        stats=x["stats"],
+        shapes=x["shapes"],
+        labels=np.concatenate(x["labels"], 0) if x["labels"] else np.zeros((0, 5), dtype=np.float32),
+        label_counts=np.array([len(x) for x in x["labels"]], dtype=np.int64),
+        segments=np.concatenate(segments, 0) if segments else np.zeros((0, 2), dtype=np.float32),
+        segment_lengths=np.array([len(x) for x in segments], dtype=np.int64),
+        segment_counts=np.array([len(x) for x in x["segments"]], dtype=np.int64),
+    )
+
+
+def load_label_cache(path):
+    """
+    Loads a label cache saved by `save_label_cache`, returning a dict with per-file lists 'files', 'msgs', 'labels',
+    'segments' and arrays 'fingerprints' (n, 4), 'stats' (n, 4) missing/found/empty/corrupt and 'shapes' (n, 2).
+
+    Loading reads every array in full rather than memory-mapping them, so it is O(files) but one sequential read.
+    Memory-mapping would not make a cache check O(changed): fingerprinting stats every file, and the dataset splits
+    the labels into one writable array per image (e.g. `single_cls` edits them in place). Only verification, which
+    opens and decodes images and dominates the scan, is limited to new and changed files.
+    """
+    with open(path, "rb") as f:
+        z = np.load(f)
+        x = {k: z[k] for k in z.files}
+    split = lambda a, counts: np.split(a, np.cumsum(counts)[:-1]) if len(counts) else []  # noqa: E731
+    segments = split(x.pop("segments"), x.pop("segment_lengths"))
+    counts = x.pop("segment_counts")
+    return {
+        **x,
+        "version": x["version"].item(),
+        "files": x["files"].tobytes().decode().split("\0"),
+        "msgs": x["msgs"].tobytes().decode().split("\0"),
+        "labels": split(x.pop("labels"), x.pop("label_counts")),
+        "segments": [segments[i - c : i] for i, c in zip(np.cumsum(counts), counts)],
+    }
+
+
 def exif_size(img):
     """Returns corrected PIL image size (width, height) considering EXIF orientation."""
     s = img.size  # (width, height)
@@ -157,6 +225,44 @@ class SmartDistributedSampler(distributed.DistributedSampler):
         return iter(idx)
 
 
+class BucketBatchSampler:
+    """
+    Batch sampler for shuffled rectangular training: every epoch it shuffles images within the aspect-ratio buckets of
+    `LoadImagesAndLabels(rect=True, bucket_batches>1)` and shuffles the resulting batches across buckets, so each batch
+    uses its bucket's letterbox shape from `dataset.batch_shapes`.
+
+    Under DDP it batches the rank's fixed `dataset.indices` subset like `SmartDistributedSampler`, and repeats batches
+    up to the largest rank's batch count so all ranks take the same number of steps. The epoch advances on every pass.
+    """
+
+    def __init__(self, dataset, batch_size, seed=0):
+        """Initializes with `dataset` bucket assignments, `batch_size` and the shuffle `seed`."""
+        self.batch_size, self.seed, self.epoch = batch_size, seed, 0
+        bucket = dataset.batch[dataset.indices]  # bucket of each sampled position, this rank's subset under DDP
+        self.buckets = [torch.from_numpy(np.flatnonzero(bucket == b)) for b in np.unique(bucket)]
+        ranks = np.random.RandomState(seed=dataset.seed).permutation(dataset.n) % WORLD_SIZE  # as dataset.indices
+        nb = bucket.max() + 1
+        counts = [np.bincount(dataset.batch[ranks == r], minlength=nb) for r in range(WORLD_SIZE)]
+        self.length = max(int(np.ceil(c / batch_size).sum()) for c in counts)  # batches per epoch, equal on all ranks
+
+    def __len__(self):
+        """Returns the number of batches per epoch."""
+        return self.length
+
+    def __iter__(self):
+        """Yields lists of dataset positions, one aspect-ratio bucket per batch, shuffled deterministically by epoch."""
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+        self.epoch += 1
+        batches = []
+        for idx in self.buckets:
+            batches += idx[torch.randperm(len(idx), generator=g)].split(self.batch_size)
+        batches = [batches[i].tolist() for i in torch.randperm(len(batches), generator=g)]
+        while len(batches) < self.length:  # pad ranks with fewer batches
+            batches += batches[: self.length - len(batches)]
+        return iter(batches)
+
+
 def create_dataloader(
     path,
     imgsz,
@@ -177,9 +283,7 @@ def create_dataloader(
     seed=0,
 ):
     """Creates and returns a configured DataLoader instance for loading and processing image datasets."""
-    if rect and shuffle:
-        LOGGER.warning("WARNING ⚠️ --rect is incompatible with DataLoader shuffle, setting shuffle=False")
-        shuffle = False
+    bucket = rect and shuffle  # shuffle within and across aspect-ratio buckets, see BucketBatchSampler
     with torch_distributed_zero_first(rank):  # init dataset *.cache only once if DDP
         dataset = LoadImagesAndLabels(
             path,
@@ -195,21 +299,27 @@ def create_dataloader(
             image_weights=image_weights,
             prefix=prefix,
             rank=rank,
+            seed=seed,
+            bucket_batches=RECT_BUCKET_BATCHES if bucket else 1,
         )
 
     batch_size = min(batch_size, len(dataset))
     nd = torch.cuda.device_count()  # number of CUDA devices
     nw = min([os.cpu_count() // max(nd, 1), batch_size if batch_size > 1 else 0, workers])  # number of workers
     sampler = None if rank == -1 else SmartDistributedSampler(dataset, shuffle=shuffle)
+    batch_sampler = None
+    if bucket:  # replaces the DDP sampler, batching the same per-rank subset
+        sampler, batch_sampler = None, BucketBatchSampler(dataset, batch_size, seed=seed)
     loader = DataLoader if image_weights else InfiniteDataLoader  # only DataLoader allows for attribute updates
     generator = torch.Generator()
     generator.manual_seed(6148914691236517205 + seed + RANK)
     return loader(
         dataset,
-        batch_size=batch_size,
-        shuffle=shuffle and sampler is None,
+        batch_size=1 if bucket else batch_size,
+        shuffle=shuffle and sampler is None and not bucket,
         num_workers=nw,
         sampler=sampler,
+        batch_sampler=batch_sampler,
         pin_memory=PIN_MEMORY,
         collate_fn=LoadImagesAndLabels.collate_fn4 if quad else LoadImagesAndLabels.collate_fn,
         worker_init_fn=seed_worker,
@@ -534,10 +644,41 @@ def img2label_paths(img_paths):
     return [sb.join(x.rsplit(sa, 1)).rsplit(".", 1)[0] + ".txt" for x in img_paths]
 
 
+class MmapImages:
+    """
+    List-like view of HWC uint8 images stored back to back in one blob file, indexed by byte offsets and shapes.
+
+    The blob is opened with `np.memmap` on first access in each process and dropped when pickled, so dataloader
+    workers share the page cache instead of receiving a copy of every image.
+    """
+
+    def __init__(self, path, offsets, shapes):
+        """Initializes the view of blob `path` with per-image byte `offsets` (n,) and (h, w, c) `shapes` (n, 3)."""
+        self.path, self.offsets, self.shapes = path, offsets, shapes
+        self.blob = None
+
+    def __len__(self):
+        """Returns the number of cached images."""
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        """Returns image `i` as a read-only zero-copy view into the memory-mapped blob."""
+        if self.blob is None:
+            self.blob = np.memmap(self.path, dtype=np.uint8, mode="r")
+        o, shape = self.offsets[i], self.shapes[i]
+        return self.blob[o : o + shape.prod()].reshape(shape)
+
+    def __getstate__(self):
+        """Pickles the view without the mapping, which each worker re-opens lazily."""
+        return {**self.__dict__, "blob": None}
+
+
 class LoadImagesAndLabels(Dataset):
     """Loads images and their corresponding labels for training and validation in YOLOv5."""
 
-    cache_version = 0.6  # dataset labels *.cache version
+    cache_version = 0.7  # dataset labels *.cache version
+    mmap_version = 0.1  # resized images *.mmap blob version
+    reduced_decode = True  # decode large training JPEGs at reduced DCT scale in load_image, see imread_reduced()
     rand_interp_methods = [cv2.INTER_NEAREST, cv2.INTER_LINEAR, cv2.INTER_CUBIC, cv2.INTER_AREA, cv2.INTER_LANCZOS4]
 
     def __init__(
@@ -557,16 +698,19 @@ class LoadImagesAndLabels(Dataset):
         prefix="",
         rank=-1,
         seed=0,
+        bucket_batches=1,
     ):
         """Initializes the YOLOv5 dataset loader, handling images and their labels, caching, and preprocessing."""
         self.img_size = img_size
         self.augment = augment
+        self.reduced_decode = augment and self.reduced_decode  # training only, validation decodes at full scale
         self.hyp = hyp
         self.image_weights = image_weights
         self.rect = False if image_weights else rect
         self.mosaic = self.augment and not self.rect  # load 4 images at a time into a mosaic (only during training)
         self.mosaic_border = [-img_size // 2, -img_size // 2]
         self.stride = stride
+        self.seed = seed
         self.path = path
         self.albumentations = Albumentations(size=img_size) if augment else None
 
@@ -595,11 +739,11 @@ class LoadImagesAndLabels(Dataset):
         self.label_files = img2label_paths(self.im_files)  # labels
         cache_path = (p if p.is_file() else Path(self.label_files[0]).parent).with_suffix(".cache")
         try:
-            cache, exists = np.load(cache_path, allow_pickle=True).item(), True  # load dict
-            assert cache["version"] == self.cache_version  # matches current version
-            assert cache["hash"] == get_hash(self.label_files + self.im_files)  # identical hash
+            old = load_label_cache(cache_path)
+            assert old["version"] == self.cache_version  # matches current version
         except Exception:
-            cache, exists = self.cache_labels(cache_path, prefix), False  # run cache ops
+            old = None
+        cache, exists = self.cache_labels(cache_path, prefix, old)  # re-verify new and changed files only
 
         # Display cache
         nf, nm, ne, nc, n = cache.pop("results")  # found, missing, empty, corrupt, total
@@ -611,7 +755,7 @@ class LoadImagesAndLabels(Dataset):
         assert nf > 0 or not augment, f"{prefix}No labels found in {cache_path}, can not start training. {HELP_URL}"
 
         # Read cache
-        [cache.pop(k) for k in ("hash", "version", "msgs")]  # remove items
+        cache.pop("msgs")  # remove items
         labels, shapes, self.segments = zip(*cache.values())
         nl = len(np.concatenate(labels, 0))  # number of labels
         assert nl > 0 or not augment, f"{prefix}All labels empty in {cache_path}, can not start training. {HELP_URL}"
@@ -666,6 +810,10 @@ class LoadImagesAndLabels(Dataset):
             self.segments = [self.segments[i] for i in irect]
             self.shapes = s[irect]  # wh
             ar = ar[irect]
+            if bucket_batches > 1:  # aspect-ratio buckets of several batches, shuffled by BucketBatchSampler
+                bi = np.floor(np.arange(n) / (batch_size * bucket_batches)).astype(int)  # bucket index
+                nb = bi[-1] + 1  # number of buckets
+                self.batch = bi  # bucket index of image
 
             # Set training image shapes
             shapes = [[1, 1]] * nb
@@ -679,12 +827,15 @@ class LoadImagesAndLabels(Dataset):
 
             self.batch_shapes = np.ceil(np.array(shapes) * img_size / stride + pad).astype(int) * stride
 
-        # Cache images into RAM/disk for faster training
+        # Cache images into RAM/disk/mmap for faster training
         if cache_images == "ram" and not self.check_cache_ram(prefix=prefix):
             cache_images = False
         self.ims = [None] * n
         self.npy_files = [Path(f).with_suffix(".npy") for f in self.im_files]
-        if cache_images:
+        if cache_images == "mmap":  # train and val of one dataset resize and decode differently, so separate blobs
+            variant = f"{img_size}{'.augment' if self.augment else ''}{'.reduced' if self.reduced_decode else ''}"
+            self.cache_images_to_mmap(cache_path.with_suffix(f".{variant}.mmap"), prefix)
+        elif cache_images:
             b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
             self.im_hw0, self.im_hw = [None] * n, [None] * n
             fcn = self.cache_images_to_disk if cache_images == "disk" else self.load_image
@@ -718,45 +869,67 @@ class LoadImagesAndLabels(Dataset):
             )
         return cache
 
-    def cache_labels(self, path=Path("./labels.cache"), prefix=""):
-        """Caches dataset labels, verifies images, reads shapes, and tracks dataset integrity."""
-        x = {}  # dict
-        nm, nf, ne, nc, msgs = 0, 0, 0, 0, []  # number missing, found, empty, corrupt, messages
-        desc = f"{prefix}Scanning {path.parent / path.stem}..."
-        with Pool(NUM_THREADS) as pool:
-            pbar = tqdm(
-                pool.imap(verify_image_label, zip(self.im_files, self.label_files, repeat(prefix))),
-                desc=desc,
-                total=len(self.im_files),
-                bar_format=TQDM_BAR_FORMAT,
-            )
-            for im_file, lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg in pbar:
-                nm += nm_f
-                nf += nf_f
-                ne += ne_f
-                nc += nc_f
-                if im_file:
-                    x[im_file] = [lb, shape, segments]
-                if msg:
-                    msgs.append(msg)
-                pbar.desc = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
-
-        pbar.close()
-        if msgs:
+    def cache_labels(self, path=Path("./labels.cache"), prefix="", old=None):
+        """
+        Caches dataset labels, verifies images, reads shapes, and tracks dataset integrity.
+
+        Files whose (size, mtime) fingerprint matches the `old` cache from `load_label_cache` are reused, so only new
+        and changed images/labels are verified. Returns the {im_file: [labels, shape, segments]} dict with 'results'
+        and 'msgs', and whether the cache was reused unchanged.
+        """
+        n = len(self.im_files)
+        fingerprints = get_fingerprints(self.im_files, self.label_files)
+        x = {"version": self.cache_version, "files": self.im_files, "fingerprints": fingerprints}
+        x["stats"], x["shapes"] = np.zeros((n, 4), dtype=np.int64), np.zeros((n, 2), dtype=np.int64)
+        x["msgs"], x["labels"], x["segments"] = [""] * n, [np.zeros((0, 5), dtype=np.float32)] * n, [[]] * n
+        todo = list(range(n))
+        if old:
+            rows = {f: i for i, f in enumerate(old["files"])}
+            j = np.array([rows.get(f, -1) for f in self.im_files], dtype=np.int64)
+            reuse = (j >= 0) & (old["fingerprints"][j] == fingerprints).all(1)
+            for k in ("stats", "shapes"):
+                x[k][reuse] = old[k][j[reuse]]
+            for i in reuse.nonzero()[0]:
+                for k in ("msgs", "labels", "segments"):
+                    x[k][i] = old[k][j[i]]
+            todo = (~reuse).nonzero()[0].tolist()
+
+        if todo:
+            desc = f"{prefix}Scanning {path.parent / path.stem}... {len(todo)}/{n} new or changed"
+            with Pool(NUM_THREADS) as pool:
+                args = zip((self.im_files[i] for i in todo), (self.label_files[i] for i in todo), repeat(prefix))
+                pbar = tqdm(pool.imap(verify_image_label, args), desc=desc, total=len(todo), bar_format=TQDM_BAR_FORMAT)
+                nm, nf, ne, nc = 0, 0, 0, 0  # number missing, found, empty, corrupt
+                for i, (im_file, lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg) in zip(todo, pbar):
+                    nm += nm_f
+                    nf += nf_f
+                    ne += ne_f
+                    nc += nc_f
+                    x["stats"][i], x["msgs"][i] = (nm_f, nf_f, ne_f, nc_f), msg
+                    if im_file:
+                        x["labels"][i], x["shapes"][i], x["segments"][i] = lb, shape, segments
+                    pbar.desc = f"{desc}, {nf} images, {nm + ne} backgrounds, {nc} corrupt"
+            pbar.close()
+            try:
+                save_label_cache(path, x)  # save cache for next time
+                path.with_suffix(".cache.npz").replace(path)  # remove .npz suffix
+                LOGGER.info(f"{prefix}New cache created: {path}")
+            except Exception as e:
+                LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")
+
+        nm, nf, ne, nc = x["stats"].sum(0).tolist()
+        msgs = [m for m in x["msgs"] if m]
+        if todo and msgs:
             LOGGER.info("\n".join(msgs))
         if nf == 0:
             LOGGER.warning(f"{prefix}WARNING ⚠️ No labels found in {path}. {HELP_URL}")
-        x["hash"] = get_hash(self.label_files + self.im_files)
-        x["results"] = nf, nm, ne, nc, len(self.im_files)
-        x["msgs"] = msgs  # warnings
-        x["version"] = self.cache_version  # cache version
-        try:
-            np.save(path, x)  # save cache for next time
-            path.with_suffix(".cache.npy").rename(path)  # remove .npy suffix
-            LOGGER.info(f"{prefix}New cache created: {path}")
-        except Exception as e:
-            LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")  # not writeable
-        return x
+        cache = {
+            self.im_files[i]: [x["labels"][i], tuple(x["shapes"][i]), x["segments"][i]]
+            for i in (x["stats"][:, 3] == 0).nonzero()[0]  # skip corrupt
+        }
+        cache["results"] = nf, nm, ne, nc, n
+        cache["msgs"] = msgs  # warnings
+        return cache, not todo
 
     def __len__(self):
         """Returns the number of images in the dataset."""
@@ -859,23 +1032,90 @@ class LoadImagesAndLabels(Dataset):
         if im is None:  # not cached in RAM
             if fn.exists():  # load npy
                 im = np.load(fn)
+                h0, w0 = im.shape[:2]  # orig hw
+            elif self.reduced_decode:  # read image, JPEGs at reduced DCT scale
+                im, h0, w0 = self.imread_reduced(f)  # BGR, orig hw
             else:  # read image
                 im = cv2.imread(f)  # BGR
                 assert im is not None, f"Image Not Found {f}"
-            h0, w0 = im.shape[:2]  # orig hw
+                h0, w0 = im.shape[:2]  # orig hw
             r = self.img_size / max(h0, w0)  # ratio
-            if r != 1:  # if sizes are not equal
+            wh = math.ceil(w0 * r), math.ceil(h0 * r)  # resized wh
+            if im.shape[1::-1] != wh:  # if sizes are not equal
                 interp = cv2.INTER_LINEAR if (self.augment or r > 1) else cv2.INTER_AREA
-                im = cv2.resize(im, (math.ceil(w0 * r), math.ceil(h0 * r)), interpolation=interp)
+                im = cv2.resize(im, wh, interpolation=interp)
             return im, (h0, w0), im.shape[:2]  # im, hw_original, hw_resized
         return self.ims[i], self.im_hw0[i], self.im_hw[i]  # im, hw_original, hw_resized
 
+    def imread_reduced(self, f):
+        """
+        Reads image file `f` as BGR, decoding JPEGs in the DCT domain at the largest 1/2, 1/4 or 1/8 scale that keeps
+        both sides at or above their `load_image` resized size. Returns the image and the original (h, w).
+        """
+        buf = np.fromfile(f, np.uint8)
+        shape = jpeg_size(buf)  # (h, w) from the JPEG header, None for other formats
+        min_shape = None
+        if shape:
+            r = self.img_size / max(shape)
+            min_shape = math.ceil(shape[0] * r), math.ceil(shape[1] * r)
+        try:
+            im, scale = imdecode(buf, min_shape, exif=True)  # rotated as cv2.imread() in load_image
+        except ValueError:
+            raise AssertionError(f"Image Not Found {f}") from None
+        if scale == 1:
+            return im, *im.shape[:2]
+        (h0, w0), (h, w) = shape, im.shape[:2]
+        return (im, h0, w0) if (h >= w) == (h0 >= w0) else (im, w0, h0)  # EXIF may rotate the decoded image
+
     def cache_images_to_disk(self, i):
         """Saves an image to disk as an *.npy file for quicker loading, identified by index `i`."""
         f = self.npy_files[i]
         if not f.exists():
             np.save(f.as_posix(), cv2.imread(self.im_files[i]))
 
+    def cache_images_to_mmap(self, path, prefix=""):
+        """
+        Caches all resized images into one contiguous blob at `path`, with an offset/shape index saved next to it.
+
+        The blob is reused across runs while `get_hash` of the image files, `img_size` and the resize interpolation
+        match, and is shared by all dataloader workers and DDP ranks through `MmapImages`.
+        """
+        index_path = path.with_suffix(path.suffix + ".index")
+        h = get_hash(self.im_files) + f"{self.img_size}{self.augment}{self.reduced_decode}"  # images, size and decode
+        try:
+            x = np.load(index_path, allow_pickle=True).item()
+            assert x["version"] == self.mmap_version and x["hash"] == h  # matches current version and images
+            assert path.stat().st_size == x["bytes"]  # blob complete
+            LOGGER.info(f"{prefix}Using image cache {path} ({x['bytes'] / (1 << 30):.1f}GB mmap)")
+        except Exception:
+            n = len(self.im_files)
+            x = {"offsets": np.zeros(n, dtype=np.int64), "shapes": np.zeros((n, 3), dtype=np.int64)}
+            x["hw0"], b, gb = np.zeros((n, 2), dtype=np.int64), 0, 1 << 30
+            tmp = path.with_suffix(".tmp")
+            try:
+                with open(tmp, "wb") as f:
+                    results = ThreadPool(NUM_THREADS).imap(self.load_image, range(n))  # ordered, so offsets grow
+                    pbar = tqdm(results, total=n, bar_format=TQDM_BAR_FORMAT, disable=LOCAL_RANK > 0)
+                    for i, (im, hw0, _) in enumerate(pbar):
+                        im = np.ascontiguousarray(im)
+                        x["offsets"][i], x["shapes"][i], x["hw0"][i] = b, im.shape, hw0
+                        f.write(im.data)
+                        b += im.nbytes
+                        pbar.desc = f"{prefix}Caching images ({b / gb:.1f}GB mmap)"
+                    pbar.close()
+                tmp.replace(path)
+                x.update(hash=h, version=self.mmap_version, bytes=b)
+                np.save(index_path, x)  # save index for next time
+                index_path.with_suffix(".index.npy").rename(index_path)  # remove .npy suffix
+                LOGGER.info(f"{prefix}New image cache created: {path}")
+            except OSError as e:
+                LOGGER.warning(f"{prefix}WARNING ⚠️ Image cache {path} is not writeable, not caching images: {e}")
+                tmp.unlink(missing_ok=True)
+                return
+        self.ims = MmapImages(path, x["offsets"], x["shapes"])
+        self.im_hw0 = [tuple(hw) for hw in x["hw0"].tolist()]
+        self.im_hw = [tuple(s[:2]) for s in x["shapes"].tolist()]
+
     def load_mosaic(self, index):
         """Loads a 4-image mosaic for YOLOv5, combining 1 selected and 3 random images, with labels and segments."""
         labels4, segments4 = [], []
@@ -0,0 +1,194 @@
+# Ultralytics YOLOv5 🚀, AGPL-3.0 license
+"""
+Image decoding and preprocessing for serving, straight from an encoded request buffer to a normalized model input.
+
+Usage - microbenchmark on a phone-camera sized JPEG:
+    $ python -m utils.decode --shape 3024 4032
+"""
+
+import argparse
+import io
+import time
+import tracemalloc
+from functools import lru_cache
+
+import cv2
+import numpy as np
+import torch
+
+REDUCED = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}  # JPEG start-of-frame markers
+
+
+def jpeg_size(buf):
+    """Returns (height, width) parsed from the start-of-frame header of JPEG bytes `buf`, or None if not a JPEG."""
+    b = memoryview(buf)
+    if b[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(b):
+        if b[i] != 0xFF:
+            return None  # corrupt marker stream
+        marker = b[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        length = int.from_bytes(b[i + 2 : i + 4], "big")
+        if marker in SOF:
+            return int.from_bytes(b[i + 5 : i + 7], "big"), int.from_bytes(b[i + 7 : i + 9], "big")
+        i += 2 + length
+    return None
+
+
+def imdecode(buf, min_shape=None, exif=False):
+    """
+    Decodes encoded image bytes to a BGR HWC uint8 array without intermediate PIL/NumPy copies.
+
+    If `min_shape` (h, w) is given and `buf` is a JPEG much larger than it, decodes at 1/2, 1/4 or 1/8 resolution in
+    the DCT domain (`cv2.IMREAD_REDUCED_COLOR_*`), picking the largest factor that still covers `min_shape` in either
+    orientation. Returns the image and the factor to multiply its coordinates by to get back to the original image.
+
+    The EXIF orientation is ignored by default, like `PIL.Image.open`, so boxes are in the stored pixel frame of the
+    upload. `exif=True` rotates the image as `cv2.imread` does.
+    """
+    arr = np.frombuffer(buf, dtype=np.uint8)  # zero-copy view of the request buffer
+    f = 1
+    shape = jpeg_size(buf) if min_shape is not None else None
+    if shape:
+        (h, w), (mh, mw) = sorted(shape), sorted(min_shape)  # orientation-agnostic, EXIF may rotate the image
+        f = max([1] + [x for x in REDUCED if h / x >= mh and w / x >= mw])
+    flags = REDUCED[f] if f > 1 else cv2.IMREAD_COLOR
+    im = cv2.imdecode(arr, flags if exif else flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if im is None:
+        raise ValueError("Unsupported or corrupt image")
+    return im, f
+
+
+def dhash(buf, size=8):
+    """
+    Returns the `size` x `size` bit difference hash of encoded image bytes `buf` as bytes, equal for re-encoded or
+    resized copies of the same image. JPEGs are decoded at 1/8 resolution, so hashing costs a fraction of a decode.
+    """
+    im = cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if im is None:
+        raise ValueError("Unsupported or corrupt image")
+    im = cv2.resize(im, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return np.packbits(im[:, 1:] > im[:, :-1]).tobytes()
+
+
+@lru_cache(maxsize=256)
+def letterbox_plan(shape, new_shape=(640, 640), auto=False, scaleup=True, stride=32):
+    """
+    Returns the (resized wh, (top, bottom, left, right) padding, ratio) plan `utils.augmentations.letterbox` uses.
+
+    Plans are cached per input resolution, so repeat uploads from the same camera skip the computation. `shape` and
+    `new_shape` must be tuples.
+    """
+    r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
+    if not scaleup:  # only scale down
+        r = min(r, 1.0)
+    new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+    dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]  # wh padding
+    if auto:  # minimum rectangle
+        dw, dh = np.mod(dw, stride), np.mod(dh, stride)
+    dw, dh = dw / 2, dh / 2  # divide padding into 2 sides
+    pad = int(round(dh - 0.1)), int(round(dh + 0.1)), int(round(dw - 0.1)), int(round(dw + 0.1))
+    return new_unpad, pad, r
+
+
+def letterbox_shapes(new_shape=(640, 640), auto=False, stride=32):
+    """
+    Returns every (h, w) canvas shape `letterbox_rgb` can produce for `new_shape`, used to prebuild model grids.
+
+    With `auto=True` one side is always `new_shape` and the other any stride multiple up to it, e.g. 640x32 ... 640x640
+    and 32x640 ... 640x640.
+    """
+    h, w = new_shape
+    if not auto:
+        return [(h, w)]
+    return sorted({(h, x) for x in range(stride, w + 1, stride)} | {(y, w) for y in range(stride, h + 1, stride)})
+
+
+def letterbox_rgb(im, new_shape=(640, 640), color=114, auto=False, scaleup=True, stride=32):
+    """
+    Letterboxes BGR image `im` and swaps it to RGB, returning an HWC uint8 array.
+
+    Equivalent to `letterbox(im)[0][..., ::-1]`, but resizes straight into a pre-filled canvas and swaps channels in
+    place, avoiding the `copyMakeBorder` and channel-flip copies. With `auto=True` the canvas is the minimal
+    stride-multiple rectangle, e.g. 480x640 for a 3:4 phone photo at `new_shape=(640, 640)`.
+    """
+    (w, h), (top, bottom, left, right), _ = letterbox_plan(im.shape[:2], tuple(new_shape), auto, scaleup, stride)
+    canvas = np.full((h + top + bottom, w + left + right, 3), color, dtype=np.uint8)
+    roi = canvas[top : top + h, left : left + w]
+    if im.shape[:2] == (h, w):
+        roi[:] = im
+    else:
+        cv2.resize(im, (w, h), dst=roi, interpolation=cv2.INTER_LINEAR)
+    cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB, dst=canvas)  # in place
+    return canvas
+
+
+def to_tensor(ims, out=None):
+    """
+    Stacks HWC uint8 images into a BCHW float32 0-1 tensor, fusing the HWC->CHW permute and /255 normalization into a
+    single write per image. Writes into `out` (e.g. a buffer reused across calls) when it is large enough.
+    """
+    n, (h, w) = len(ims), ims[0].shape[:2]
+    if out is None or out.shape[0] < n or tuple(out.shape[2:]) != (h, w):
+        out = torch.empty((n, 3, h, w), dtype=torch.float32)
+    out = out[:n]
+    for i, im in enumerate(ims):
+        torch.div(torch.from_numpy(im).permute(2, 0, 1), 255, out=out[i])
+    return out
+
+
+def benchmark(shape=(3024, 4032), imgsz=640, n=20, quality=90):
+    """Times the PIL->NumPy->cv2 chain vs `imdecode` + `letterbox_rgb` + `to_tensor`, with peak traced allocations."""
+    from PIL import Image
+
+    from utils.augmentations import letterbox
+
+    rng = np.random.default_rng(0)
+    im = cv2.resize(rng.integers(0, 255, (shape[0] // 8, shape[1] // 8, 3), dtype=np.uint8), shape[::-1])
+    buf = cv2.imencode(".jpg", im, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+    out = torch.empty((1, 3, imgsz, imgsz))
+
+    def pil_chain():
+        x = np.array(Image.open(io.BytesIO(buf)).convert("RGB"))
+        x = cv2.cvtColor(x, cv2.COLOR_RGB2BGR)
+        x = letterbox(x, imgsz, auto=False)[0].transpose((2, 0, 1))[::-1]
+        return torch.from_numpy(np.ascontiguousarray(x)).float()[None] / 255
+
+    def full_decode():
+        return to_tensor([letterbox_rgb(imdecode(buf)[0], (imgsz, imgsz))], out)
+
+    def reduced_decode():
+        return to_tensor([letterbox_rgb(imdecode(buf, (imgsz, imgsz))[0], (imgsz, imgsz))], out)
+
+    print(f"{len(buf) / 1e6:.2f} MB JPEG {shape[1]}x{shape[0]} -> {imgsz}x{imgsz}, {n} runs")
+    print(f"{'path':>16}{'ms/img':>10}{'peak MB':>10}")
+    for name, fn in ("PIL chain", pil_chain), ("imdecode", full_decode), ("imdecode reduced", reduced_decode):
+        fn()  # warmup
+        t = time.perf_counter()
+        for _ in range(n):
+            fn()
+        dt = (time.perf_counter() - t) / n * 1e3
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]  # NumPy/OpenCV buffers, torch allocations are not traced
+        tracemalloc.stop()
+        print(f"{name:>16}{dt:>10.1f}{peak / 2 ** 20:>10.1f}")
+
+
+def parse_opt():
+    """Parses command line arguments for the decode microbenchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shape", nargs=2, type=int, default=[3024, 4032], help="source JPEG height width")
+    parser.add_argument("--imgsz", type=int, default=640, help="model input size")
+    parser.add_argument("--n", type=int, default=20, help="timed runs per path")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    benchmark(tuple(opt.shape), opt.imgsz, opt.n)
@@ -1018,10 +1018,22 @@ def non_max_suppression(
     labels=(),
     max_det=300,
     nm=0,  # number of masks
+    vectorized=False,  # one NMS call for the whole batch, no per-image loop or time limit
+    fast=False,  # vectorized, with fused confidence thresholding and a per-image top-k before NMS
+    topk=1000,  # fast path maximum number of boxes per image into NMS
 ):
     """
     Non-Maximum Suppression (NMS) on inference results to reject overlapping detections.
 
+    With `vectorized=True` candidates of all images are filtered, converted and sorted at once, leaving only the NMS
+    call itself per image, on the same float32 boxes as the default path so the detections are identical. There is no
+    time limit. This pays off for batches of sparse predictions, e.g. serving with a high `conf_thres`.
+
+    `fast=True` implies `vectorized`, also for single images. Best-class confidence is computed as
+    obj_conf * max(cls_conf) and thresholded before any box conversion or concatenation, only the `topk` most confident
+    boxes per image go into NMS and single-class models skip the class offsets. Results match the default path unless
+    an image has more than `topk` candidates, so pair it with a small `max_det`, e.g. `max_det=50, topk=500`.
+
     Returns:
          list of detections, on (n,6) tensor per image [xyxy, conf, cls]
     """
@@ -1051,6 +1063,23 @@ def non_max_suppression(
     t = time.time()
     mi = 5 + nc  # mask start index
     output = [torch.zeros((0, 6 + nm), device=prediction.device)] * bs
+    if (vectorized and bs > 1) or fast:
+        return _non_max_suppression_vectorized(
+            prediction,
+            xc,
+            conf_thres,
+            iou_thres,
+            classes,
+            agnostic,
+            multi_label,
+            labels,
+            max_det,
+            nm,
+            max_wh,
+            topk if fast else max_nms,
+            device,
+            fast,
+        )
     for xi, x in enumerate(prediction):  # image index, image inference
         # Apply constraints
         # x[((x[..., 2:4] < min_wh) | (x[..., 2:4] > max_wh)).any(1), 4] = 0  # width-height
@@ -1121,6 +1150,99 @@ def non_max_suppression(
     return output
 
 
+def _rank_per_image(bi, counts):
+    """Returns the rank of each element within its image for `bi` image indices grouped in ascending order."""
+    start = counts.cumsum(0) - counts  # first element of each image
+    return torch.arange(len(bi), device=bi.device) - start[bi]
+
+
+def _non_max_suppression_vectorized(
+    prediction,
+    xc,
+    conf_thres,
+    iou_thres,
+    classes,
+    agnostic,
+    multi_label,
+    labels,
+    max_det,
+    nm,
+    max_wh,
+    max_nms,
+    device,
+    fast=False,
+):
+    """`non_max_suppression()` over a whole batch at once except for the NMS call per image, see its arguments."""
+    bs, nc = prediction.shape[0], prediction.shape[2] - nm - 5
+    mi = 5 + nc  # mask start index
+    bi, ai = xc.nonzero(as_tuple=True)  # image index, anchor index of candidates
+    x = prediction[bi, ai]  # candidates of all images, (n, 5 + nc + nm)
+
+    # Cat apriori labels if autolabelling
+    if labels:
+        for xi, lb in enumerate(labels):
+            if len(lb):
+                v = torch.zeros((len(lb), nc + nm + 5), device=x.device)
+                v[:, :4] = lb[:, 1:5]  # box
+                v[:, 4] = 1.0  # conf
+                v[range(len(lb)), lb[:, 0].long() + 5] = 1.0  # cls
+                x = torch.cat((x, v), 0)
+                bi = torch.cat((bi, torch.full((len(lb),), xi, device=bi.device)))
+
+    # Detections matrix nx6 (xyxy, conf, cls)
+    if fast and not multi_label:  # threshold first, then build the matrix for the remaining boxes only
+        if nc == 1:
+            conf, j = x[:, 5:6] * x[:, 4:5], torch.zeros_like(x[:, 5:6])
+        else:
+            conf, j = x[:, 5:mi].max(1, keepdim=True)
+            conf *= x[:, 4:5]  # obj_conf * max(cls_conf) == max(obj_conf * cls_conf)
+        keep = conf.view(-1) > conf_thres
+        x, conf, j, bi = x[keep], conf[keep], j[keep], bi[keep]
+        x = torch.cat((xywh2xyxy(x[:, :4]), conf, j.float(), x[:, mi:] * x[:, 4:5]), 1)
+    else:
+        x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
+        box, mask = xywh2xyxy(x[:, :4]), x[:, mi:]
+        if multi_label:
+            i, j = (x[:, 5:mi] > conf_thres).nonzero(as_tuple=False).T
+            x, bi = torch.cat((box[i], x[i, 5 + j, None], j[:, None].float(), mask[i]), 1), bi[i]
+        else:  # best class only
+            conf, j = x[:, 5:mi].max(1, keepdim=True)
+            keep = conf.view(-1) > conf_thres
+            x, bi = torch.cat((box, conf, j.float(), mask), 1)[keep], bi[keep]
+
+    # Filter by class
+    if classes is not None:
+        keep = (x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)
+        x, bi = x[keep], bi[keep]
+
+    if not x.shape[0]:  # no boxes
+        return [torch.zeros((0, 6 + nm), device=device)] * bs
+
+    if bs == 1:  # no regrouping needed
+        if x.shape[0] > max_nms:
+            x = x[x[:, 4].topk(max_nms).indices]  # keep the most confident boxes
+        boxes = x[:, :4] if agnostic or nc == 1 else x[:, :4] + x[:, 5:6] * max_wh  # boxes (offset by class)
+        return [x[torchvision.ops.nms(boxes, x[:, 4], iou_thres)[:max_det]].to(device)]
+
+    # Group by image, then by confidence, keeping the max_nms most confident boxes per image
+    i = x[:, 4].argsort(descending=True)
+    i = i[torch.sort(bi[i], stable=True)[1]]
+    counts = torch.bincount(bi, minlength=bs)
+    if counts.max() > max_nms:
+        i = i[_rank_per_image(bi[i], counts) < max_nms]
+        counts = counts.clamp(max=max_nms)
+    x, counts = x[i], counts.tolist()
+
+    # NMS per image on the same float32 class-offset boxes as the per-image path. One NMS over all images would need
+    # image offsets, which either round the float32 coordinates or move the IoU to float64, and both can flip the
+    # decision for boxes with an IoU within rounding of iou_thres
+    boxes = x[:, :4] if agnostic or nc == 1 else x[:, :4] + x[:, 5:6] * max_wh  # boxes (offset by class)
+    return [
+        xi[torchvision.ops.nms(b, xi[:, 4], iou_thres)[:max_det]].to(device)
+        for xi, b in zip(x.split(counts), boxes.split(counts))
+    ]
+
+
 def strip_optimizer(f="best.pt", s=""):
     """
     Strips optimizer and optionally saves checkpoint to finalize training; arguments are file path 'f' and save path
@@ -26,7 +26,9 @@ def smooth(y, f=0.05):
     return np.convolve(yp, np.ones(nf) / nf, mode="valid")  # y-smoothed
 
 
-def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names=(), eps=1e-16, prefix=""):
+def ap_per_class(
+    tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names=(), eps=1e-16, prefix="", vectorized=None
+):
     """
     Compute the average precision, given the recall and precision curves.
 
@@ -38,6 +40,8 @@ def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names
         target_cls:  True object classes (nparray).
         plot:  Plot precision-recall curve at mAP@0.5
         save_dir:  Plot save directory
+        vectorized:  Compute curves for all classes x IoU thresholds at once, with identical results to the class loop.
+            Default (None) vectorizes for more than 10 classes, below that the class loop is as fast
     # Returns
         The average precision as computed in py-faster-rcnn.
     """
@@ -52,31 +56,39 @@ def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names
     # Create Precision-Recall curve and compute AP for each class
     px, py = np.linspace(0, 1, 1000), []  # for plotting
     ap, p, r = np.zeros((nc, tp.shape[1])), np.zeros((nc, 1000)), np.zeros((nc, 1000))
-    for ci, c in enumerate(unique_classes):
-        i = pred_cls == c
-        n_l = nt[ci]  # number of labels
-        n_p = i.sum()  # number of predictions
-        if n_p == 0 or n_l == 0:
-            continue
-
-        # Accumulate FPs and TPs
-        fpc = (1 - tp[i]).cumsum(0)
-        tpc = tp[i].cumsum(0)
-
-        # Recall
-        recall = tpc / (n_l + eps)  # recall curve
-        r[ci] = np.interp(-px, -conf[i], recall[:, 0], left=0)  # negative x, xp because xp decreases
-
-        # Precision
-        precision = tpc / (tpc + fpc)  # precision curve
-        p[ci] = np.interp(-px, -conf[i], precision[:, 0], left=1)  # p at pr_score
-
-        # AP from recall-precision curve
-        for j in range(tp.shape[1]):
-            ap[ci, j], mpre, mrec = compute_ap(recall[:, j], precision[:, j])
-            if plot and j == 0:
-                py.append(np.interp(px, mrec, mpre))  # precision at mAP@0.5
+    if vectorized or (vectorized is None and nc > 10):
+        ap, p, r, py = _pr_curves(tp, conf, pred_cls, unique_classes, nt, px, plot, eps)
+    else:
+        for ci, c in enumerate(unique_classes):
+            i = pred_cls == c
+            n_l = nt[ci]  # number of labels
+            n_p = i.sum()  # number of predictions
+            if n_p == 0 or n_l == 0:
+                continue
+
+            # Accumulate FPs and TPs
+            fpc = (1 - tp[i]).cumsum(0)
+            tpc = tp[i].cumsum(0)
+
+            # Recall
+            recall = tpc / (n_l + eps)  # recall curve
+            r[ci] = np.interp(-px, -conf[i], recall[:, 0], left=0)  # negative x, xp because xp decreases
+
+            # Precision
+            precision = tpc / (tpc + fpc)  # precision curve
+            p[ci] = np.interp(-px, -conf[i], precision[:, 0], left=1)  # p at pr_score
 
+            # AP from recall-precision curve
+            for j in range(tp.shape[1]):
+                ap[ci, j], mpre, mrec = compute_ap(recall[:, j], precision[:, j])
+                if plot and j == 0:
+                    py.append(np.interp(px, mrec, mpre))  # precision at mAP@0.5
+
+    return _ap_summary(px, py, p, r, ap, nt, unique_classes, plot, save_dir, names, eps, prefix)
+
+
+def _ap_summary(px, py, p, r, ap, nt, unique_classes, plot=False, save_dir=".", names=(), eps=1e-16, prefix=""):
+    """Plots and returns ap_per_class() results (tp, fp, p, r, f1, ap, classes) at the max mean F1 confidence."""
     # Compute F1 (harmonic mean of precision and recall)
     f1 = 2 * p * r / (p + r + eps)
     names = [v for k, v in names.items() if k in unique_classes]  # list: only classes that have data
@@ -94,6 +106,159 @@ def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names
     return tp, fp, p, r, f1, ap, unique_classes.astype(int)
 
 
+def _pr_curves(tp, conf, pred_cls, unique_classes, nt, px, plot=False, eps=1e-16, n=None):
+    """
+    Vectorized ap_per_class() core, returning (ap, p, r, py) for predictions already sorted by decreasing `conf`.
+
+    Rows are single predictions, or with `n` groups of n[i] tied predictions of which tp[i] are true positives.
+    """
+    nc, niou = len(unique_classes), tp.shape[1]
+    ap, p, r, py = np.zeros((nc, niou)), np.zeros((nc, len(px))), np.zeros((nc, len(px))), []
+    ci = np.searchsorted(unique_classes, pred_cls).clip(max=max(nc - 1, 0))
+    keep = np.nonzero(unique_classes[ci] == pred_cls)[0] if nc else np.zeros(0, dtype=int)
+    if not len(keep):
+        return ap, p, r, py
+
+    # Group predictions by class, keeping decreasing confidence order inside each class
+    i = keep[np.argsort(ci[keep].astype(np.int16 if nc < 2**15 else np.int64), kind="stable")]  # radix sort
+    tp, conf, ci = tp[i], conf[i], ci[i]
+    n_p = np.bincount(ci, minlength=nc)  # predictions per class
+    c = np.nonzero(n_p)[0]  # classes with predictions
+    size = n_p[c]
+    start = np.cumsum(size) - size
+
+    # Accumulate TPs and FPs per class
+    tpc = _grouped_cumsum(tp, start)
+    npc = np.arange(len(ci)) - np.repeat(start, size) + 1 if n is None else _grouped_cumsum(n[i], start)
+    fpc = npc[:, None] - tpc
+    recall = tpc / (nt[ci][:, None] + eps)  # recall curve
+    precision = tpc / (tpc + fpc)  # precision curve
+
+    # Recall and precision at each px confidence, interp over increasing -conf with reversed -px
+    x, xp = -px[::-1], -conf.astype(np.float64)
+    y = _grouped_interp(x, xp, np.stack((recall[:, 0], precision[:, 0]), 1), start, size, left=np.array([[0], [1]]))
+    r[c], p[c] = y[:, 0, ::-1], y[:, 1, ::-1]
+
+    # AP from recall-precision curves with the compute_ap() sentinels, one column per IoU threshold
+    # The envelope of [1, precision, 0] is 1, the envelope of precision, 0, as precision is in [0, 1]
+    mpre = _grouped_reverse_cummax(precision, size)  # precision envelope
+    x, sentinels = np.linspace(0, 1, 101), {"head": (0.0, 1.0), "tail": (1.0, 0.0)}  # 101-point interp (COCO)
+    ap[c] = np.trapz(_grouped_interp(x, recall, mpre, start, size, left=1, **sentinels), x)  # integrate
+    if plot:
+        py = list(_grouped_interp(px, recall[:, 0], mpre[:, 0], start, size, left=1, **sentinels))  # mAP@0.5
+    return ap, p, r, py
+
+
+def _grouped_cumsum(x, start):
+    """Returns the integer cumsum along axis 0 of `x`, restarted at each index in `start`."""
+    x = x.astype(np.int64)
+    x[start[1:]] -= np.add.reduceat(x, start, axis=0)[:-1]
+    return x.cumsum(0)
+
+
+def _grouped_interp(x, xp, fp, start, size, left, head=None, tail=None):
+    """
+    Returns np.interp(x, xp[s:s + n], fp[s:s + n], left=left) for each group (s, n) in `start`, `size`.
+
+    `x` must be increasing and each group's `xp` non-decreasing, results match np.interp exactly. `head` and `tail`
+    (xp, fp) points are added before and after every group. 2D `fp` is interpolated per column, over the matching
+    column of 2D `xp` or all over 1D `xp`, giving (groups, columns, len(x)) instead of (groups, len(x)).
+    """
+    squeeze = fp.ndim == 1
+    xp, fp = xp.reshape(len(xp), -1), fp.reshape(len(fp), -1)
+    ng, k, m = len(start), xp.shape[1], len(x)
+    # count[g, c, j] = number of points of group g, column c with xp <= x[j], so np.interp() would use points
+    # count - 1 and count. As `x` is increasing, a point counts for every x[j] from the first x >= xp on, so histogram
+    # the points by that first index per (group, column) and cumsum over x
+    first = np.searchsorted(x, xp, side="left")  # (points, columns)
+    j = (np.repeat(np.arange(ng), size)[:, None] * k + np.arange(k)) * (m + 1) + first
+    count = np.bincount(j.ravel(), minlength=ng * k * (m + 1)).reshape(ng, k, m + 1)[..., :m].cumsum(2)
+    h = int(head is not None)
+    if head:
+        count = count + (x >= head[0])
+    if tail:
+        count = count + (x >= tail[0])
+    n = (size + h + int(tail is not None))[:, None, None]  # points per group
+    col_x, col_f = np.arange(k)[:, None], np.arange(fp.shape[1])[:, None]
+
+    def point(e):
+        """Returns (xp, fp) of point `e` in each (group, column), including head and tail."""
+        i = start[:, None, None] + (e - h).clip(0, size[:, None, None] - 1)
+        xe, ye = xp[i, col_x], fp[i, col_f]
+        if head:
+            xe, ye = np.where(e == 0, head[0], xe), np.where(e == 0, head[1], ye)
+        if tail:
+            xe, ye = np.where(e == n - 1, tail[0], xe), np.where(e == n - 1, tail[1], ye)
+        return xe, ye
+
+    x0, y0 = point((count - 1).clip(0))
+    x1, y1 = point(np.minimum(count, n - 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (y1 - y0) / (x1 - x0)
+        y = np.where(x0 == x, y0, slope * (x - x0) + y0)
+    y = np.where(count == n, point(n - 1)[1], y)  # x >= last xp
+    y = np.where(count == 0, left, y)  # x < first xp
+    return y[:, 0] if squeeze else y
+
+
+def _grouped_reverse_cummax(a, size):
+    """
+    Returns np.flip(np.maximum.accumulate(np.flip(s))) along axis 0 for consecutive segments s of `a` of `size`.
+
+    np.maximum.accumulate() cannot restart at segment boundaries, so every value is paired with minus its segment index
+    as the complex number (-segment, value). NumPy orders complex numbers lexicographically by (real, imag), and
+    walking the flipped array each new segment has a larger real part than all pairs before it, so the running maximum
+    restarts at the segment start and within the segment is the running maximum of the values in the imaginary part.
+    """
+    z = np.empty(a.shape, dtype=np.complex128)
+    z.real = -np.repeat(np.arange(len(size)), size).reshape(-1, *[1] * (a.ndim - 1))  # -segment
+    z.imag = a
+    return np.flip(np.maximum.accumulate(np.flip(z, 0), 0), 0).imag
+
+
+class StreamingAP:
+    """
+    Accumulates val.py (correct, conf, pred_cls, target_cls) stats into per-class confidence histograms, so mAP needs
+    classes x bins memory however many images are validated.
+
+    Predictions in the same confidence bin count as tied, so results match ap_per_class() to within the bin width.
+    """
+
+    def __init__(self, nc, niou=10, bins=1000):
+        """Initializes empty histograms for `nc` classes, `niou` IoU thresholds and `bins` confidence bins."""
+        self.nc, self.bins = nc, bins
+        self.n = np.zeros((nc, bins), dtype=np.int64)  # predictions per (class, confidence bin)
+        self.tp = np.zeros((nc, bins, niou), dtype=np.int64)  # true positives per (class, confidence bin, IoU)
+        self.nt = np.zeros(nc, dtype=np.int64)  # targets per class
+
+    def update(self, correct, conf, pred_cls, target_cls):
+        """Adds the stats of one image or batch, as torch tensors or numpy arrays."""
+        stats = correct, conf, pred_cls, target_cls
+        correct, conf, pred_cls, target_cls = (x.cpu().numpy() if isinstance(x, torch.Tensor) else x for x in stats)
+        i = pred_cls.astype(int) * self.bins + (conf * self.bins).astype(int).clip(0, self.bins - 1)
+        np.add.at(self.n.reshape(-1), i, 1)
+        np.add.at(self.tp.reshape(-1, self.tp.shape[2]), i, correct)
+        np.add.at(self.nt, target_cls.astype(int), 1)
+
+    def compute(self, plot=False, save_dir=".", names=(), eps=1e-16, prefix=""):
+        """Returns ap_per_class() results (tp, fp, p, r, f1, ap, classes) from the histograms."""
+        c, b = np.nonzero(self.n)
+        i = np.argsort(-b, kind="stable")  # decreasing confidence
+        c, b = c[i], b[i]
+        unique_classes = np.nonzero(self.nt)[0]
+        px = np.linspace(0, 1, 1000)
+        nt = self.nt[unique_classes]
+        ap, p, r, py = _pr_curves(self.tp[c, b], b / self.bins, c, unique_classes, nt, px, plot, eps, n=self.n[c, b])
+        return _ap_summary(px, py, p, r, ap, nt, unique_classes, plot, save_dir, names, eps, prefix)
+
+    def map(self):
+        """Returns the running (mAP@0.5, mAP@0.5:0.95)."""
+        if not self.tp.any():
+            return 0.0, 0.0
+        ap = self.compute(names={})[5]
+        return ap[:, 0].mean(), ap.mean()
+
+
 def compute_ap(recall, precision):
     """Compute the average precision, given the recall and precision curves
     # Arguments
@@ -124,12 +289,13 @@ def compute_ap(recall, precision):
 class ConfusionMatrix:
     """Generates and visualizes a confusion matrix for evaluating object detection classification performance."""
 
-    def __init__(self, nc, conf=0.25, iou_thres=0.45):
+    def __init__(self, nc, conf=0.25, iou_thres=0.45, vectorized=True):
         """Initializes ConfusionMatrix with given number of classes, confidence, and IoU threshold."""
         self.matrix = np.zeros((nc + 1, nc + 1))
         self.nc = nc  # number of classes
         self.conf = conf
         self.iou_thres = iou_thres
+        self.vectorized = vectorized  # update the matrix with np.add.at instead of Python loops over labels
 
     def process_batch(self, detections, labels):
         """
@@ -145,6 +311,9 @@ class ConfusionMatrix:
         """
         if detections is None:
             gt_classes = labels.int()
+            if self.vectorized:
+                np.add.at(self.matrix, (self.nc, gt_classes.cpu().numpy()), 1)  # background FN
+                return
             for gc in gt_classes:
                 self.matrix[self.nc, gc] += 1  # background FN
             return
@@ -167,6 +336,18 @@ class ConfusionMatrix:
 
         n = matches.shape[0] > 0
         m0, m1, _ = matches.transpose().astype(int)
+        if self.vectorized:  # matches are one-to-one after the unique() filtering above
+            gc, dc = gt_classes.cpu().numpy(), detection_classes.cpu().numpy()
+            matched = np.zeros(len(gc), dtype=bool)
+            matched[m0] = True
+            np.add.at(self.matrix, (dc[m1], gc[m0]), 1)  # correct
+            np.add.at(self.matrix, (self.nc, gc[~matched]), 1)  # true background
+            if n:
+                unmatched = np.ones(len(dc), dtype=bool)
+                unmatched[m1] = False
+                np.add.at(self.matrix, (dc[unmatched], self.nc), 1)  # predicted background
+            return
+
         for i, gc in enumerate(gt_classes):
             j = m0 == i
             if n and sum(j) == 1:
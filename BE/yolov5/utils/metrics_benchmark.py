@@ -0,0 +1,97 @@
+# Ultralytics YOLOv5 🚀, AGPL-3.0 license
+"""
+Benchmark the vectorized ap_per_class() and ConfusionMatrix against the per-class loops, checking identical results.
+
+Usage:
+    $ python -m utils.metrics_benchmark --nc 100 --n 100000 --images 20000  # 100-class pill dataset scale
+    $ python -m utils.metrics_benchmark --nc 1 80 --n 1000 10000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from utils.metrics import ConfusionMatrix, ap_per_class
+
+
+def synthetic_stats(n=10000, nc=100, niou=10, seed=0):
+    """Returns val.py-style (tp, conf, pred_cls, target_cls) stats with repeated confidences and missing classes."""
+    rng = np.random.default_rng(seed)
+    conf = rng.random(n).round(3).astype(np.float32)  # rounded, so confidences tie like real model scores
+    pred_cls = rng.integers(0, nc, n).astype(np.float32)
+    tp = (rng.random((n, 1)) < conf[:, None]) & (rng.random((n, niou)) < np.linspace(0.9, 0.3, niou))
+    target_cls = rng.integers(0, max(nc - nc // 10, 1), int(n * 0.8)).astype(np.float32)  # some classes unlabeled
+    for c in range(nc):  # at most one TP per label, so recall stays <= 1 as in val.py
+        i = np.nonzero(pred_cls == c)[0]
+        i = i[np.argsort(-conf[i], kind="stable")]
+        tp[i] &= tp[i].cumsum(0) <= (target_cls == c).sum()
+    return tp, conf, pred_cls, target_cls
+
+
+def synthetic_batches(images=1000, nc=100, seed=0):
+    """Returns per-image (detections (n,6), labels (m,5)) pairs of jittered label boxes plus random false positives."""
+    g = torch.Generator().manual_seed(seed)
+    batches = []
+    for _ in range(images):
+        m = int(torch.randint(0, 20, (1,), generator=g))
+        xy = torch.rand(m, 2, generator=g) * 600
+        labels = torch.cat((torch.randint(0, nc, (m, 1), generator=g).float(), xy, xy + 40), 1)
+        keep = torch.rand(m, generator=g) < 0.8
+        boxes = labels[keep, 1:] + torch.randn(int(keep.sum()), 4, generator=g) * 4
+        wrong = torch.randint(0, nc, (len(boxes),), generator=g).float()
+        cls = torch.where(torch.rand(len(boxes), generator=g) < 0.9, labels[keep, 0], wrong)
+        fp = torch.rand(5, 2, generator=g) * 600
+        detections = torch.cat(
+            (
+                torch.cat((boxes, torch.rand(len(boxes), 1, generator=g), cls[:, None]), 1),
+                torch.cat((fp, fp + 40, torch.rand(5, 1, generator=g), torch.randint(0, nc, (5, 1), generator=g)), 1),
+            )
+        )
+        batches.append((detections, labels))
+    return batches
+
+
+def benchmark(nc=(1, 100), n=(10000, 100000), images=1000):
+    """Prints loop and vectorized times for ap_per_class() and ConfusionMatrix, asserting equal outputs."""
+    print(f"{'function':>16}{'nc':>6}{'n':>9}{'loop s':>10}{'vectorized s':>15}{'speedup':>9}")
+    for c in nc:
+        for k in n:
+            stats = synthetic_stats(k, c)
+            t = time.perf_counter()
+            a = ap_per_class(*stats, names={i: str(i) for i in range(c)}, vectorized=False)
+            t1 = time.perf_counter()
+            b = ap_per_class(*stats, names={i: str(i) for i in range(c)}, vectorized=True)
+            t2 = time.perf_counter()
+            assert all(np.array_equal(x, y) for x, y in zip(a, b)), "vectorized ap_per_class() differs from loop"
+            print(f"{'ap_per_class':>16}{c:>6}{k:>9}{t1 - t:>10.3f}{t2 - t1:>15.3f}{(t1 - t) / (t2 - t1):>8.2f}x")
+
+        batches = synthetic_batches(images, c)
+        times, matrices = {}, {}
+        for vectorized in (False, True):
+            cm = ConfusionMatrix(c, vectorized=vectorized)
+            t = time.perf_counter()
+            for detections, labels in batches:
+                cm.process_batch(detections, labels)
+                cm.process_batch(None, labels[:, 0])
+            times[vectorized], matrices[vectorized] = time.perf_counter() - t, cm.matrix
+        assert np.array_equal(matrices[False], matrices[True]), "vectorized ConfusionMatrix differs from loop"
+        print(
+            f"{'ConfusionMatrix':>16}{c:>6}{images:>9}{times[False]:>10.3f}{times[True]:>15.3f}"
+            f"{times[False] / times[True]:>8.2f}x"
+        )
+
+
+def parse_opt():
+    """Parses command line arguments for the metrics benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nc", nargs="+", type=int, default=[1, 100], help="number of classes")
+    parser.add_argument("--n", nargs="+", type=int, default=[10000, 100000], help="predictions for ap_per_class()")
+    parser.add_argument("--images", type=int, default=1000, help="images for ConfusionMatrix")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    benchmark(**vars(opt))
@@ -0,0 +1,84 @@
+# Ultralytics YOLOv5 🚀, AGPL-3.0 license
+"""
+Benchmark non_max_suppression() modes on synthetic YOLOv5 outputs, checking that all modes return the same detections.
+
+Usage:
+    $ python -m utils.nms_benchmark --batch-size 1 8 32 64 --nc 1
+    $ python -m utils.nms_benchmark --max-det 50 --topk 500 --objects 60  # serving settings, dense pill trays
+"""
+
+import argparse
+
+import torch
+
+from utils.general import non_max_suppression
+from utils.torch_utils import select_device, time_sync
+
+
+def synthetic_prediction(bs=1, imgsz=640, nc=1, anchors=25200, objects=20, seed=0):
+    """Returns a (bs, anchors, 5 + nc) inference output with `objects` clusters of overlapping confident boxes."""
+    g = torch.Generator().manual_seed(seed)
+    p = torch.rand(bs, anchors, 5 + nc, generator=g)
+    p[..., 4] = p[..., 4] ** 500  # background anchors, nearly all below any sensible threshold
+    p[..., :2] *= imgsz
+    p[..., 2:4] = p[..., 2:4] * imgsz / 8 + 8
+    centers = torch.rand(bs, objects, 2, generator=g) * imgsz
+    k = anchors // (objects * 100)  # anchors per object
+    i = torch.arange(objects * k)
+    p[:, i, :2] = centers.repeat_interleave(k, 1) + torch.randn(bs, objects * k, 2, generator=g) * 4  # jittered
+    p[:, i, 4] = 0.5 + torch.rand(bs, objects * k, generator=g) / 2
+    return p
+
+
+def benchmark(
+    batch_size=(1, 8, 32, 64),
+    nc=1,
+    conf_thres=0.25,
+    iou_thres=0.45,
+    max_det=300,
+    topk=1000,
+    objects=20,
+    n=20,
+    device="",
+):
+    """Prints ms per image and speedup over the per-image loop for the vectorized and fast NMS at each batch size."""
+    device = select_device(device)
+    modes = {"loop": {}, "vectorized": {"vectorized": True}, "fast": {"fast": True, "topk": topk}}
+    print(f"{'batch':>6}{'loop ms/img':>13}" + "".join(f"{m + ' ms/img':>19}{'speedup':>9}" for m in list(modes)[1:]))
+    for bs in batch_size:
+        p = synthetic_prediction(bs, nc=nc, objects=objects).to(device)
+        exact = (p[..., 4] > conf_thres).sum(1).max() <= topk  # fast NMS only differs if top-k drops candidates
+        times, outputs = {}, {}
+        for mode, kwargs in modes.items():
+            outputs[mode] = non_max_suppression(p, conf_thres, iou_thres, max_det=max_det, **kwargs)  # warmup
+            t = time_sync()
+            for _ in range(n):
+                non_max_suppression(p, conf_thres, iou_thres, max_det=max_det, **kwargs)
+            times[mode] = (time_sync() - t) / n * 1e3
+        for mode, out in outputs.items():
+            if mode != "fast" or exact:
+                assert all(torch.equal(a, b) for a, b in zip(outputs["loop"], out)), f"{mode} NMS differs from loop NMS"
+        print(
+            f"{bs:>6}{times['loop'] / bs:>13.3f}"
+            + "".join(f"{times[m] / bs:>19.3f}{times['loop'] / times[m]:>8.2f}x" for m in list(modes)[1:])
+        )
+
+
+def parse_opt():
+    """Parses command line arguments for the NMS benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", nargs="+", type=int, default=[1, 8, 32, 64], help="batch sizes")
+    parser.add_argument("--nc", type=int, default=1, help="number of classes")
+    parser.add_argument("--conf-thres", type=float, default=0.25, help="confidence threshold")
+    parser.add_argument("--iou-thres", type=float, default=0.45, help="NMS IoU threshold")
+    parser.add_argument("--max-det", type=int, default=300, help="maximum detections per image")
+    parser.add_argument("--topk", type=int, default=1000, help="fast NMS maximum boxes per image into NMS")
+    parser.add_argument("--objects", type=int, default=20, help="objects per synthetic image")
+    parser.add_argument("--n", type=int, default=20, help="timed runs per batch size")
+    parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    benchmark(**vars(opt))
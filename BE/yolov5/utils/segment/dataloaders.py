@@ -10,8 +10,15 @@ import torch
 from torch.utils.data import DataLoader
 
 from ..augmentations import augment_hsv, copy_paste, letterbox
-from ..dataloaders import InfiniteDataLoader, LoadImagesAndLabels, SmartDistributedSampler, seed_worker
-from ..general import LOGGER, xyn2xy, xywhn2xyxy, xyxy2xywhn
+from ..dataloaders import (
+    RECT_BUCKET_BATCHES,
+    BucketBatchSampler,
+    InfiniteDataLoader,
+    LoadImagesAndLabels,
+    SmartDistributedSampler,
+    seed_worker,
+)
+from ..general import xyn2xy, xywhn2xyxy, xyxy2xywhn
 from ..torch_utils import torch_distributed_zero_first
 from .augmentations import mixup, random_perspective
 
@@ -40,9 +47,7 @@ def create_dataloader(
     seed=0,
 ):
     """Creates a dataloader for training, validating, or testing YOLO models with various dataset options."""
-    if rect and shuffle:
-        LOGGER.warning("WARNING ⚠️ --rect is incompatible with DataLoader shuffle, setting shuffle=False")
-        shuffle = False
+    bucket = rect and shuffle  # shuffle within and across aspect-ratio buckets, see BucketBatchSampler
     with torch_distributed_zero_first(rank):  # init dataset *.cache only once if DDP
         dataset = LoadImagesAndLabelsAndMasks(
             path,
@@ -60,21 +65,27 @@ def create_dataloader(
             downsample_ratio=mask_downsample_ratio,
             overlap=overlap_mask,
             rank=rank,
+            seed=seed,
+            bucket_batches=RECT_BUCKET_BATCHES if bucket else 1,
         )
 
     batch_size = min(batch_size, len(dataset))
     nd = torch.cuda.device_count()  # number of CUDA devices
     nw = min([os.cpu_count() // max(nd, 1), batch_size if batch_size > 1 else 0, workers])  # number of workers
     sampler = None if rank == -1 else SmartDistributedSampler(dataset, shuffle=shuffle)
+    batch_sampler = None
+    if bucket:  # replaces the DDP sampler, batching the same per-rank subset
+        sampler, batch_sampler = None, BucketBatchSampler(dataset, batch_size, seed=seed)
     loader = DataLoader if image_weights else InfiniteDataLoader  # only DataLoader allows for attribute updates
     generator = torch.Generator()
     generator.manual_seed(6148914691236517205 + seed + RANK)
     return loader(
         dataset,
-        batch_size=batch_size,
-        shuffle=shuffle and sampler is None,
+        batch_size=1 if bucket else batch_size,
+        shuffle=shuffle and sampler is None and not bucket,
         num_workers=nw,
         sampler=sampler,
+        batch_sampler=batch_sampler,
         pin_memory=True,
         collate_fn=LoadImagesAndLabelsAndMasks.collate_fn4 if quad else LoadImagesAndLabelsAndMasks.collate_fn,
         worker_init_fn=seed_worker,
@@ -104,6 +115,7 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
         overlap=False,
         rank=-1,
         seed=0,
+        bucket_batches=1,
     ):
         """Initializes the dataset with image, label, and mask loading capabilities for training/testing."""
         super().__init__(
@@ -122,6 +134,7 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
             prefix,
             rank,
             seed,
+            bucket_batches,
         )
         self.downsample_ratio = downsample_ratio
         self.overlap = overlap
@@ -0,0 +1,658 @@
+# Ultralytics YOLOv5 🚀, AGPL-3.0 license
+"""Utils for serving models behind a web API, i.e. request micro-batching, latency statistics, model worker
+processes, result caching and versioned model registries.
+"""
+
+import atexit
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from utils.decode import dhash
+from utils.general import LOGGER
+
+try:
+    import xxhash  # faster than blake2b for multi-MB uploads
+except ImportError:
+    xxhash = None
+
+
+def file_fingerprint(files):
+    """Returns the (size, mtime) of every file in `files`, None for missing files."""
+    stats = [f.stat() if f.exists() else None for f in map(Path, files)]
+    return tuple((s.st_size, s.st_mtime_ns) if s else None for s in stats)
+
+
+class LatencyStats:
+    """Thread-safe rolling window of request latencies, reporting p50/p99 latency and throughput."""
+
+    def __init__(self, window=1000):
+        """Initializes a rolling window holding the latest `window` (latency, finish time, batch size) samples."""
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)  # seconds, per request
+        self.finished = deque(maxlen=window)  # time.time() at completion, per request
+        self.batch_sizes = deque(maxlen=window)  # images, per batch
+        self.count = 0  # total requests served
+        self.rejected = 0  # total requests refused because the queue was full
+
+    def update(self, latencies, batch_size):
+        """Records the latencies (seconds) of all requests completed by one batch of `batch_size` images."""
+        t = time.time()
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.finished.extend([t] * len(latencies))
+            self.batch_sizes.append(batch_size)
+            self.count += len(latencies)
+
+    def reject(self):
+        """Counts one request refused by a full queue."""
+        with self.lock:
+            self.rejected += 1
+
+    def summary(self):
+        """Returns a dict of request counts, mean batch size, p50/p99 latency in ms and throughput in images/s."""
+        with self.lock:
+            lat = np.array(self.latencies, dtype=np.float64) * 1e3  # ms
+            finished, bs, count, rejected = list(self.finished), list(self.batch_sizes), self.count, self.rejected
+        if not len(lat):
+            lat = np.zeros(1)
+        span = max(finished[-1] - finished[0], 1e-3) if finished else 1.0  # seconds covered by the window
+        return {
+            "count": count,
+            "rejected": rejected,
+            "batch_size": round(float(np.mean(bs)), 2) if bs else 0.0,
+            "p50_ms": round(float(np.percentile(lat, 50)), 2),
+            "p99_ms": round(float(np.percentile(lat, 99)), 2),
+            "throughput": round(len(finished) / span, 2) if len(finished) > 1 else 0.0,
+        }
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches for a single model call.
+
+    A background thread waits for the first request, then keeps collecting requests for up to `max_wait_ms`
+    milliseconds or until `max_batch_size` requests are queued, and passes the list of items to `fn`. `fn` must return
+    one result per item, in order. Each caller blocks in `submit()` until its own result is ready.
+
+    With `max_queue > 0` the queue is bounded and `submit()` raises `queue.Full` immediately when it is full, so callers
+    can shed load (e.g. HTTP 503) instead of piling up behind a saturated model.
+
+    Usage:
+        batcher = MicroBatcher(lambda items: [x * 2 for x in items], max_batch_size=8, max_wait_ms=10)
+        y = batcher.submit(x)
+    """
+
+    def __init__(self, fn, max_batch_size=8, max_wait_ms=10, max_queue=0, name="batcher"):
+        """Initializes the batcher with batch function `fn` and starts its worker thread."""
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1e3)  # seconds
+        self.name = name
+        self.queue = queue.Queue(maxsize=max(0, int(max_queue)))  # 0 for unbounded
+        self.stats = LatencyStats()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def enqueue(self, item):
+        """Queues `item` for the next batch and returns its `concurrent.futures.Future`, e.g. to await it."""
+        future = Future()
+        try:
+            self.queue.put_nowait((item, future, time.time()))
+        except queue.Full:
+            self.stats.reject()
+            raise
+        return future
+
+    def submit(self, item, timeout=None):
+        """Queues `item` for the next batch and blocks until its result is available, re-raising batch errors."""
+        return self.enqueue(item).result(timeout=timeout)
+
+    def enqueue_many(self, items):
+        """Queues all `items` back-to-back so they share a batch where possible, returning their Futures in order."""
+        return [self.enqueue(item) for item in items]
+
+    def submit_many(self, items, timeout=None):
+        """Queues all `items` back-to-back so they share a batch where possible, returning their results in order."""
+        return [f.result(timeout=timeout) for f in self.enqueue_many(items)]
+
+    def _collect(self):
+        """Blocks for the first request, then gathers more until the batch is full or the wait window closes."""
+        batch = [self.queue.get()]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Worker loop running `fn` on each collected batch and resolving every caller's future."""
+        while True:
+            batch = self._collect()
+            items, futures, t0 = zip(*batch)
+            try:
+                results = self.fn(list(items))
+                assert len(results) == len(items), f"{self.name} returned {len(results)} results for {len(items)} items"
+            except Exception as e:
+                LOGGER.warning(f"WARNING ⚠️ {self.name} batch of {len(items)} failed: {e}")
+                for f in futures:
+                    f.set_exception(e)
+                continue
+            for f, r in zip(futures, results):
+                f.set_result(r)
+            t = time.time()
+            self.stats.update([t - x for x in t0], len(items))
+
+
+class SharedRing:
+    """
+    Fixed-size slots in one `multiprocessing.shared_memory` block, for handing arrays to other processes without
+    pickling them. The creating process owns slot allocation, other processes attach by `name`.
+    """
+
+    def __init__(self, slots, slot_bytes, name=None):
+        """Creates a new ring of `slots` x `slot_bytes` bytes, or attaches to the existing ring `name`."""
+        self.slots, self.slot_bytes = slots, slot_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=slots * slot_bytes)
+        self.name = self.shm.name
+
+    def put(self, i, array):
+        """Copies `array` into slot `i`, returning the (shape, dtype) needed to read it back."""
+        assert array.nbytes <= self.slot_bytes, f"{array.nbytes} bytes do not fit in a {self.slot_bytes} byte slot"
+        self.get(i, array.shape, array.dtype)[:] = array
+        return array.shape, array.dtype.str
+
+    def get(self, i, shape, dtype):
+        """Returns a zero-copy array view of slot `i`."""
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=i * self.slot_bytes)
+
+    def close(self, unlink=False):
+        """Detaches from the shared memory block, and frees it if `unlink`."""
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class WorkerPool:
+    """
+    Runs `n` model worker processes fed through a SharedRing, restarting any worker that exits.
+
+    Each worker runs `target(index, ring_name, slots, slot_bytes, tasks, results, *args)`. Once ready it must put
+    `(None, index, True, info)` on `results`, or `(None, index, False, exception)` if loading failed, then answer
+    every `(task_id, kind, slot, shape, dtype, meta, stacked)` it gets from `tasks` with `(task_id, index, ok,
+    result_or_exception)`, where a `stacked` task's result is a list with one entry per row of its array. Tasks go to
+    the ready worker with the fewest tasks in flight. A slot stays allocated until its result is back, so the number
+    of slots bounds the requests in flight and `enqueue()` raises `queue.Full` beyond it. Exited workers are restarted
+    after an exponential backoff of `backoff` to `max_backoff` seconds, and a worker that fails
+    `max_restarts` times in a row without becoming ready is given up.
+    """
+
+    def __init__(self, target, n, slots, slot_bytes, args=(), max_restarts=5, backoff=1.0, max_backoff=60.0):
+        """Allocates the shared ring and starts `n` workers plus the result and monitor threads."""
+        self.ctx = mp.get_context("spawn")  # fork is unsafe once torch/TF have started threads
+        self.target, self.n, self.args = target, n, args
+        self.max_restarts, self.backoff, self.max_backoff = max_restarts, backoff, max_backoff
+        self.ring = SharedRing(slots, slot_bytes)
+        self.free = queue.Queue()
+        for i in range(slots):
+            self.free.put(i)
+        self.results = self.ctx.Queue()
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        self.info, self.info_ready, self.error = None, threading.Event(), None
+        self.failures, self.restart_at = [0] * n, [None] * n  # failures in a row, pending restart time
+        self.procs, self.tasks, self.ready = [None] * n, [None] * n, [False] * n
+        self.inflight = [{} for _ in range(n)]  # per worker {task_id: (future, slot)}
+        for i in range(n):
+            self._start(i)
+        threading.Thread(target=self._collect, name="pool-results", daemon=True).start()
+        threading.Thread(target=self._monitor, name="pool-monitor", daemon=True).start()
+        atexit.register(self.close)
+
+    def _start(self, i):
+        """(Re)starts worker `i` with a fresh task queue."""
+        self.tasks[i], self.ready[i] = self.ctx.Queue(), False
+        args = (i, self.ring.name, self.ring.slots, self.ring.slot_bytes, self.tasks[i], self.results, *self.args)
+        self.procs[i] = self.ctx.Process(target=self.target, args=args, name=f"model-worker-{i}", daemon=True)
+        self.procs[i].start()
+
+    def wait_ready(self, timeout=None):
+        """
+        Blocks until the first worker is ready and returns the `info` it reported.
+
+        Raises TimeoutError if none is ready within `timeout` seconds and RuntimeError if every worker was given up.
+        """
+        if not self.info_ready.wait(timeout):
+            raise TimeoutError(f"No model worker ready after {timeout}s")
+        if self.info is None:
+            raise RuntimeError(f"All {self.n} model workers failed to start") from self.error
+        return self.info
+
+    def n_ready(self):
+        """Returns the number of workers currently ready for tasks."""
+        return sum(self.ready)
+
+    def enqueue(self, kind, array, meta=None):
+        """Copies `array` into a free slot and sends a `kind` task to the least busy worker, returning its Future."""
+        return self.enqueue_many(kind, [array], [meta])[0]
+
+    def enqueue_many(self, kind, arrays, metas=None, stacked=False):
+        """
+        Sends one `kind` task per array in `arrays` (with the matching entry of `metas`), each in its own slot,
+        returning their Futures.
+
+        All slots are reserved before anything is sent, so either every task is queued or none is and `queue.Full`
+        (or the copy error) is raised. With `stacked`, each task's rows are separate inputs, see the class docstring.
+        """
+        slots = []
+        try:
+            for _ in arrays:
+                slots.append(self.free.get_nowait())
+            puts = [self.ring.put(slot, array) for slot, array in zip(slots, arrays)]
+        except queue.Empty:
+            self._release(slots)
+            raise queue.Full from None
+        except Exception:  # e.g. an array larger than a slot
+            self._release(slots)
+            raise
+        futures = [Future() for _ in arrays]
+        with self.lock:
+            ready = [i for i in range(self.n) if self.ready[i]]
+            if not ready:
+                self._release(slots)
+                raise RuntimeError("No model worker is ready")
+            for future, slot, (shape, dtype), meta in zip(futures, slots, puts, metas or [None] * len(slots)):
+                i = min(ready, key=lambda i: len(self.inflight[i]))
+                task_id = next(self.counter)
+                self.inflight[i][task_id] = future, slot
+                self.tasks[i].put((task_id, kind, slot, shape, dtype, meta, stacked))
+        return futures
+
+    def _release(self, slots):
+        """Returns reserved `slots` to the free list."""
+        for slot in slots:
+            self.free.put(slot)
+
+    def _collect(self):
+        """Result loop resolving futures and recycling slots."""
+        while True:
+            task_id, i, ok, result = self.results.get()
+            if task_id is None and not ok:  # worker failed to load, the monitor restarts it once it exits
+                LOGGER.error(f"Model worker {i} failed to load: {result}")
+                self.error = result
+                continue
+            if task_id is None:  # worker ready
+                with self.lock:
+                    self.ready[i], self.failures[i] = True, 0
+                LOGGER.info(f"Model worker {i} ready ({self.n_ready()}/{self.n})")
+                if self.info is None:
+                    self.info = result
+                    self.info_ready.set()
+                continue
+            with self.lock:
+                entry = self.inflight[i].pop(task_id, None)
+            if entry is None:  # already failed by the monitor
+                continue
+            future, slot = entry
+            self.free.put(slot)
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    def _monitor(self, interval=1.0):
+        """Restarts workers that exited with backoff, failing the tasks they had in flight."""
+        while True:
+            time.sleep(interval)
+            for i in range(self.n):
+                p = self.procs[i]
+                if p is None:  # waiting for a restart or given up
+                    if self.restart_at[i] is not None and time.time() >= self.restart_at[i]:
+                        self.restart_at[i] = None
+                        with self.lock:
+                            self._start(i)
+                elif p.exitcode is not None:
+                    self._exited(i, p.exitcode)
+
+    def _exited(self, i, exitcode):
+        """Fails the in-flight tasks of exited worker `i` and schedules its restart, or gives it up."""
+        with self.lock:
+            failed, self.inflight[i] = self.inflight[i], {}
+            self.procs[i], self.ready[i] = None, False
+        for future, slot in failed.values():
+            self.free.put(slot)
+            future.set_exception(RuntimeError(f"Model worker {i} exited"))
+        self.failures[i] += 1
+        if self.failures[i] > self.max_restarts:
+            LOGGER.error(f"Model worker {i} exited with code {exitcode}, {self.failures[i]} failures, giving up")
+            if all(p is None and t is None for p, t in zip(self.procs, self.restart_at)):
+                self.info_ready.set()  # wake wait_ready(), which raises unless a worker was ready before
+            return
+        delay = min(self.backoff * 2 ** (self.failures[i] - 1), self.max_backoff)
+        LOGGER.warning(f"WARNING ⚠️ Model worker {i} exited with code {exitcode}, restarting in {delay:.0f}s")
+        self.restart_at[i] = time.time() + delay
+
+    def close(self):
+        """Terminates the workers and frees the shared ring."""
+        atexit.unregister(self.close)
+        self.restart_at = [None] * self.n
+        for p in self.procs:
+            if p is not None and p.is_alive():
+                p.terminate()
+        self.ring.close(unlink=True)
+
+
+class RemoteBatcher:
+    """MicroBatcher-compatible handle that sends `kind` tasks to a WorkerPool, where each worker batches them."""
+
+    def __init__(self, pool, kind):
+        """Initializes the handle for `kind` tasks on `pool`."""
+        self.pool, self.kind = pool, kind
+        self.stats = LatencyStats()
+
+    def enqueue(self, item):
+        """Sends `item`, an array or an (array, meta) tuple, to a worker and returns its Future."""
+        array, meta = item if isinstance(item, tuple) else (item, None)
+        try:
+            future = self.pool.enqueue(self.kind, array, meta)
+        except queue.Full:
+            self.stats.reject()
+            raise
+        t0 = time.time()
+        future.add_done_callback(lambda f: f.exception() or self.stats.update([time.time() - t0], 1))
+        return future
+
+    def submit(self, item, timeout=None):
+        """Sends `item` and blocks until its result is available."""
+        return self.enqueue(item).result(timeout=timeout)
+
+    def enqueue_many(self, items):
+        """
+        Sends all `items` and returns their Futures in order.
+
+        Arrays with the same shape, dtype and meta are stacked into as few slots as fit them, so e.g. the crops of one
+        /scan request take a few slots instead of one each, and all slots are reserved before any task is sent.
+        """
+        items = [item if isinstance(item, tuple) else (item, None) for item in items]
+        groups = {}  # (meta, shape, dtype) -> item indices
+        for j, (array, meta) in enumerate(items):
+            groups.setdefault((meta, array.shape, array.dtype.str), []).append(j)
+        chunks, metas = [], []
+        for (meta, _, _), index in groups.items():
+            rows = max(1, self.pool.ring.slot_bytes // max(items[index[0]][0].nbytes, 1))  # items per slot
+            for i in range(0, len(index), rows):
+                chunks.append(index[i : i + rows])
+                metas.append(meta)
+        arrays = [np.stack([items[j][0] for j in chunk]) for chunk in chunks]
+        try:
+            futures = self.pool.enqueue_many(self.kind, arrays, metas, stacked=True)
+        except queue.Full:
+            self.stats.reject()
+            raise
+        t0, results = time.time(), [Future() for _ in items]
+        for chunk, future in zip(chunks, futures):
+            future.add_done_callback(lambda f, chunk=chunk: self._split(f, chunk, results, t0))
+        return results
+
+    def _split(self, future, chunk, results, t0):
+        """Resolves the item Futures in `results` at the `chunk` indices from the stacked task `future`."""
+        if future.exception():
+            for j in chunk:
+                results[j].set_exception(future.exception())
+            return
+        self.stats.update([time.time() - t0] * len(chunk), len(chunk))
+        for j, result in zip(chunk, future.result()):
+            results[j].set_result(result)
+
+    def submit_many(self, items, timeout=None):
+        """Sends all `items` and returns their results in order."""
+        return [f.result(timeout=timeout) for f in self.enqueue_many(items)]
+
+
+class ResultCache:
+    """
+    Thread-safe LRU + TTL cache of request results, keyed by a hash of the uploaded bytes plus the request parameters.
+
+    Entries expire after `ttl` seconds and the least recently used ones are evicted beyond `maxsize` entries or
+    `max_bytes` of JSON-serialized results. With `perceptual=True` keys use the difference hash of the decoded image
+    instead of its bytes, so re-encoded copies of the same photo also hit. The 64-bit hash also collides for distinct
+    but similar photos, returning another image's result, so keep it off where that is unsafe (e.g. pill ID). The
+    cache is cleared whenever one of the `watch` files (e.g. model weights) changes, and their (size, mtime)
+    fingerprint is part of every key. Models are reloaded some time after their files change, so `put()` takes the
+    fingerprint of the files the producing models were loaded from and skips results that don't match the key.
+
+    Usage:
+        cache = ResultCache(watch=["best.pt"])
+        key = cache.key(buf, "detect", conf_thres)
+        result = cache.get(key)
+        if result is None:
+            model, files = registry.get(files=True)
+            result = compute(model, buf)
+            cache.put(key, result, files)
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, max_bytes=16 * 2**20, perceptual=False, watch=()):
+        """Initializes an empty cache bounded by `maxsize` entries, `ttl` seconds and `max_bytes` of results."""
+        self.maxsize, self.ttl, self.max_bytes, self.perceptual = maxsize, ttl, max_bytes, perceptual
+        self.watch = [Path(f) for f in watch]
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key: (expires, size, result), oldest first
+        self.bytes = 0
+        self.hits = self.misses = 0
+        self.checked, self.fingerprint = 0.0, self._fingerprint()
+
+    def _fingerprint(self):
+        """Returns the (size, mtime) of every watched file, None for missing files."""
+        return file_fingerprint(self.watch)
+
+    def version(self, interval=1.0):
+        """Returns the watched files fingerprint, re-checked at most every `interval` seconds and clearing on change."""
+        t = time.time()
+        if t - self.checked > interval:
+            self.checked = t
+            fingerprint = self._fingerprint()
+            if fingerprint != self.fingerprint:
+                LOGGER.info(f"Result cache cleared, {', '.join(map(str, self.watch))} changed")
+                self.clear()
+                self.fingerprint = fingerprint
+        return self.fingerprint
+
+    def key(self, buf, *params):
+        """Returns the cache key for upload `buf` and the result-affecting `params`, e.g. endpoint and thresholds."""
+        data = dhash(buf) if self.perceptual else buf
+        h = xxhash.xxh3_128(data) if xxhash else hashlib.blake2b(data, digest_size=16)
+        return h.hexdigest(), repr(params), self.version()
+
+    def get(self, key):
+        """Returns the cached result for `key`, or None on a miss or expired entry."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    self._pop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, result, files=None):
+        """
+        Caches JSON-serializable `result` for `key`, evicting least recently used entries beyond the bounds.
+
+        `files` {file: (size, mtime)} of the models that produced `result`, see ModelRegistry.get(), skips results of
+        models loaded from other versions of the watched files than `key`, e.g. the old model while the new one loads.
+        """
+        watched = dict(zip(map(str, self.watch), key[2]))
+        if any(watched.get(str(Path(f)), fingerprint) != fingerprint for f, fingerprint in (files or {}).items()):
+            return
+        size = len(json.dumps(result, ensure_ascii=False)) + 128  # serialized result plus key overhead, approximate
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+            self.entries[key] = time.time() + self.ttl, size, result
+            self.bytes += size
+            while len(self.entries) > self.maxsize or self.bytes > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+
+    def _pop(self, key):
+        """Removes `key`, lock must be held."""
+        self.bytes -= self.entries.pop(key)[1]
+
+    def clear(self):
+        """Removes all entries."""
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def summary(self):
+        """Returns a dict of hit/miss counts, hit rate and current size."""
+        with self.lock:
+            n = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / n, 4) if n else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
+
+
+class ModelRegistry:
+    """
+    Thread-safe registry of model versions, loaded lazily on first use and kept in memory up to `max_loaded` versions
+    (least recently used evicted).
+
+    Each version maps to a file, or a tuple of files, passed to `loader`. When the files of a loaded version change
+    (size, mtime), the new model is loaded in a background thread and swapped in atomically once ready, so requests
+    keep being served by the old model meanwhile and the ones already holding it finish with it. Replace model files
+    with an atomic rename (e.g. `mv`), a failed reload keeps the old model.
+
+    Usage:
+        registry = ModelRegistry({"v3": "v3/keras_model.h5", "v4": "v4/new_keras_model.h5"}, load_model, default="v3")
+        model = registry.get(request_version)  # KeyError for unknown versions, default version for None
+    """
+
+    def __init__(self, versions, loader, max_loaded=2, default=None, interval=1.0):
+        """Initializes the registry of `versions` {name: file(s)}, none loaded yet."""
+        self.versions = {k: tuple(v) if isinstance(v, (list, tuple)) else (v,) for k, v in versions.items()}
+        self.loader, self.max_loaded, self.interval = loader, max(max_loaded, 1), interval
+        self.default = default or next(iter(self.versions))
+        assert self.default in self.versions, f"default model version '{self.default}' not in {list(self.versions)}"
+        self.lock = threading.Lock()
+        self.loading = {}  # version: Lock held while loading it, so concurrent first requests load once
+        self.models = OrderedDict()  # version: [model, fingerprint, checked, files], least recently used first
+        self.reloading = set()
+        self.loads = self.reloads = self.evictions = 0
+
+    def __contains__(self, version):
+        """Returns True if `version` (None for the default) is registered."""
+        return (version or self.default) in self.versions
+
+    def files(self):
+        """Returns the files of all registered versions."""
+        return [f for v in self.versions.values() for f in v]
+
+    def get(self, version=None, files=False):
+        """
+        Returns the model for `version` (default if None), loading it on first use.
+
+        With `files`, returns (model, {file: (size, mtime)}) with the fingerprint of the files the model was loaded
+        from, which only changes once a reloaded model is swapped in, e.g. for ResultCache.put().
+        """
+        version = version or self.default
+        if version not in self.versions:
+            raise KeyError(f"Unknown model version '{version}', available: {', '.join(self.versions)}")
+        with self.lock:
+            entry = self.models.get(version)
+            if entry is not None:
+                self.models.move_to_end(version)
+                self._check(version, entry)
+                return (entry[0], entry[3]) if files else entry[0]
+            lock = self.loading.setdefault(version, threading.Lock())
+        with lock:
+            with self.lock:
+                entry = self.models.get(version)
+            if entry is None:  # else loaded by a concurrent request
+                fingerprint = file_fingerprint(self.versions[version])
+                model = self._load(version)
+                with self.lock:
+                    entry = self._put(version, model, fingerprint)
+                    self.loads += 1
+            return (entry[0], entry[3]) if files else entry[0]
+
+    def _load(self, version):
+        """Loads `version` with the loader, logging the time taken."""
+        t = time.time()
+        model = self.loader(*self.versions[version])
+        LOGGER.info(f"Loaded model version '{version}' from {', '.join(map(str, self.versions[version]))} "
+                    f"in {time.time() - t:.1f}s")
+        return model
+
+    def _put(self, version, model, fingerprint):
+        """Stores a loaded model as most recently used, evicts beyond `max_loaded` and returns its entry, lock must be
+        held.
+        """
+        entry = self.models[version] = [model, fingerprint, time.time(), dict(zip(self.versions[version], fingerprint))]
+        self.models.move_to_end(version)
+        while len(self.models) > self.max_loaded:
+            evicted, _ = self.models.popitem(last=False)
+            self.evictions += 1
+            LOGGER.info(f"Evicted model version '{evicted}'")
+        return entry
+
+    def _check(self, version, entry):
+        """Starts a background reload if the files of loaded `version` changed, lock must be held."""
+        t = time.time()
+        if t - entry[2] < self.interval or version in self.reloading:
+            return
+        entry[2] = t
+        fingerprint = file_fingerprint(self.versions[version])
+        if fingerprint != entry[1]:
+            self.reloading.add(version)
+            args = version, fingerprint
+            threading.Thread(target=self._reload, args=args, name=f"reload-{version}", daemon=True).start()
+
+    def _reload(self, version, fingerprint):
+        """Loads changed `version` and swaps it in, keeping the old model if loading fails."""
+        try:
+            model = self._load(version)
+        except Exception as e:
+            model = None
+            LOGGER.warning(f"WARNING ⚠️ Reloading model version '{version}' failed, keeping the loaded one: {e}")
+        with self.lock:
+            self.reloading.discard(version)
+            entry = self.models.get(version)
+            if entry is None:  # evicted meanwhile, next get() loads it again
+                return
+            entry[1] = fingerprint  # don't retry until the files change again
+            if model is not None:
+                entry[0], entry[3] = model, dict(zip(self.versions[version], fingerprint))
+                self.reloads += 1
+
+    def summary(self):
+        """Returns a dict of registered and loaded versions and load/reload/eviction counts."""
+        with self.lock:
+            return {
+                "default": self.default,
+                "versions": list(self.versions),
+                "loaded": list(self.models),
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+            }
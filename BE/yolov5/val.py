@@ -56,7 +56,7 @@ from utils.general import (
     xywh2xyxy,
     xyxy2xywh,
 )
-from utils.metrics import ConfusionMatrix, ap_per_class, box_iou
+from utils.metrics import ConfusionMatrix, StreamingAP, ap_per_class, box_iou
 from utils.plots import output_to_target, plot_images, plot_val_study
 from utils.torch_utils import select_device, smart_inference_mode
 
@@ -208,6 +208,7 @@ def run(
     exist_ok=False,  # existing project/name ok, do not increment
     half=True,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
+    streaming=False,  # accumulate mAP in bounded-memory confidence histograms instead of keeping every prediction
     model=None,
     dataloader=None,
     save_dir=Path(""),
@@ -243,6 +244,8 @@ def run(
         exist_ok (bool, optional): Overwrite existing project/name without incrementing. Default is False.
         half (bool, optional): Use FP16 half-precision inference. Default is True.
         dnn (bool, optional): Use OpenCV DNN for ONNX inference. Default is False.
+        streaming (bool, optional): Accumulate metrics in per-class confidence histograms (utils.metrics.StreamingAP)
+            with memory independent of the dataset size, logging running mAP during the pass. Default is False.
         model (torch.nn.Module, optional): Model object for training. Default is None.
         dataloader (torch.utils.data.DataLoader, optional): Dataloader object. Default is None.
         save_dir (Path, optional): Directory to save results. Default is Path('').
@@ -324,6 +327,7 @@ def run(
     dt = Profile(device=device), Profile(device=device), Profile(device=device)  # profiling times
     loss = torch.zeros(3, device=device)
     jdict, stats, ap, ap_class = [], [], [], []
+    metric = StreamingAP(nc, niou) if streaming else None
     callbacks.run("on_val_start")
     pbar = tqdm(dataloader, desc=s, bar_format=TQDM_BAR_FORMAT)  # progress bar
     for batch_i, (im, targets, paths, shapes) in enumerate(pbar):
@@ -348,9 +352,10 @@ def run(
         targets[:, 2:] *= torch.tensor((width, height, width, height), device=device)  # to pixels
         lb = [targets[targets[:, 0] == i, 1:] for i in range(nb)] if save_hybrid else []  # for autolabelling
         with dt[2]:
-            preds = non_max_suppression(
-                preds, conf_thres, iou_thres, labels=lb, multi_label=True, agnostic=single_cls, max_det=max_det
-            )
+            if not getattr(model, "end2end", False):  # exported with --nms
+                preds = non_max_suppression(
+                    preds, conf_thres, iou_thres, labels=lb, multi_label=True, agnostic=single_cls, max_det=max_det
+                )
 
         # Metrics
         for si, pred in enumerate(preds):
@@ -362,7 +367,11 @@ def run(
 
             if npr == 0:
                 if nl:
-                    stats.append((correct, *torch.zeros((2, 0), device=device), labels[:, 0]))
+                    stat = (correct, *torch.zeros((2, 0), device=device), labels[:, 0])
+                    if streaming:
+                        metric.update(*stat)
+                    else:
+                        stats.append(stat)
                     if plots:
                         confusion_matrix.process_batch(detections=None, labels=labels[:, 0])
                 continue
@@ -381,7 +390,11 @@ def run(
                 correct = process_batch(predn, labelsn, iouv)
                 if plots:
                     confusion_matrix.process_batch(predn, labelsn)
-            stats.append((correct, pred[:, 4], pred[:, 5], labels[:, 0]))  # (correct, conf, pcls, tcls)
+            stat = (correct, pred[:, 4], pred[:, 5], labels[:, 0])  # (correct, conf, pcls, tcls)
+            if streaming:
+                metric.update(*stat)
+            else:
+                stats.append(stat)
 
             # Save/log
             if save_txt:
@@ -396,15 +409,25 @@ def run(
             plot_images(im, targets, paths, save_dir / f"val_batch{batch_i}_labels.jpg", names)  # labels
             plot_images(im, output_to_target(preds), paths, save_dir / f"val_batch{batch_i}_pred.jpg", names)  # pred
 
+        if streaming and batch_i % 100 == 99:
+            running_map50, running_map = metric.map()
+            pbar.set_postfix_str(f"mAP50 {running_map50:.3g} mAP50-95 {running_map:.3g}")
+
         callbacks.run("on_val_batch_end", batch_i, im, targets, paths, shapes, preds)
 
     # Compute metrics
-    stats = [torch.cat(x, 0).cpu().numpy() for x in zip(*stats)]  # to numpy
-    if len(stats) and stats[0].any():
-        tp, fp, p, r, f1, ap, ap_class = ap_per_class(*stats, plot=plots, save_dir=save_dir, names=names)
+    if streaming:
+        if metric.tp.any():
+            tp, fp, p, r, f1, ap, ap_class = metric.compute(plot=plots, save_dir=save_dir, names=names)
+        nt = metric.nt  # number of targets per class
+    else:
+        stats = [torch.cat(x, 0).cpu().numpy() for x in zip(*stats)]  # to numpy
+        if len(stats) and stats[0].any():
+            tp, fp, p, r, f1, ap, ap_class = ap_per_class(*stats, plot=plots, save_dir=save_dir, names=names)
+        nt = np.bincount(stats[3].astype(int), minlength=nc)  # number of targets per class
+    if len(ap_class):
         ap50, ap = ap[:, 0], ap.mean(1)  # AP@0.5, AP@0.5:0.95
         mp, mr, map50, map = p.mean(), r.mean(), ap50.mean(), ap.mean()
-    nt = np.bincount(stats[3].astype(int), minlength=nc)  # number of targets per class
 
     # Print results
     pf = "%22s" + "%11i" * 2 + "%11.3g" * 4  # print format
@@ -413,7 +436,7 @@ def run(
         LOGGER.warning(f"WARNING ⚠️ no labels found in {task} set, can not compute metrics without labels")
 
     # Print results per class
-    if (verbose or (nc < 50 and not training)) and nc > 1 and len(stats):
+    if (verbose or (nc < 50 and not training)) and nc > 1 and len(ap_class):
         for i, c in enumerate(ap_class):
             LOGGER.info(pf % (names[c], seen, nt[c], p[i], r[i], ap50[i], ap[i]))
 
@@ -537,6 +560,7 @@ def parse_opt():
     parser.add_argument("--exist-ok", action="store_true", help="existing project/name ok, do not increment")
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
+    parser.add_argument("--streaming", action="store_true", help="bounded-memory histogram mAP for large val sets")
     opt = parser.parse_args()
     opt.data = check_yaml(opt.data)  # check YAML
     opt.save_json |= opt.data.endswith("coco.yaml")